@@ -0,0 +1,130 @@
+"""Микробенчмарк разбора текста ячеек (cell_grammar) с кэшем и без него.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.cell_grammar
+    python -m benchmarks.cell_grammar --extract room reports/*.xls --output corpus.json
+    python -m benchmarks.cell_grammar --corpus corpus.json
+
+По умолчанию корпус генерируется в памяти. С --extract тексты ячеек
+выбираются из настоящих скачанных файлов (room - занятость аудиторий,
+teacher - расписание преподавателя, college - файлы VK) и сохраняются
+в JSON, который затем можно передать в --corpus.
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+import cell_grammar
+from benchmarks.room_grid import make_room_grid
+
+PARSERS = {
+    "room": cell_grammar.parse_room_cell,
+    "teacher": cell_grammar.parse_teacher_info,
+    "college": cell_grammar.parse_college_cell,
+}
+
+
+def synthetic_corpus(size: int, seed: int = 1) -> dict:
+    rnd = random.Random(seed)
+    room_cells = [
+        value
+        for row in make_room_grid(cabinets=60, weeks=2, seed=seed)[2:]
+        for value in row[2:]
+        if isinstance(value, str) and "Резервирование" not in value
+    ]
+    teacher_infos = [
+        f"{discipline} ИГЭ-{n}-23-01" if n % 3 else f"ИГЭ-{n}-23-01 {discipline} кафедра ФМ"
+        for n in range(100, 160)
+        for discipline in ("Математика", "Физика", "Экономика")
+    ]
+    college_cells = [
+        f"{discipline}\n{lesson}\n{teacher}\n{cabinet}"
+        for discipline in ("Математика", "Физика", "История", "Информатика")
+        for lesson in ("Лекция", "практическое занятие", "1 подгруппа")
+        for teacher in ("Иванов И.И.", "Петрова А.Б.", "nan")
+        for cabinet in ("3-101", "1-12", "nan")
+    ]
+    return {
+        "room": [rnd.choice(room_cells) for _ in range(size)],
+        "teacher": [rnd.choice(teacher_infos) for _ in range(size)],
+        "college": [rnd.choice(college_cells) for _ in range(size)],
+    }
+
+
+def extract_corpus(kind: str, paths: list) -> dict:
+    """Тексты ячеек из настоящих файлов в том виде, в каком их видит парсер."""
+    import pandas as pd
+    from extractors import load_xls_worksheet, sheet_values
+
+    texts = []
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        if kind == "room":
+            values = sheet_values(load_xls_worksheet(content))
+            texts += [v for row in values[2:] for v in row[2:] if isinstance(v, str) and v.strip()]
+        elif kind == "teacher":
+            values = sheet_values(load_xls_worksheet(content))
+            texts += [str(row[3]).strip() for row in values[1:] if len(row) > 3 and row[3]]
+        else:
+            for df in pd.read_excel(path, sheet_name=None, header=None).values():
+                text = df.astype(str).apply(lambda col: col.str.strip())
+                for col in range(df.shape[1] - 3):
+                    joined = text[col] + "\n" + text[col + 2] + "\n" + text[col + 3]
+                    texts += [t for t in joined if cell_grammar.COLLEGE_TEACHER_RE.search(t)]
+    return {kind: texts}
+
+
+def measure(func, corpus: list) -> float:
+    start = time.perf_counter()
+    for text in corpus:
+        try:
+            func(text)
+        except IndexError:
+            # Пустые строки в ячейке: парсер файла пропускает такой файл целиком
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--corpus", help="JSON с корпусом {формат: [тексты]}")
+    parser.add_argument("--extract", nargs="+", metavar=("FORMAT", "FILE"))
+    parser.add_argument("--output", default="cell_corpus.json")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    if args.extract:
+        kind, paths = args.extract[0], args.extract[1:]
+        corpus = extract_corpus(kind, paths)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False)
+        print(f"{kind}: {len(corpus[kind])} ячеек сохранено в {args.output}")
+        return
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = json.load(f)
+    else:
+        corpus = synthetic_corpus(args.size)
+
+    for kind, texts in corpus.items():
+        func = PARSERS[kind]
+        func.cache_clear()
+        uncached = measure(func.__wrapped__, texts)
+        cached = measure(func, texts)
+        info = func.cache_info()
+        print(
+            f"{kind:8s} ячеек={len(texts):7d} уникальных={info.currsize:6d} "
+            f"без кэша={uncached / len(texts) * 1e6:6.2f} мкс "
+            f"с кэшем={cached / len(texts) * 1e6:6.2f} мкс "
+            f"(x{uncached / cached:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Синтетические файлы расписания в тех же форматах, что скачивает парсер.
+
+room    - занятость аудиторий (.xls), читается extract_room_rows
+teacher - расписание преподавателя (.xls), extract_teacher_rows
+vk      - расписание колледжа из VK (.xlsx, несколько листов и блоков дней),
+          extract_vk_records
+
+Файлы .xls пишутся через xlwt, который нужен только для бенчмарков:
+pip install xlwt.
+"""
+import datetime
+import io
+import random
+
+from benchmarks.room_grid import make_room_grid
+from extractors import VK_YEAR
+
+TEACHERS = ["Иванов И.И.", "Петров П.П.", "Сидорова А.В.", "Кузнецов Д.С."]
+TEACHER_INFOS = [
+    "Математический анализ ИВТб-{n}-23-01",
+    "ИВТб-{n}-23-01 Физика кафедра ФМ",
+    "Программирование ПИб-{n}-24-01",
+    "История кафедра истории",
+]
+COLLEGE_DISCIPLINES = ["Математика", "Физика\nЛекция", "История\n1 подгруппа", "Химия практическое занятие"]
+COLLEGE_CABINETS = ["3-101", "1-12", "2-205", "4-310"]
+
+
+def _xls_bytes(values: list) -> bytes:
+    try:
+        import xlwt
+    except ImportError:
+        raise SystemExit("Для генерации .xls нужен xlwt: pip install xlwt")
+    workbook = xlwt.Workbook(encoding="utf-8")
+    sheet = workbook.add_sheet("Лист1")
+    for r, row in enumerate(values):
+        for c, value in enumerate(row):
+            if value is not None:
+                sheet.write(r, c, value)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def room_xls(cabinets: int = 100, weeks: int = 4, seed: int = 1) -> bytes:
+    return _xls_bytes(make_room_grid(cabinets, weeks, seed))
+
+
+def teacher_xls(rows: int = 1000, seed: int = 1) -> bytes:
+    rnd = random.Random(seed)
+    day = datetime.date(2026, 9, 1)
+    values = [["Дата", "Время", "Преподаватель", "Дисциплина и группа", "Аудитория"]]
+    for i in range(rows):
+        if i % 7 == 0:
+            day += datetime.timedelta(days=1)
+        values.append([
+            day.strftime("%d.%m.%Y") if i % 7 == 0 else None,
+            f"{i % 7 + 1} пара",
+            rnd.choice(TEACHERS),
+            rnd.choice(TEACHER_INFOS).format(n=rnd.randint(1000, 1999)),
+            f"{rnd.randint(1, 20)}-{rnd.randint(100, 420)}",
+        ])
+    return _xls_bytes(values)
+
+
+def vk_xlsx(days: int = 60, blocks: int = 2, sheets: int = 3, seed: int = 1) -> bytes:
+    """Листы по курсам, на листе blocks блоков дней по три группы."""
+    from openpyxl import Workbook
+
+    rnd = random.Random(seed)
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for s in range(sheets):
+        sheet = workbook.create_sheet(f"{s + 1} курс")
+        sheet.cell(1, 1, "Расписание занятий")
+        for b in range(blocks):
+            day_col = 1 + b * 14
+            for g in range(3):
+                sheet.cell(3, day_col + 2 + g * 4, f"Группа К-{s + 1}{b}{g}")
+            sheet.cell(4, day_col, "День недели")
+            sheet.cell(4, day_col + 1, "Время")
+            row = 5
+            day = datetime.date(VK_YEAR, 9, 1)
+            for _ in range(days):
+                for pair in range(1, 6):
+                    if pair == 1:
+                        sheet.cell(row, day_col, day.strftime("%d.%m"))
+                    sheet.cell(row, day_col + 1, f"{pair} пара")
+                    for g in range(3):
+                        if rnd.random() < 0.6:
+                            group_col = day_col + 2 + g * 4
+                            sheet.cell(row, group_col, rnd.choice(COLLEGE_DISCIPLINES))
+                            sheet.cell(row, group_col + 2, rnd.choice(TEACHERS))
+                            sheet.cell(row, group_col + 3, rnd.choice(COLLEGE_CABINETS))
+                    row += 1
+                day += datetime.timedelta(days=1)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
@@ -0,0 +1,262 @@
+"""Бенчмарк разбора и записи расписаний по стадиям с выводом в JSON.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.ingestion --output bench.json
+    python -m benchmarks.ingestion --cabinets 200 --weeks 8 --formats room
+    python -m benchmarks.ingestion --write --output after.json --compare before.json
+
+Для каждого формата (room, teacher, vk) генерируется синтетический файл
+(benchmarks/generators.py) и измеряются стадии:
+
+read            - чтение файла в сетку значений / DataFrame
+extract         - разбор сетки в строки SlotUpdate
+write           - dbrequests.apply_schedule_batch на пустых слотах
+write_unchanged - повторная запись тех же строк (слоты пропускаются по отпечатку)
+
+Время - лучшее из --repeat запусков, пиковая память - отдельный запуск
+под tracemalloc. Стадии write выполняются только с --write: они пишут
+в базу из DATABASE_URL и затем удаляют свои строки, поэтому запускать
+их нужно на локальной или тестовой базе PostgreSQL.
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import logging
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks import generators
+from extractors import (
+    VK_YEAR,
+    load_xls_worksheet,
+    room_rows_from_grid,
+    sheet_values,
+    teacher_rows_from_sheet,
+    vk_records_from_sheets,
+)
+
+FORMATS = ("room", "teacher", "vk")
+BENCHMARK_SOURCE = "benchmark"
+
+
+def best_of(func, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def stage_result(seconds: float, rows: int, peak: int) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+        "peak_memory_mb": round(peak / 2**20, 2),
+    }
+
+
+def format_cases(args) -> dict:
+    """Для каждого формата: байты файла, чтение и разбор прочитанного."""
+    vk_start = datetime.date(VK_YEAR, 9, 1)
+    vk_end = vk_start + datetime.timedelta(days=args.vk_days - 1)
+
+    def read_vk(content):
+        with pd.ExcelFile(io.BytesIO(content)) as workbook:
+            return [(name, workbook.parse(name, header=None)) for name in workbook.sheet_names]
+
+    def vk_rows(sheets):
+        return [
+            (r["date"], r["time_lesson"], r["cabinet_number"], [r["name_group"]], [r["name_teacher"]], [r["name_discipline"]])
+            for r in vk_records_from_sheets(sheets, vk_start, vk_end)
+        ]
+
+    return {
+        "room": (
+            lambda: generators.room_xls(args.cabinets, args.weeks),
+            lambda content: sheet_values(load_xls_worksheet(content)),
+            room_rows_from_grid,
+        ),
+        "teacher": (
+            lambda: generators.teacher_xls(args.teacher_rows),
+            load_xls_worksheet,
+            lambda worksheet: teacher_rows_from_sheet(worksheet, "Бенчмарк"),
+        ),
+        "vk": (
+            lambda: generators.vk_xlsx(args.vk_days, sheets=args.vk_sheets),
+            read_vk,
+            vk_rows,
+        ),
+    }
+
+
+async def benchmark_writes(rows_by_format: dict, repeat: int) -> dict:
+    from sqlalchemy import delete, select, tuple_
+
+    from dbrequests import apply_schedule_batch
+    from models import (
+        Schedule, ScheduleCabinet, ScheduleChange, ScheduleLesson, ScheduleSlotState, async_main, async_session, engine,
+    )
+
+    await async_main()
+
+    async def cleanup():
+        async with async_session() as session:
+            keys = (
+                select(ScheduleSlotState.date, ScheduleLesson.id, ScheduleCabinet.id)
+                .join(ScheduleLesson, ScheduleLesson.time_lesson == ScheduleSlotState.time_lesson)
+                .join(ScheduleCabinet, ScheduleCabinet.name == ScheduleSlotState.cabinet_number)
+                .where(ScheduleSlotState.source.like(f"{BENCHMARK_SOURCE}:%"))
+            )
+            await session.execute(
+                delete(Schedule).where(tuple_(Schedule.date, Schedule.lesson_id, Schedule.cabinet_id).in_(keys))
+            )
+            await session.execute(delete(ScheduleSlotState).where(ScheduleSlotState.source.like(f"{BENCHMARK_SOURCE}:%")))
+            await session.execute(delete(ScheduleChange).where(ScheduleChange.source.like(f"{BENCHMARK_SOURCE}:%")))
+            await session.commit()
+
+    async def timed(coro_func):
+        start = time.perf_counter()
+        await coro_func()
+        return time.perf_counter() - start
+
+    async def traced(coro_func):
+        tracemalloc.start()
+        try:
+            await coro_func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    results = {}
+    try:
+        for name, rows in rows_by_format.items():
+            source = f"{BENCHMARK_SOURCE}:{name}"
+            write = lambda: apply_schedule_batch(rows, source)
+            cold, warm = [], []
+            for _ in range(repeat):
+                await cleanup()
+                cold.append(await timed(write))
+                warm.append(await timed(write))
+            await cleanup()
+            cold_peak = await traced(write)
+            warm_peak = await traced(write)
+            results[name] = {
+                "write": stage_result(min(cold), len(rows), cold_peak),
+                "write_unchanged": stage_result(min(warm), len(rows), warm_peak),
+            }
+    finally:
+        await cleanup()
+        await engine.dispose()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report: dict, baseline: dict) -> None:
+    for name, result in report["formats"].items():
+        old_stages = baseline.get("formats", {}).get(name, {}).get("stages", {})
+        for stage, values in result["stages"].items():
+            old = old_stages.get(stage)
+            if not old:
+                continue
+            change = (values["seconds"] / old["seconds"] - 1) * 100 if old["seconds"] else 0
+            print(
+                f"{name:8s} {stage:16s} {old['seconds'] * 1000:9.1f} -> {values['seconds'] * 1000:9.1f} мс "
+                f"({change:+.1f}%), память {old['peak_memory_mb']:.1f} -> {values['peak_memory_mb']:.1f} МБ"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--cabinets", type=int, default=150)
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--teacher-rows", type=int, default=2000)
+    parser.add_argument("--vk-days", type=int, default=90)
+    parser.add_argument("--vk-sheets", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--write", action="store_true", help="измерять запись в базу из DATABASE_URL")
+    parser.add_argument("--output", help="файл JSON с результатами")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    cases = format_cases(args)
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "formats": {},
+    }
+    rows_by_format = {}
+    for name in args.formats:
+        generate, read, extract = cases[name]
+        content = generate()
+        read_time, data = best_of(lambda: read(content), args.repeat)
+        extract_time, rows = best_of(lambda: extract(data), args.repeat)
+        read_peak = peak_memory(lambda: read(content))
+        extract_peak = peak_memory(lambda: extract(data))
+        rows_by_format[name] = rows
+        report["formats"][name] = {
+            "file_bytes": len(content),
+            "rows": len(rows),
+            "stages": {
+                "read": stage_result(read_time, len(rows), read_peak),
+                "extract": stage_result(extract_time, len(rows), extract_peak),
+            },
+        }
+
+    if args.write:
+        for name, stages in asyncio.run(benchmark_writes(rows_by_format, args.repeat)).items():
+            report["formats"][name]["stages"].update(stages)
+
+    # ru_maxrss в Linux - килобайты
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    for name, result in report["formats"].items():
+        print(f"{name}: файл {result['file_bytes'] / 1024:.0f} КБ, строк {result['rows']}")
+        for stage, values in result["stages"].items():
+            print(
+                f"  {stage:16s} {values['seconds'] * 1000:9.1f} мс {values['rows_per_sec'] or 0:12.0f} строк/с "
+                f"пик {values['peak_memory_mb']:8.2f} МБ"
+            )
+    print(f"max RSS: {report['max_rss_mb']} МБ")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Сравнение разбора листа аудиторий: обход по ячейкам против сетки значений.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.room_grid --cabinets 150 --weeks 8
+
+Лист генерируется в памяти в формате файла занятости аудиторий, затем
+разбирается прежним алгоритмом (cell() + поиск даты вверх по столбцу A)
+и extractors.room_rows_from_grid; результаты обязаны совпадать.
+"""
+import argparse
+import datetime
+import logging
+import random
+import time
+
+from cell_grammar import parse_room_cell, time_from_pair
+from extractors import GridSheet, room_rows_from_grid
+
+DISCIPLINES = ["Математический анализ", "Физика", "Программирование", "История", "Иностранный язык"]
+TEACHERS = ["Иванов И.И.", "Петров П.П.", "Сидорова А.В.", "Кузнецов Д.С."]
+
+
+def make_room_grid(cabinets: int, weeks: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    header = [None, None] + [f"{rnd.randint(1, 20)}-{100 + c}" for c in range(cabinets)] + [None]
+    values = [["Занятость аудиторий"] + [None] * (cabinets + 2), header]
+    day = datetime.date(2026, 9, 1)
+    for _ in range(weeks * 6):
+        for pair in range(1, 8):
+            row = [day.strftime("Вт %d.%m.%y") if pair == 1 else None, f"{pair} пара"]
+            for c in range(cabinets):
+                x = rnd.random()
+                if x < 0.35:
+                    row.append(f"Лек ИВТб-{c % 9 + 1}301-01-00 {rnd.choice(DISCIPLINES)} {rnd.choice(TEACHERS)}")
+                elif x < 0.45:
+                    row.append(
+                        f"Пр ИВТб-1, ИВТб-2, ИВТб-3 {rnd.choice(DISCIPLINES)} {rnd.choice(TEACHERS)}\n"
+                        f"Лаб ПИб-{c % 5} {rnd.choice(DISCIPLINES)} {rnd.choice(TEACHERS)}"
+                    )
+                elif x < 0.5:
+                    row.append("Резервирование")
+                else:
+                    row.append(None)
+            row.append(None)
+            values.append(row)
+        day += datetime.timedelta(days=1)
+    values.append(["Итого"] + [None] * (cabinets + 2))
+    return values
+
+
+def legacy_room_rows(worksheet) -> list:
+    """Прежний алгоритм разбора файла аудиторий: обход по ячейкам с поиском даты вверх."""
+    rows = []
+    for i in range(3, worksheet.max_column):
+        cabinet_number = worksheet.cell(row=2, column=i).value
+        if not cabinet_number:
+            continue
+        for j in range(3, worksheet.max_row):
+            time_lesson = worksheet.cell(row=j, column=2).value
+            if not time_lesson:
+                continue
+            time_lesson = time_lesson.strip()
+            if time_lesson not in time_from_pair:
+                continue
+            time_lesson = time_from_pair[time_lesson]
+
+            date = worksheet.cell(row=j, column=1).value
+            index_for_day = j - 1
+            while date is None:
+                date = worksheet.cell(row=index_for_day, column=1).value
+                index_for_day -= 1
+            date = datetime.datetime.strptime(date.strip()[-8:], "%d.%m.%y").strftime("%Y-%m-%d")
+
+            value = worksheet.cell(row=j, column=i).value
+            if value and "Резервирование" in value:
+                value = None
+            if value:
+                entries = parse_room_cell(value)
+                groups = [entry.group for entry in entries]
+                teachers = [entry.teacher for entry in entries]
+                disciplines = [entry.discipline for entry in entries]
+                rows.append((date, time_lesson, cabinet_number, groups, teachers, disciplines, False, len(groups) > 1))
+            else:
+                rows.append((date, time_lesson, cabinet_number, None, None, None, True))
+    return rows
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cabinets", type=int, default=150)
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    values = make_room_grid(args.cabinets, args.weeks)
+    sheet = GridSheet(values, len(values), len(values[0]))
+
+    legacy = legacy_room_rows(sheet)
+    grid = room_rows_from_grid(values)
+    assert legacy == grid, "результаты разбора не совпадают"
+
+    legacy_time = best_of(lambda: legacy_room_rows(sheet), args.repeat)
+    grid_time = best_of(lambda: room_rows_from_grid(values), args.repeat)
+    print(f"лист {len(values)}x{len(values[0])}, строк SlotUpdate: {len(grid)}")
+    print(f"обход по ячейкам: {legacy_time * 1000:.1f} мс")
+    print(f"сетка значений:   {grid_time * 1000:.1f} мс (ускорение x{legacy_time / grid_time:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Планы запросов crud.py: строковая таблица schedules и таблица с ключами справочников.
+
+Запуск из корня репозитория на локальной или тестовой базе из DATABASE_URL:
+
+    python -m benchmarks.schedule_indexes
+    python -m benchmarks.schedule_indexes --weeks 18 --cabinets 300 --output plans.json
+
+Во временной таблице schedules_bench_legacy (прежний вид schedules, все
+названия строками) генерируется расписание семестра: weeks недель по
+шесть дней, семь пар, cabinets аудиторий, занятых с вероятностью
+--occupancy. Из неё строятся временные справочники bench_* и таблица
+schedules_bench с теми же столбцами, что models.Schedule. Для каждого пути
+доступа crud.py выполняется EXPLAIN ANALYZE: на строковой таблице без
+индексов и с прежними индексами, затем на нормализованной таблице с
+индексами из models.Schedule.__table_args__. Основная таблица schedules
+не меняется.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+
+from sqlalchemy import text
+
+from cell_grammar import time_from_pair
+from models import Schedule, engine
+
+LEGACY_TABLE = "schedules_bench_legacy"
+BENCH_TABLE = "schedules_bench"
+
+# Прежняя строковая схема schedules (до миграции 3) и её индексы
+LEGACY_COLUMNS = """
+    id serial,
+    date date NOT NULL,
+    time_lesson varchar(50) NOT NULL,
+    cabinet_number varchar(50) NOT NULL,
+    name_group varchar(255) NOT NULL,
+    name_teacher varchar(255) NOT NULL,
+    name_discipline varchar(255) NOT NULL,
+    department varchar(255),
+    slot_position integer NOT NULL DEFAULT 0
+"""
+LEGACY_INDEXES = [
+    ("date", "time_lesson", "cabinet_number", "slot_position"),
+    ("name_group", "date"),
+    ("name_teacher", "date"),
+    ("department", "date"),
+    ("cabinet_number", "date"),
+]
+
+# Справочники: временная таблица, столбец строковой таблицы и ключ в schedules_bench
+DIMENSIONS = [
+    ("bench_groups", "name_group", "group_id"),
+    ("bench_teachers", "name_teacher", "teacher_id"),
+    ("bench_disciplines", "name_discipline", "discipline_id"),
+    ("bench_departments", "department", "department_id"),
+    ("bench_cabinets", "cabinet_number", "cabinet_id"),
+]
+
+# Пути доступа crud.py на строковой таблице: условие и сортировка запроса
+QUERIES = {
+    "date_group": "date = :day AND name_group = :group",
+    "date_teacher": "date = :day AND name_teacher = :teacher",
+    "group_range": "name_group = :group AND date BETWEEN :start AND :end ORDER BY date, time_lesson",
+    "teacher_range": "name_teacher = :teacher AND date BETWEEN :start AND :end ORDER BY date, time_lesson",
+    "date_department": "date = :day AND department = :department",
+    "department_range": "department = :department AND date BETWEEN :start AND :end ORDER BY date, time_lesson",
+    "department_teacher_range": (
+        "department = :department AND name_teacher = :teacher AND date BETWEEN :start AND :end "
+        "ORDER BY date, time_lesson"
+    ),
+    "date_cabinet": "date = :day AND cabinet_number = :cabinet",
+    "cabinet_range": "cabinet_number = :cabinet AND date BETWEEN :start AND :end ORDER BY date, time_lesson",
+    "occupied_slot": "date = :day AND time_lesson = :time_lesson AND name_group != 'Unknown'",
+}
+
+# Те же запросы в виде models.ScheduleRow: названия берутся из справочников,
+# пары сортируются по началу в минутах
+NORMALIZED_FROM = f"""
+    {BENCH_TABLE} AS s
+    JOIN bench_lessons AS l ON l.id = s.lesson_id
+    JOIN bench_cabinets AS c ON c.id = s.cabinet_id
+    JOIN bench_groups AS g ON g.id = s.group_id
+    JOIN bench_teachers AS t ON t.id = s.teacher_id
+    JOIN bench_disciplines AS d ON d.id = s.discipline_id
+    LEFT JOIN bench_departments AS dep ON dep.id = s.department_id
+"""
+NORMALIZED_QUERIES = {
+    "date_group": "s.date = :day AND g.name = :group",
+    "date_teacher": "s.date = :day AND t.name = :teacher",
+    "group_range": "g.name = :group AND s.date BETWEEN :start AND :end ORDER BY s.date, l.starts_at",
+    "teacher_range": "t.name = :teacher AND s.date BETWEEN :start AND :end ORDER BY s.date, l.starts_at",
+    "date_department": "s.date = :day AND dep.name = :department",
+    "department_range": "dep.name = :department AND s.date BETWEEN :start AND :end ORDER BY s.date, l.starts_at",
+    "department_teacher_range": (
+        "dep.name = :department AND t.name = :teacher AND s.date BETWEEN :start AND :end "
+        "ORDER BY s.date, l.starts_at"
+    ),
+    "date_cabinet": "s.date = :day AND c.name = :cabinet",
+    "cabinet_range": "c.name = :cabinet AND s.date BETWEEN :start AND :end ORDER BY s.date, l.starts_at",
+    "occupied_slot": "s.date = :day AND l.time_lesson = :time_lesson AND g.name != 'Unknown'",
+}
+
+
+def generate_sql(weeks: int, cabinets: int, groups: int, teachers: int, departments: int) -> str:
+    times = ", ".join(f"'{value}'" for value in time_from_pair.values())
+    return f"""
+        INSERT INTO {LEGACY_TABLE}
+            (date, time_lesson, cabinet_number, name_group, name_teacher, name_discipline, department, slot_position)
+        SELECT
+            day::date,
+            lesson,
+            cabinet / 100 + 1 || '-' || cabinet % 100 + 100,
+            'ГР-' || abs(hashtext(day::text || lesson || cabinet)) % {groups},
+            'Преподаватель ' || abs(hashtext(lesson || cabinet || day::text)) % {teachers},
+            'Дисциплина ' || abs(hashtext(cabinet || day::text)) % 500,
+            'Кафедра ' || abs(hashtext(lesson || cabinet || day::text)) % {teachers} % {departments},
+            0
+        FROM generate_series(0, {weeks * 7 - 1}) AS offset_days(n)
+        CROSS JOIN LATERAL (SELECT CAST(:first_day AS date) + n AS day) AS days
+        CROSS JOIN unnest(ARRAY[{times}]) AS lessons(lesson)
+        CROSS JOIN generate_series(0, {cabinets - 1}) AS cabinets(cabinet)
+        WHERE extract(isodow FROM day) < 7 AND random() < :occupancy
+    """
+
+
+def normalize_sql() -> list:
+    """Справочники и schedules_bench из строковой таблицы, как в миграции 3."""
+    statements = []
+    for table, column, _ in DIMENSIONS:
+        statements += [
+            f"CREATE TEMP TABLE {table} (id serial PRIMARY KEY, name varchar(255) NOT NULL UNIQUE)",
+            f"INSERT INTO {table} (name) SELECT DISTINCT {column} FROM {LEGACY_TABLE} WHERE {column} IS NOT NULL",
+        ]
+    statements += [
+        "CREATE TEMP TABLE bench_lessons (id smallserial PRIMARY KEY, time_lesson varchar(50) NOT NULL UNIQUE, starts_at smallint)",
+        f"""
+        INSERT INTO bench_lessons (time_lesson, starts_at)
+        SELECT time_lesson,
+               substring(time_lesson from '^(\\d{{1,2}})[:.]\\d{{2}}')::smallint * 60
+               + substring(time_lesson from '^\\d{{1,2}}[:.](\\d{{2}})')::smallint
+        FROM (SELECT DISTINCT time_lesson FROM {LEGACY_TABLE}) AS lessons
+        """,
+        f"""
+        CREATE TEMP TABLE {BENCH_TABLE} (
+            id integer PRIMARY KEY,
+            date date NOT NULL,
+            lesson_id smallint NOT NULL,
+            {", ".join(f"{key} integer" for _, _, key in DIMENSIONS)},
+            slot_position smallint NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        INSERT INTO {BENCH_TABLE} (id, date, lesson_id, {", ".join(key for _, _, key in DIMENSIONS)}, slot_position)
+        SELECT s.id, s.date, bench_lessons.id, {", ".join(f"{table}.id" for table, _, _ in DIMENSIONS)}, s.slot_position
+        FROM {LEGACY_TABLE} AS s
+        JOIN bench_lessons ON bench_lessons.time_lesson = s.time_lesson
+        {" ".join(f"LEFT JOIN {table} ON {table}.name = s.{column}" for table, column, _ in DIMENSIONS)}
+        """,
+    ]
+    return statements
+
+
+async def explain(conn, source: str, where: str, params: dict) -> dict:
+    result = await conn.execute(
+        text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT * FROM {source} WHERE {where}"), params
+    )
+    plan = result.scalar()[0]
+    root = plan["Plan"]
+    nodes = []
+
+    def walk(node):
+        nodes.append(node["Node Type"] + (f" ({node['Index Name']})" if "Index Name" in node else ""))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(root)
+    return {
+        "plan": nodes,
+        "rows": root["Actual Rows"],
+        # Временная таблица читается через локальные буферы сеанса
+        "buffers": sum(root.get(f"{kind} {op} Blocks", 0) for kind in ("Shared", "Local") for op in ("Hit", "Read")),
+        "execution_ms": round(plan["Execution Time"], 3),
+    }
+
+
+async def explain_all(conn, source: str, queries: dict, params: dict, repeat: int) -> dict:
+    plans = {}
+    for name, where in queries.items():
+        # Первый запуск прогревает кэш, в отчёт идёт лучший из repeat
+        runs = [await explain(conn, source, where, params) for _ in range(repeat + 1)][1:]
+        plans[name] = min(runs, key=lambda run: run["execution_ms"])
+    return plans
+
+
+def index_sql() -> list:
+    legacy = [
+        f"CREATE {'UNIQUE ' if columns[-1] == 'slot_position' else ''}INDEX ON {LEGACY_TABLE} ({', '.join(columns)})"
+        for columns in LEGACY_INDEXES
+    ]
+    normalized = []
+    for index in Schedule.__table__.indexes:
+        columns = ", ".join(column.name for column in index.columns)
+        normalized.append(f"CREATE {'UNIQUE ' if index.unique else ''}INDEX ON {BENCH_TABLE} ({columns})")
+    return legacy + normalized
+
+
+async def sizes(conn, tables: list) -> dict:
+    """Размер данных и индексов набора таблиц в байтах."""
+    result = await conn.execute(
+        text(
+            "SELECT sum(pg_table_size(to_regclass(name))), sum(pg_indexes_size(to_regclass(name))) "
+            "FROM unnest(CAST(:tables AS text[])) AS name"
+        ),
+        {"tables": tables},
+    )
+    table_bytes, index_bytes = result.one()
+    return {"table_bytes": int(table_bytes), "index_bytes": int(index_bytes)}
+
+
+async def run(args) -> dict:
+    first_day = datetime.date(2026, 9, 1)
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT setseed(:seed)"), {"seed": 0.42})
+        await conn.execute(text(f"CREATE TEMP TABLE {LEGACY_TABLE} ({LEGACY_COLUMNS})"))
+        await conn.execute(
+            text(generate_sql(args.weeks, args.cabinets, args.groups, args.teachers, args.departments)),
+            {"first_day": first_day, "occupancy": args.occupancy},
+        )
+        for statement in normalize_sql():
+            await conn.execute(text(statement))
+        await conn.execute(text(f"ANALYZE {LEGACY_TABLE}"))
+        total = (await conn.execute(text(f"SELECT count(*) FROM {LEGACY_TABLE}"))).scalar()
+
+        sample = (await conn.execute(text(
+            f"SELECT date, time_lesson, cabinet_number, name_group, name_teacher, department "
+            f"FROM {LEGACY_TABLE} ORDER BY date, time_lesson, cabinet_number OFFSET :offset LIMIT 1"
+        ), {"offset": total // 2})).one()
+        params = {
+            "day": sample.date,
+            "time_lesson": sample.time_lesson,
+            "cabinet": sample.cabinet_number,
+            "group": sample.name_group,
+            "teacher": sample.name_teacher,
+            "department": sample.department,
+            "start": sample.date - datetime.timedelta(days=7),
+            "end": sample.date + datetime.timedelta(days=7),
+        }
+
+        before = await explain_all(conn, LEGACY_TABLE, QUERIES, params, args.repeat)
+        for statement in index_sql():
+            await conn.execute(text(statement))
+        for table in [LEGACY_TABLE, BENCH_TABLE, "bench_lessons", *(table for table, _, _ in DIMENSIONS)]:
+            await conn.execute(text(f"ANALYZE {table}"))
+        after = await explain_all(conn, LEGACY_TABLE, QUERIES, params, args.repeat)
+        normalized = await explain_all(conn, NORMALIZED_FROM, NORMALIZED_QUERIES, params, args.repeat)
+        storage = {
+            "legacy": await sizes(conn, [LEGACY_TABLE]),
+            "normalized": await sizes(conn, [BENCH_TABLE]),
+            "dimensions": await sizes(conn, ["bench_lessons", *(table for table, _, _ in DIMENSIONS)]),
+        }
+        await conn.rollback()
+    await engine.dispose()
+
+    return {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "rows": total,
+        "indexes": index_sql(),
+        "storage": storage,
+        "queries": {
+            name: {"before": before[name], "after": after[name], "normalized": normalized[name]} for name in QUERIES
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=18)
+    parser.add_argument("--cabinets", type=int, default=300)
+    parser.add_argument("--occupancy", type=float, default=0.6)
+    parser.add_argument("--groups", type=int, default=400)
+    parser.add_argument("--teachers", type=int, default=600)
+    parser.add_argument("--departments", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="файл JSON с планами")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    report = asyncio.run(run(args))
+    print(f"Строк в таблице: {report['rows']}")
+    for name, size in report["storage"].items():
+        print(f"{name:12s} данные {size['table_bytes'] / 2**20:7.2f} МБ, индексы {size['index_bytes'] / 2**20:7.2f} МБ")
+    for name, plans in report["queries"].items():
+        before, after, normalized = plans["before"], plans["after"], plans["normalized"]
+        print(
+            f"{name:26s} {before['execution_ms']:9.2f} -> {after['execution_ms']:7.2f} -> "
+            f"{normalized['execution_ms']:7.2f} мс, буферов {before['buffers']:6d} -> {after['buffers']:4d} -> "
+            f"{normalized['buffers']:4d}, строк {after['rows']}/{normalized['rows']}"
+        )
+        print(f"{'':26s} {before['plan'][-1]} -> {after['plan'][-1]}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
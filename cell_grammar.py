@@ -0,0 +1,128 @@
+import functools
+import os
+import re
+from typing import NamedTuple, Optional, Tuple
+
+# Единый разбор текста ячеек расписания для всех трёх форматов файлов:
+# занятость аудиторий (extract_room_rows), расписание преподавателя
+# (extract_teacher_rows) и расписание колледжа из VK. Шаблоны
+# компилируются один раз, результаты кэшируются: одинаковые тексты
+# ячеек повторяются тысячи раз за семестр.
+
+CELL_CACHE_SIZE = int(os.getenv("PARSER_CELL_CACHE_SIZE", "65536"))
+
+# Время пары по её номеру. Модуль без тяжёлых зависимостей, поэтому
+# таблицу берут и разборщики, и API (free_rooms) без загрузки pandas
+time_from_pair = {
+    "1 пара": "8:20-9:50",
+    "2 пара": "10:00-11:30",
+    "3 пара": "11:45-13:15",
+    "4 пара": "14:00-15:30",
+    "5 пара": "15:45-17:15",
+    "6 пара": "17:20-18:50",
+    "7 пара": "18:55-20:15",
+}
+
+# Группа вида "ИГЭ-171-23-01"
+GROUP_RE = re.compile(r'([А-Яа-я0-9-]+-\d+-\d+-\d+)')
+# Аудитория вида "3-101" в файлах колледжа
+COLLEGE_CABINET_RE = re.compile(r"^\d{1,2}-\d{1,3}$")
+# Строка с преподавателем: "... Иванов И.И."
+COLLEGE_TEACHER_RE = re.compile(r".+\s[А-ЯЁ]\.[А-ЯЁ]\.")
+COLLEGE_LESSON_TYPES = ("занятие", "Лекция", "урок")
+
+
+class CellEntry(NamedTuple):
+    """Одно занятие из ячейки расписания."""
+    group: Optional[str]
+    teacher: Optional[str]
+    discipline: str
+    cabinet: Optional[str] = None
+    subgroup: Optional[str] = None
+    lesson_type: Optional[str] = None
+
+
+@functools.lru_cache(maxsize=CELL_CACHE_SIZE)
+def parse_room_cell(text: str) -> Tuple[CellEntry, ...]:
+    """Ячейка файла занятости аудиторий: по занятию на строку.
+
+    Строка имеет вид "[вид] группа дисциплина [Фамилия И.О.]", где группа -
+    одно слово или три слова, если первое заканчивается запятой.
+    """
+    entries = []
+    for line in text.split("\n"):
+        tokens = line.split()
+        # Короткий первый токен - вид занятия ("Лек", "Пр", "Лаб")
+        if len(tokens[0]) <= 3:
+            tokens = tokens[1:]
+
+        teacher = None
+        if tokens[-1].count(".") == 2:
+            teacher = " ".join(tokens[-2:])
+            tokens = tokens[:-2]
+
+        if tokens[0][-1] == ",":
+            group = " ".join(tokens[:3])
+            tokens = tokens[3:]
+        else:
+            group = tokens[0]
+            tokens = tokens[1:]
+
+        entries.append(CellEntry(group, teacher, " ".join(tokens)))
+    return tuple(entries)
+
+
+@functools.lru_cache(maxsize=CELL_CACHE_SIZE)
+def parse_teacher_info(text: str) -> CellEntry:
+    """Столбец "дисциплина и группа" файла преподавателя.
+
+    Группа ищется одним поиском; если в тексте есть слово "кафедра",
+    всё начиная с него отбрасывается.
+    """
+    group = "Unknown"
+    discipline = text
+    if "кафедра" in text.lower():
+        parts = text.split("кафедра")
+        discipline = parts[0].strip()
+        if len(parts) > 1:
+            group_match = GROUP_RE.search(discipline)
+            if group_match:
+                group = group_match.group(0)
+                discipline = discipline.replace(group, "").strip()
+    else:
+        group_match = GROUP_RE.search(text)
+        if group_match:
+            group = group_match.group(0)
+            discipline = text.replace(group, "").strip()
+    return CellEntry(group, None, discipline)
+
+
+@functools.lru_cache(maxsize=CELL_CACHE_SIZE)
+def parse_college_cell(text: str) -> CellEntry:
+    """Ячейка расписания колледжа: аудитория, преподаватель, вид занятия,
+    подгруппа и дисциплина по строкам. Отсутствующие поля - пустые строки.
+    """
+    discipline = []
+    teacher = cabinet = lesson_type = subgroup = ""
+    for line in text.strip().split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if COLLEGE_CABINET_RE.match(line):
+            cabinet = line
+        elif COLLEGE_TEACHER_RE.match(line):
+            teacher = line
+        elif any(word in line for word in COLLEGE_LESSON_TYPES):
+            lesson_type = line
+        elif "подгруппа" in line:
+            subgroup = line
+        else:
+            discipline.append(line)
+    return CellEntry(None, teacher, " ".join(discipline), cabinet, subgroup, lesson_type)
+
+
+def cache_info() -> dict:
+    return {
+        func.__name__: func.cache_info()._asdict()
+        for func in (parse_room_cell, parse_teacher_info, parse_college_cell)
+    }
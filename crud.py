@@ -1,133 +1,280 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func
-from models import Schedule, User
+from sqlalchemy import select, delete, exists, func, tuple_, and_, or_, any_
+from models import (
+    Schedule, ScheduleRow, ScheduleCabinet, ScheduleDepartment, ScheduleDiscipline, ScheduleGroup, ScheduleLesson,
+    ScheduleTeacher, User, lesson_slot,
+)
 from schemas import UserCreate, ScheduleOut
 from security import get_password_hash
 from sqlalchemy import cast, Date
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+import base64
+import collections
+import binascii
 import logging
+from logging_config import setup_logging
+from response_cache import cached
+import response_cache
+from dbrequests import bump_schedule_version
+import schedule_index
+import free_rooms
 import models, schemas
 
-# Настройка логирования для вывода в stdout
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
 logger = logging.getLogger(__name__)
 
-async def get_schedule_by_date_and_group(session: AsyncSession, date: date, name_group: str) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для группы {name_group!r} на {date}")
-    result = await session.execute(
-        select(Schedule).filter(Schedule.date == date, Schedule.name_group == name_group)
+# Поля ScheduleOut в порядке ответа; fields= выбирает из них
+SCHEDULE_FIELDS = tuple(ScheduleOut.model_fields)
+MAX_PAGE_SIZE = 5000
+
+# Поле ответа с названием из справочника: справочник, ключ в schedules и столбец названия
+DIMENSION_FIELDS = {
+    "time_lesson": (ScheduleLesson, Schedule.lesson_id, ScheduleLesson.time_lesson),
+    "cabinet_number": (ScheduleCabinet, Schedule.cabinet_id, ScheduleCabinet.name),
+    "name_group": (ScheduleGroup, Schedule.group_id, ScheduleGroup.name),
+    "name_teacher": (ScheduleTeacher, Schedule.teacher_id, ScheduleTeacher.name),
+    "name_discipline": (ScheduleDiscipline, Schedule.discipline_id, ScheduleDiscipline.name),
+    "department": (ScheduleDepartment, Schedule.department_id, ScheduleDepartment.name),
+}
+
+# Вид запроса пакетного поиска - поле ответа с названием ключа
+LOOKUP_FIELDS = {
+    "group": "name_group",
+    "teacher": "name_teacher",
+    "cabinet": "cabinet_number",
+    "department": "department",
+}
+
+class SchedulePage(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+
+def encode_cursor(day: date, slot: int, id_: int) -> str:
+    """Курсор страницы: ключ (date, пара, id) последней отданной записи."""
+    return base64.urlsafe_b64encode(f"{day.isoformat()},{slot},{id_}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[date, int, int]:
+    try:
+        day, slot, id_ = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(",")
+        return date.fromisoformat(day), int(slot), int(id_)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Неверный курсор: {cursor}") from e
+
+def select_schedule(fields: Sequence[str]):
+    """id, date и поля fields записей schedules; соединяются только нужные справочники."""
+    query = select(Schedule.id, Schedule.date).join(ScheduleLesson, ScheduleLesson.id == Schedule.lesson_id)
+    for field in fields:
+        if field not in DIMENSION_FIELDS:
+            continue
+        model, key, name = DIMENSION_FIELDS[field]
+        if model is not ScheduleLesson:
+            # Кафедра может быть не указана: внешнее соединение, как в ScheduleRow
+            join = query.outerjoin if model is ScheduleDepartment else query.join
+            query = join(model, model.id == key)
+        query = query.add_columns(name.label(field))
+    return query
+
+@cached
+async def query_schedule(
+    session: AsyncSession,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    name_group: Optional[str] = None,
+    name_teacher: Optional[str] = None,
+    cabinet_number: Optional[str] = None,
+    department: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+) -> SchedulePage:
+    """Записи расписания по любому набору фильтров в порядке (date, пара, id).
+
+    Без fields записи возвращаются как ScheduleOut, с fields - словарями
+    только из этих полей, и из базы читаются только нужные справочники.
+    limit и after (курсор из next_cursor предыдущей страницы) дают
+    постраничную выдачу по ключу без OFFSET.
+    """
+    logger.debug(
+        "Запрос расписания: group=%r, teacher=%r, cabinet=%r, department=%r, с %s по %s, fields=%s, limit=%s",
+        name_group, name_teacher, cabinet_number, department, start_date, end_date, fields, limit,
     )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    unknown = set(fields or ()) - set(SCHEDULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    cursor = decode_cursor(after) if after else None
+
+    snapshot = schedule_index.current()
+    if snapshot is not None:
+        rows = snapshot.find(
+            start_date or date.min,
+            end_date or date.max,
+            group=name_group,
+            teacher=name_teacher,
+            cabinet=cabinet_number,
+            department=department,
+        )
+        rows = snapshot.after(rows, cursor)
+        last = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = snapshot.key(rows[-1])
+        items = snapshot.to_out(rows) if fields is None else snapshot.to_dicts(rows, fields)
+        return SchedulePage(items, encode_cursor(*last) if last else None)
 
+    query = select_schedule(fields or SCHEDULE_FIELDS).add_columns(lesson_slot.label("slot"))
+    # Фильтр по названию - это фильтр по ключу: индекс (ключ, date) используется напрямую
+    for field, value in (
+        ("name_group", name_group),
+        ("name_teacher", name_teacher),
+        ("cabinet_number", cabinet_number),
+        ("department", department),
+    ):
+        if value is not None:
+            model, key, name = DIMENSION_FIELDS[field]
+            query = query.where(key == select(model.id).where(name == value).scalar_subquery())
+    if start_date is not None:
+        query = query.where(Schedule.date >= start_date)
+    if end_date is not None:
+        query = query.where(Schedule.date <= end_date)
+    if cursor is not None:
+        query = query.where(tuple_(Schedule.date, lesson_slot, Schedule.id) > tuple_(*cursor))
+    query = query.order_by(Schedule.date, lesson_slot, Schedule.id)
+    if limit is not None:
+        # Лишняя запись показывает, что есть следующая страница
+        query = query.limit(limit + 1)
+
+    rows = (await session.execute(query)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].slot, rows[-1].id)
+    if fields is None:
+        items = [ScheduleOut(**row._mapping) for row in rows]
+    else:
+        items = [{field: row._mapping[field] for field in fields} for row in rows]
+    logger.debug("Найдено %d записей", len(items))
+    return SchedulePage(items, next_cursor)
+
+async def get_schedule_by_date_and_group(session: AsyncSession, date: date, name_group: str) -> List[ScheduleOut]:
+    page = await query_schedule(session, date, date, name_group=name_group)
+    return list(page.items)
 
 async def get_schedule_by_date_and_teacher(session: AsyncSession, date: date, name_teacher: str) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для преподавателя {name_teacher!r} на {date}")
-    result = await session.execute(
-        select(Schedule).filter(Schedule.date == date, Schedule.name_teacher == name_teacher)
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, date, date, name_teacher=name_teacher)
+    return list(page.items)
 
 async def get_schedule_by_group_and_date_range(session: AsyncSession, name_group: str, start_date: date, end_date: date) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для группы {name_group!r} с {start_date} по {end_date}")
-    result = await session.execute(
-        select(Schedule).filter(
-            Schedule.name_group == name_group,
-            Schedule.date.between(start_date, end_date)
-        ).order_by(Schedule.date, Schedule.time_lesson)
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, start_date, end_date, name_group=name_group)
+    return list(page.items)
 
 async def get_schedule_by_teacher_and_date_range(session: AsyncSession, name_teacher: str, start_date: date, end_date: date) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для преподавателя {name_teacher!r} с {start_date} по {end_date}")
-    result = await session.execute(
-        select(Schedule).filter(
-            Schedule.name_teacher == name_teacher,
-            Schedule.date.between(start_date, end_date)
-        ).order_by(Schedule.date, Schedule.time_lesson)
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, start_date, end_date, name_teacher=name_teacher)
+    return list(page.items)
 
 async def get_schedule_by_date_and_department(session: AsyncSession, date: date, department: str) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для кафедры {department!r} на {date}")
-    result = await session.execute(
-        select(Schedule).filter(Schedule.date == date, Schedule.department == department)
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, date, date, department=department)
+    return list(page.items)
 
 async def get_schedule_by_department(session: AsyncSession, department: str, start_date: date, end_date: date) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для кафедры {department!r} с {start_date} по {end_date}")
-    result = await session.execute(
-        select(Schedule).filter(
-            Schedule.department == department,
-            Schedule.date.between(start_date, end_date)
-        ).order_by(Schedule.date, Schedule.time_lesson)
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, start_date, end_date, department=department)
+    return list(page.items)
 
 async def get_schedule_by_date_department_teacher(session: AsyncSession, date: date, department: str, name_teacher: str) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для кафедры {department!r} и преподавателя {name_teacher!r} на {date}")
-    result = await session.execute(
-        select(Schedule).filter(
-            Schedule.date == date,
-            Schedule.department == department,
-            Schedule.name_teacher == name_teacher
-        )
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, date, date, department=department, name_teacher=name_teacher)
+    return list(page.items)
 
 async def get_schedule_by_department_teacher_range(session: AsyncSession, department: str, name_teacher: str, start_date: date, end_date: date) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для кафедры {department!r} и преподавателя {name_teacher!r} с {start_date} по {end_date}")
-    result = await session.execute(
-        select(Schedule).filter(
-            Schedule.department == department,
-            Schedule.name_teacher == name_teacher,
-            Schedule.date.between(start_date, end_date)
-        ).order_by(Schedule.date, Schedule.time_lesson)
+    page = await query_schedule(session, start_date, end_date, department=department, name_teacher=name_teacher)
+    return list(page.items)
+
+async def get_schedule_batch(session: AsyncSession, lookups: Sequence[schemas.ScheduleLookup]) -> List[List[ScheduleOut]]:
+    """Расписание для нескольких запросов (группа, преподаватель, кабинет,
+    кафедра на дату или период) одним запросом к базе.
+
+    Ключи каждого вида собираются в один IN с границами дат этого вида,
+    найденные записи раскладываются по запросам в порядке (date, пара, id).
+    Запись, подходящая нескольким запросам, попадает в ответ каждого.
+    """
+    logger.debug("Пакетный запрос расписания: %d запросов", len(lookups))
+    results = [[] for _ in lookups]
+    snapshot = schedule_index.current()
+    if snapshot is not None:
+        for number, lookup in enumerate(lookups):
+            rows = snapshot.find(lookup.start_date, lookup.end_date, **{lookup.kind: lookup.key.strip()})
+            results[number] = snapshot.to_out(rows)
+        return results
+
+    # поле -> название -> [(номер запроса, начало, конец)]
+    wanted = collections.defaultdict(lambda: collections.defaultdict(list))
+    for number, lookup in enumerate(lookups):
+        wanted[LOOKUP_FIELDS[lookup.kind]][lookup.key.strip()].append((number, lookup.start_date, lookup.end_date))
+
+    conditions = []
+    for field, by_name in wanted.items():
+        model, key, name = DIMENSION_FIELDS[field]
+        ranges = [found for found_list in by_name.values() for found in found_list]
+        # Одно условие на вид ключа с общими для вида границами дат. ARRAY(...)
+        # вычисляется один раз до запроса, и = ANY идёт по индексу (ключ, date);
+        # IN (подзапрос) проверялся бы фильтром по всем строкам периода
+        conditions.append(and_(
+            key == any_(func.array(select(model.id).where(name.in_(list(by_name))).scalar_subquery())),
+            Schedule.date >= min(start for _, start, _ in ranges),
+            Schedule.date <= max(end for _, _, end in ranges),
+        ))
+    query = (
+        select_schedule(SCHEDULE_FIELDS)
+        .where(or_(*conditions))
+        .order_by(Schedule.date, lesson_slot, Schedule.id)
     )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    rows = (await session.execute(query)).all()
+    for row in rows:
+        record = None
+        for field, by_name in wanted.items():
+            for number, start, end in by_name.get(row._mapping[field], ()):
+                if start <= row.date <= end:
+                    record = record or ScheduleOut(**row._mapping)
+                    results[number].append(record)
+    logger.debug("Найдено %d записей для %d запросов", len(rows), len(lookups))
+    return results
 
+@cached
 async def get_free_cabinets(session: AsyncSession, date: date, time_lesson: str) -> List[str]:
-    logger.info(f"Запрос свободных кабинетов на {date} в {time_lesson}")
-    # Получаем все кабинеты
+    logger.debug("Запрос свободных кабинетов на %s в %s", date, time_lesson)
+    matrix = free_rooms.current()
+    if matrix is not None:
+        return matrix.free([date], [time_lesson])
+    snapshot = schedule_index.current()
+    if snapshot is not None:
+        return snapshot.free_cabinets(date, time_lesson)
+    # Получаем все кабинеты, у которых есть хотя бы одна запись
     all_cabinets_result = await session.execute(
-        select(Schedule.cabinet_number).distinct()
+        select(ScheduleCabinet.name).where(exists().where(Schedule.cabinet_id == ScheduleCabinet.id))
     )
     all_cabinets = [row[0] for row in all_cabinets_result.fetchall()]
     
     # Получаем занятые кабинеты
     occupied_result = await session.execute(
-        select(Schedule.cabinet_number).filter(
-            Schedule.date == date,
-            Schedule.time_lesson == time_lesson,
-            Schedule.name_group != "Unknown"
+        select(ScheduleRow.cabinet_number).filter(
+            ScheduleRow.date == date,
+            ScheduleRow.time_lesson == time_lesson,
+            ScheduleRow.name_group != "Unknown"
         )
     )
     occupied_cabinets = [row[0] for row in occupied_result.fetchall()]
     
     # Свободные кабинеты
     free_cabinets = sorted(list(set(all_cabinets) - set(occupied_cabinets)))
-    logger.info(f"Найдено {len(free_cabinets)} свободных кабинетов")
+    logger.debug("Найдено %d свободных кабинетов", len(free_cabinets))
     return free_cabinets
 
+@cached
 async def get_free_cabinets_range(session: AsyncSession, start_date: date, end_date: date, time_lesson: str) -> List[dict]:
-    logger.info(f"Запрос свободных кабинетов с {start_date} по {end_date} в {time_lesson}")
+    logger.debug("Запрос свободных кабинетов с %s по %s в %s", start_date, end_date, time_lesson)
+    matrix = free_rooms.current()
+    if matrix is not None:
+        return matrix.free_by_day(start_date, end_date, time_lesson)
     results = []
     current_date = start_date
     while current_date <= end_date:
@@ -138,34 +285,53 @@ async def get_free_cabinets_range(session: AsyncSession, start_date: date, end_d
             "free_cabinets": free_cabinets
         })
         current_date += timedelta(days=1)
-    logger.info(f"Найдено свободных кабинетов для {len(results)} дат")
+    logger.debug("Найдено свободных кабинетов для %d дат", len(results))
     return results
 
-async def get_schedule_by_date_and_cabinet(session: AsyncSession, date: date, cabinet_number: str) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для кабинета {cabinet_number!r} на {date}")
-    result = await session.execute(
-        select(Schedule).filter(Schedule.date == date, Schedule.cabinet_number == cabinet_number)
+@cached
+async def get_free_cabinets_window(
+    session: AsyncSession, start_date: date, end_date: date, time_lessons: Tuple[str, ...], weekdays: Optional[Tuple[int, ...]] = None
+) -> List[str]:
+    """Кабинеты, свободные во всех парах time_lessons во все даты периода
+    (при weekdays - только в эти дни недели, 1 - понедельник)."""
+    logger.debug("Запрос кабинетов, свободных с %s по %s в %s, дни недели %s", start_date, end_date, time_lessons, weekdays)
+    matrix = free_rooms.current()
+    dates = free_rooms.window_dates(start_date, end_date, weekdays)
+    if matrix is not None:
+        return matrix.free(dates, time_lessons)
+    all_cabinets_result = await session.execute(
+        select(ScheduleCabinet.name).where(exists().where(Schedule.cabinet_id == ScheduleCabinet.id))
+    )
+    all_cabinets = [row[0] for row in all_cabinets_result.fetchall()]
+    occupied_result = await session.execute(
+        select(ScheduleRow.cabinet_number).distinct().filter(
+            ScheduleRow.date.in_(dates),
+            ScheduleRow.time_lesson.in_(time_lessons),
+            ScheduleRow.name_group != "Unknown"
+        )
     )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    occupied_cabinets = [row[0] for row in occupied_result.fetchall()]
+    free_cabinets = sorted(set(all_cabinets) - set(occupied_cabinets))
+    logger.debug("Найдено %d свободных кабинетов", len(free_cabinets))
+    return free_cabinets
+
+async def get_schedule_by_date_and_cabinet(session: AsyncSession, date: date, cabinet_number: str) -> List[ScheduleOut]:
+    page = await query_schedule(session, date, date, cabinet_number=cabinet_number)
+    return list(page.items)
 
 async def get_schedule_by_cabinet_range(session: AsyncSession, cabinet_number: str, start_date: date, end_date: date) -> List[ScheduleOut]:
-    logger.info(f"Запрос расписания для кабинета {cabinet_number!r} с {start_date} по {end_date}")
-    result = await session.execute(
-        select(Schedule).filter(
-            Schedule.cabinet_number == cabinet_number,
-            Schedule.date.between(start_date, end_date)
-        ).order_by(Schedule.date, Schedule.time_lesson)
-    )
-    schedules = result.scalars().all()
-    logger.info(f"Найдено {len(schedules)} записей")
-    return [ScheduleOut.from_orm(schedule) for schedule in schedules]
+    page = await query_schedule(session, start_date, end_date, cabinet_number=cabinet_number)
+    return list(page.items)
 
 async def delete_old_schedules(session: AsyncSession, cutoff_date: date):
-    logger.info(f"Удаление расписания до {cutoff_date}")
-    await session.execute(delete(Schedule).where(Schedule.date < cutoff_date))
+    logger.info("Удаление расписания до %s", cutoff_date)
+    result = await session.execute(delete(Schedule).where(Schedule.date < cutoff_date))
+    # Без отпечатков удалённые слоты будут записаны заново при следующем разборе
+    await session.execute(delete(models.ScheduleSlotState).where(models.ScheduleSlotState.date < cutoff_date))
+    version = await bump_schedule_version(session) if result.rowcount else None
     await session.commit()
+    if version is not None:
+        response_cache.invalidate(version)
     logger.info("Старые записи удалены")
 
 async def create_user(session: AsyncSession, user: UserCreate) -> User:
@@ -195,9 +361,13 @@ async def create_task(session: AsyncSession, task: schemas.TaskCreate, user_id:
     await session.refresh(db_task)
     return db_task
 
+@cached
 async def get_unique_departments(session: AsyncSession) -> List[str]:
+    snapshot = schedule_index.current()
+    if snapshot is not None:
+        return snapshot.departments
     result = await session.execute(
-        select(Schedule.department).distinct().where(Schedule.department != None)
+        select(ScheduleDepartment.name).where(exists().where(Schedule.department_id == ScheduleDepartment.id))
     )
     departments = [row[0] for row in result.fetchall()]
     return departments
@@ -1,11 +1,23 @@
 from models import async_session
-from models import Schedule
-from sqlalchemy import select, update, delete
+from models import Schedule, FetchCache, ScheduleSlotState, ScheduleChange, ScheduleGeneration, ScheduleRunStaging
+from models import (
+    ScheduleCabinet, ScheduleDepartment, ScheduleDiscipline, ScheduleGroup, ScheduleLesson, ScheduleTeacher,
+)
+from sqlalchemy import select, update, delete, insert, tuple_, exists, func, true, cast, values, column
+from sqlalchemy import MetaData, Table, Column, Integer, SmallInteger, String, Date, Boolean
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import NamedTuple, Optional, Sequence, Iterable
 import datetime
+import hashlib
+import json
 import logging
+from logging_config import setup_logging
+import os
+import response_cache
+import uuid
 
-# Настройка логирования в stdout
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
 logger = logging.getLogger(__name__)
 
 def connection(func):
@@ -14,6 +26,76 @@ def connection(func):
             return await func(session, *args, **kwargs)
     return wrapper
 
+# Одна ячейка расписания (слот date/time_lesson/cabinet_number): empty очищает
+# слот, many оставляет все записи ячейки, department - кафедра из файла преподавателя
+class SlotUpdate(NamedTuple):
+    date: object
+    time_lesson: str
+    cabinet_number: str
+    name_of_group: Optional[Sequence[Optional[str]]] = None
+    name_teacher: Optional[Sequence[Optional[str]]] = None
+    name_of_discipline: Optional[Sequence[Optional[str]]] = None
+    empty: bool = False
+    many: bool = False
+    department: Optional[str] = None
+
+# Временная таблица для пакетной загрузки, существует только внутри транзакции
+staging_metadata = MetaData()
+schedules_staging = Table(
+    "schedules_staging",
+    staging_metadata,
+    Column("seq", Integer, nullable=False),
+    Column("date", Date, nullable=False),
+    Column("time_lesson", String(50), nullable=False),
+    Column("cabinet_number", String(50), nullable=False),
+    Column("name_group", String(255)),
+    Column("name_teacher", String(255)),
+    Column("name_discipline", String(255)),
+    Column("department", String(255)),
+    Column("position", Integer, nullable=False, default=0),
+    Column("fingerprint", String(32), nullable=False),
+    Column("source", String(1024)),
+    Column("changed", Boolean, nullable=False, default=False),
+    prefixes=["TEMPORARY"],
+)
+
+STAGING_CHUNK_SIZE = 5000
+
+# Публикация отменяется, если в затронутых слотах останется меньше
+# (1 - PARSER_MAX_SHRINK_RATIO) прежних записей: так битый файл или
+# недокачанный запуск не опустошает расписание. 1 отключает проверку.
+MAX_SHRINK_RATIO = float(os.getenv("PARSER_MAX_SHRINK_RATIO", "0.5"))
+SHRINK_CHECK_MIN_ROWS = 100
+
+def parse_date(date):
+    if isinstance(date, str):
+        try:
+            if len(date) == 8 and '.' in date:
+                return datetime.datetime.strptime(date, "%d.%m.%y").date()
+            return datetime.datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError as e:
+            logger.error("Ошибка формата даты: %s, %s", date, e)
+            raise ValueError(f"Неверный формат даты: {date}")
+    return date
+
+async def bump_schedule_version(session) -> int:
+    """Увеличивает поколение данных в текущей транзакции и возвращает новый номер.
+
+    Вызывается перед commit каждого изменения schedules: другие процессы
+    увидят новый номер одновременно с самими данными.
+    """
+    query = pg_insert(ScheduleGeneration).values(id=1, version=1)
+    query = query.on_conflict_do_update(
+        index_elements=[ScheduleGeneration.id],
+        set_={"version": ScheduleGeneration.version + 1},
+    ).returning(ScheduleGeneration.version)
+    return (await session.execute(query)).scalar()
+
+async def read_schedule_version(session) -> int:
+    """Поколение данных расписания, 0 если данные ещё не менялись."""
+    result = await session.execute(select(ScheduleGeneration.version).where(ScheduleGeneration.id == 1))
+    return result.scalar() or 0
+
 @connection
 async def delete_outdated_schedules(session):
     two_weeks_ago = datetime.datetime.now().date() - datetime.timedelta(weeks=2)
@@ -21,129 +103,489 @@ async def delete_outdated_schedules(session):
     result = await session.execute(
         delete(Schedule).where(Schedule.date < two_weeks_ago)
     )
+    await session.execute(delete(ScheduleSlotState).where(ScheduleSlotState.date < two_weeks_ago))
+    await session.execute(delete(ScheduleChange).where(ScheduleChange.date < two_weeks_ago))
+    # Буфер запусков, оборвавшихся до публикации
+    await session.execute(
+        delete(ScheduleRunStaging).where(
+            ScheduleRunStaging.staged_at < datetime.datetime.now() - datetime.timedelta(days=1)
+        )
+    )
+    version = await bump_schedule_version(session) if result.rowcount else None
     await session.commit()
-    logger.info(f"Удалено {result.rowcount} устаревших записей")
+    if version is not None:
+        response_cache.invalidate(version)
+    logger.info("Удалено %d устаревших записей", result.rowcount)
 
-@connection
-async def update_schedule(
-    session,
-    date,
-    time_lesson,
-    cabinet_number,
-    name_of_group,
-    name_teacher,
-    name_of_discipline,
-    *,
-    empty=False,
-    many=False,
-    department=None
-):
-    if isinstance(date, str):
-        try:
-            if len(date) == 8 and '.' in date:
-                date = datetime.datetime.strptime(date, "%d.%m.%y").date()
-            else:
-                date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        except ValueError as e:
-            logger.error(f"Ошибка формата даты: {date}, {e}")
-            raise ValueError(f"Неверный формат даты: {date}")
+def resolve_slots(rows: Iterable[SlotUpdate]) -> dict:
+    """Сворачивает поток обновлений в итоговое содержимое каждого слота.
 
-    logger.info(f"Обновление расписания: date={date}, time_lesson={time_lesson}, cabinet_number={cabinet_number}, empty={empty}, many={many}, department={department}")
-    
-    query = select(Schedule).where(
-        Schedule.date == date,
-        Schedule.time_lesson == time_lesson,
-        Schedule.cabinet_number == cabinet_number,
+    empty очищает слот, many оставляет все записи ячейки, иначе в слоте
+    остаётся только первая запись. Для одного слота побеждает последнее
+    обновление.
+    """
+    slots = {}
+    for row in rows:
+        row = SlotUpdate(*row)
+        key = (parse_date(row.date), row.time_lesson, row.cabinet_number)
+        if row.empty:
+            slots[key] = []
+            continue
+        count = len(row.name_of_group) if row.many else 1
+        slots[key] = [
+            {
+                "name_group": row.name_of_group[i] or "Unknown",
+                "name_teacher": row.name_teacher[i] or "Unknown",
+                "name_discipline": row.name_of_discipline[i] or "Unknown",
+                "department": row.department,
+            }
+            for i in range(count)
+        ]
+    return slots
+
+def slot_fingerprint(records: list) -> str:
+    """Отпечаток содержимого слота: одинаковые записи в том же порядке дают тот же хэш."""
+    payload = json.dumps(records, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+def staging_rows(slots: dict, source: Optional[str] = None, **extra) -> list:
+    """Строки буфера для свёрнутых слотов: по строке на запись, пустой слот - один ключ."""
+    staged = []
+    for seq, ((date, time_lesson, cabinet_number), records) in enumerate(slots.items()):
+        base = {
+            **extra,
+            "seq": seq,
+            "date": date,
+            "time_lesson": time_lesson,
+            "cabinet_number": cabinet_number,
+            "fingerprint": slot_fingerprint(records),
+            "source": source,
+            "changed": False,
+        }
+        if not records:
+            # Пустой слот: только ключ, чтобы DELETE очистил ячейку
+            staged.append({
+                **base, "name_group": None, "name_teacher": None, "name_discipline": None, "department": None, "position": 0,
+            })
+        for position, record in enumerate(records):
+            staged.append({**base, **record, "position": position})
+    return staged
+
+async def insert_staging_rows(session, table, staged: list) -> None:
+    for start in range(0, len(staged), STAGING_CHUNK_SIZE):
+        await session.execute(insert(table), staged[start:start + STAGING_CHUNK_SIZE])
+
+# Справочники названий и столбцы буфера, из которых они пополняются
+DIMENSIONS = [
+    (ScheduleGroup, "name_group"),
+    (ScheduleTeacher, "name_teacher"),
+    (ScheduleDiscipline, "name_discipline"),
+    (ScheduleDepartment, "department"),
+    (ScheduleCabinet, "cabinet_number"),
+]
+
+def lesson_starts_at(time_lesson):
+    """Начало пары в минутах от полуночи из строки вида '8:30-10:00' или '8.30-10.00'."""
+    return (
+        cast(func.substring(time_lesson, r"^(\d{1,2})[:.]\d{2}"), SmallInteger) * 60
+        + cast(func.substring(time_lesson, r"^\d{1,2}[:.](\d{2})"), SmallInteger)
+    )
+
+async def ensure_dimensions(session, table, condition) -> None:
+    """Добавляет в справочники названия изменённых слотов, которых там ещё нет.
+
+    Проверка NOT EXISTS идёт до вставки, а не только через ON CONFLICT:
+    конфликтующая вставка всё равно расходует значение последовательности,
+    а ключ пары - smallint.
+    """
+    staging = table.c
+    for model, column in DIMENSIONS:
+        names = (
+            select(staging[column])
+            .where(condition, staging.changed, staging[column].isnot(None), ~exists().where(model.name == staging[column]))
+            .distinct()
+        )
+        await session.execute(
+            pg_insert(model).from_select(["name"], names).on_conflict_do_nothing(index_elements=[model.name])
+        )
+    lessons = (
+        select(staging.time_lesson, lesson_starts_at(staging.time_lesson))
+        .where(condition, staging.changed, ~exists().where(ScheduleLesson.time_lesson == staging.time_lesson))
+        .distinct()
+    )
+    await session.execute(
+        pg_insert(ScheduleLesson)
+        .from_select(["time_lesson", "starts_at"], lessons)
+        .on_conflict_do_nothing(index_elements=[ScheduleLesson.time_lesson])
+    )
+
+def slot_ids(table):
+    """Ключи слотов буфера в кодах справочников: (date, lesson_id, cabinet_id).
+    Слоты с парой или кабинетом, которых нет в справочниках, в schedules
+    записей не имеют и в выборку не попадают."""
+    staging = table.c
+    return (
+        select(staging.date, ScheduleLesson.id, ScheduleCabinet.id)
+        .select_from(table)
+        .join(ScheduleLesson, ScheduleLesson.time_lesson == staging.time_lesson)
+        .join(ScheduleCabinet, ScheduleCabinet.name == staging.cabinet_number)
+    )
+
+SLOT_OPERATION_STATS = {"insert": "slots_inserted", "update": "slots_updated", "delete": "slots_deleted"}
+
+def empty_stats() -> dict:
+    """Счётчики записи: slots/changed - слоты, deleted/inserted - строки
+    schedules, slots_* - изменённые слоты по видам операций журнала."""
+    return {
+        "slots": 0,
+        "changed": 0,
+        "deleted": 0,
+        "inserted": 0,
+        "slots_inserted": 0,
+        "slots_updated": 0,
+        "slots_deleted": 0,
+    }
+
+async def keep_departments(session, deleted_rows) -> None:
+    """Возвращает кафедру записям слота, источник которых кафедру не знает.
+
+    Кафедру дают только файлы преподавателей, а слот заменяется целиком
+    файлом любого источника. Если изменился файл аудитории, а файл
+    преподавателя пропущен кэшем загрузок, записи слота пришли бы без
+    кафедры. Поэтому новая запись без кафедры получает кафедру прежней
+    записи того же слота с той же группой (названия групп в файлах
+    аудиторий и преподавателей совпадают, имена преподавателей - нет).
+    """
+    carried = {
+        (date, lesson_id, cabinet_id, group_id): department_id
+        for date, _, _, lesson_id, cabinet_id, group_id, department_id in deleted_rows
+        if department_id is not None
+    }
+    if not carried:
+        return
+    records = [(*key, department_id) for key, department_id in carried.items()]
+    for start in range(0, len(records), STAGING_CHUNK_SIZE):
+        previous = values(
+            column("date", Date),
+            column("lesson_id", SmallInteger),
+            column("cabinet_id", Integer),
+            column("group_id", Integer),
+            column("department_id", Integer),
+            name="previous",
+        ).data(records[start:start + STAGING_CHUNK_SIZE])
+        await session.execute(
+            update(Schedule)
+            .where(
+                Schedule.date == previous.c.date,
+                Schedule.lesson_id == previous.c.lesson_id,
+                Schedule.cabinet_id == previous.c.cabinet_id,
+                Schedule.group_id == previous.c.group_id,
+                Schedule.department_id.is_(None),
+                # "Unknown" - не группа: по нему занятия не сопоставить
+                Schedule.group_id.notin_(select(ScheduleGroup.id).where(ScheduleGroup.name == "Unknown")),
+            )
+            .values(department_id=previous.c.department_id)
+        )
+
+async def merge_staged(session, table, condition=true(), expected_rows: Optional[int] = None) -> dict:
+    """Переносит содержимое буфера в schedules внутри текущей транзакции.
+
+    Перед изменениями проверяется число строк в буфере и то, что слоты
+    не теряют большую часть записей. Слоты, чей отпечаток совпадает с
+    schedule_slot_state, не трогаются; для остальных новые названия
+    добавляются в справочники, затем слоты заменяются одним DELETE и одним
+    INSERT ... SELECT с кодами справочников (кафедра прежних записей
+    сохраняется, см. keep_departments), а каждое фактическое изменение
+    записывается в журнал schedule_changes.
+    """
+    staging = table.c
+    state = ScheduleSlotState
+    slot_keys = slot_ids(table).where(condition)
+    schedule_key = tuple_(Schedule.date, Schedule.lesson_id, Schedule.cabinet_id)
+
+    staged_rows, new_rows, slot_count = (
+        await session.execute(
+            select(
+                func.count(),
+                func.count(staging.name_group),
+                func.count(tuple_(staging.date, staging.time_lesson, staging.cabinet_number).distinct()),
+            ).where(condition)
+        )
+    ).one()
+    stats = {**empty_stats(), "slots": slot_count}
+    if expected_rows is not None and staged_rows != expected_rows:
+        raise ValueError(f"В буфере {staged_rows} строк вместо {expected_rows}")
+    if not staged_rows:
+        return stats
+
+    old_rows = (
+        await session.execute(select(func.count()).select_from(Schedule).where(schedule_key.in_(slot_keys)))
+    ).scalar()
+    if MAX_SHRINK_RATIO < 1 and old_rows >= SHRINK_CHECK_MIN_ROWS and new_rows < old_rows * (1 - MAX_SHRINK_RATIO):
+        raise ValueError(f"Публикация отменена: в затронутых слотах останется {new_rows} записей из {old_rows}")
+
+    # Слот изменился, если для него нет отпечатка или отпечаток другой
+    await session.execute(
+        update(table)
+        .where(condition)
+        .values(
+            changed=~exists().where(
+                state.date == staging.date,
+                state.time_lesson == staging.time_lesson,
+                state.cabinet_number == staging.cabinet_number,
+                state.fingerprint == staging.fingerprint,
+            )
+        )
     )
-    data = (await session.execute(query)).scalars().all()
-
-    if empty:
-        if data:
-            delete_query = delete(Schedule).where(
-                Schedule.date == date,
-                Schedule.time_lesson == time_lesson,
-                Schedule.cabinet_number == cabinet_number,
+    changed = (
+        await session.execute(
+            select(
+                staging.date,
+                staging.time_lesson,
+                staging.cabinet_number,
+                staging.fingerprint,
+                staging.source,
+                func.count(staging.name_group),
             )
-            result = await session.execute(delete_query)
-            await session.commit()
-            logger.info(f"Удалено {result.rowcount} записей (empty=True)")
-    else:
-        if not data:
-            for i in range(len(name_of_group)):
-                new_record = Schedule(
-                    date=date,
-                    time_lesson=time_lesson,
-                    cabinet_number=cabinet_number,
-                    name_group=name_of_group[i] or "Unknown",
-                    name_teacher=name_teacher[i] or "Unknown",
-                    name_discipline=name_of_discipline[i] or "Unknown",
-                    department=department
-                )
-                session.add(new_record)
-            await session.commit()
-            logger.info(f"Добавлено {len(name_of_group)} новых записей")
+            .where(condition, staging.changed)
+            .group_by(staging.date, staging.time_lesson, staging.cabinet_number, staging.fingerprint, staging.source)
+        )
+    ).all()
+    if not changed:
+        return stats
+
+    await ensure_dimensions(session, table, condition)
+    changed_keys = slot_keys.where(staging.changed)
+    # Журнал и отпечатки ведутся по названиям, поэтому удалённые ключи
+    # возвращаются в виде строк; коды нужны для переноса кафедры
+    deleted = await session.execute(
+        delete(Schedule)
+        .where(schedule_key.in_(changed_keys))
+        .returning(
+            Schedule.date,
+            select(ScheduleLesson.time_lesson).where(ScheduleLesson.id == Schedule.lesson_id).scalar_subquery(),
+            select(ScheduleCabinet.name).where(ScheduleCabinet.id == Schedule.cabinet_id).scalar_subquery(),
+            Schedule.lesson_id,
+            Schedule.cabinet_id,
+            Schedule.group_id,
+            Schedule.department_id,
+        )
+    )
+    deleted_rows = deleted.all()
+    # id записей слота идут в порядке ячейки: по ним упорядочена выдача внутри пары
+    order = [staging.batch, staging.seq, staging.position] if "batch" in staging else [staging.seq, staging.position]
+    inserted = await session.execute(
+        insert(Schedule).from_select(
+            ["date", "lesson_id", "cabinet_id", "group_id", "teacher_id", "discipline_id", "department_id", "slot_position"],
+            select(
+                staging.date,
+                ScheduleLesson.id,
+                ScheduleCabinet.id,
+                ScheduleGroup.id,
+                ScheduleTeacher.id,
+                ScheduleDiscipline.id,
+                ScheduleDepartment.id,
+                staging.position,
+            )
+            .select_from(table)
+            .join(ScheduleLesson, ScheduleLesson.time_lesson == staging.time_lesson)
+            .join(ScheduleCabinet, ScheduleCabinet.name == staging.cabinet_number)
+            .join(ScheduleGroup, ScheduleGroup.name == staging.name_group)
+            .join(ScheduleTeacher, ScheduleTeacher.name == staging.name_teacher)
+            .join(ScheduleDiscipline, ScheduleDiscipline.name == staging.name_discipline)
+            .outerjoin(ScheduleDepartment, ScheduleDepartment.name == staging.department)
+            .where(condition, staging.changed, staging.name_group.isnot(None))
+            .order_by(*order)
+        )
+    )
+    await keep_departments(session, deleted_rows)
+
+    now = datetime.datetime.now()
+    states = [
+        {
+            "date": date,
+            "time_lesson": time_lesson,
+            "cabinet_number": cabinet_number,
+            "fingerprint": fingerprint,
+            "source": source,
+            "updated_at": now,
+        }
+        for date, time_lesson, cabinet_number, fingerprint, source, _ in changed
+    ]
+    for start in range(0, len(states), STAGING_CHUNK_SIZE):
+        query = pg_insert(ScheduleSlotState).values(states[start:start + STAGING_CHUNK_SIZE])
+        query = query.on_conflict_do_update(
+            index_elements=[state.date, state.time_lesson, state.cabinet_number],
+            set_={
+                "fingerprint": query.excluded.fingerprint,
+                "source": query.excluded.source,
+                "updated_at": query.excluded.updated_at,
+            },
+        )
+        await session.execute(query)
+
+    # Операция определяется по тому, были ли записи в слоте до и после
+    had_rows = {(date, time_lesson, cabinet_number) for date, time_lesson, cabinet_number, *_ in deleted_rows}
+    journal = []
+    for date, time_lesson, cabinet_number, _, source, records in changed:
+        if (date, time_lesson, cabinet_number) in had_rows:
+            operation = "update" if records else "delete"
+        elif records:
+            operation = "insert"
         else:
-            if many:
-                delete_query = delete(Schedule).where(
-                    Schedule.date == date,
-                    Schedule.time_lesson == time_lesson,
-                    Schedule.cabinet_number == cabinet_number,
-                )
-                result = await session.execute(delete_query)
-                await session.commit()
-                logger.info(f"Удалено {result.rowcount} старых записей (many=True)")
-
-                for i in range(len(name_of_group)):
-                    new_record = Schedule(
-                        date=date,
-                        time_lesson=time_lesson,
-                        cabinet_number=cabinet_number,
-                        name_group=name_of_group[i] or "Unknown",
-                        name_teacher=name_teacher[i] or "Unknown",
-                        name_discipline=name_of_discipline[i] or "Unknown",
-                        department=department
-                    )
-                    session.add(new_record)
-                await session.commit()
-                logger.info(f"Добавлено {len(name_of_group)} новых записей (many=True)")
-            else:
-                if len(data) == 1:
-                    update_query = (
-                        update(Schedule)
-                        .where(
-                            Schedule.date == date,
-                            Schedule.time_lesson == time_lesson,
-                            Schedule.cabinet_number == cabinet_number,
-                        )
-                        .values(
-                            name_group=name_of_group[0] or "Unknown",
-                            name_teacher=name_teacher[0] or "Unknown",
-                            name_discipline=name_of_discipline[0] or "Unknown",
-                            department=department
-                        )
-                    )
-                    await session.execute(update_query)
-                    await session.commit()
-                    logger.info("Обновлена одна запись")
-                else:
-                    delete_query = delete(Schedule).where(
-                        Schedule.date == date,
-                        Schedule.time_lesson == time_lesson,
-                        Schedule.cabinet_number == cabinet_number,
-                    )
-                    result = await session.execute(delete_query)
-                    await session.commit()
-                    logger.info(f"Удалено {result.rowcount} старых записей")
-
-                    new_record = Schedule(
-                        date=date,
-                        time_lesson=time_lesson,
-                        cabinet_number=cabinet_number,
-                        name_group=name_of_group[0] or "Unknown",
-                        name_teacher=name_teacher[0] or "Unknown",
-                        name_discipline=name_of_discipline[0] or "Unknown",
-                        department=department
-                    )
-                    session.add(new_record)
-                    await session.commit()
-                    logger.info("Добавлена одна новая запись")
\ No newline at end of file
+            # Слот был пуст и остался пустым: отпечаток записан, изменения нет
+            continue
+        journal.append({
+            "date": date,
+            "time_lesson": time_lesson,
+            "cabinet_number": cabinet_number,
+            "operation": operation,
+            "source": source,
+            "changed_at": now,
+        })
+    await insert_staging_rows(session, ScheduleChange, journal)
+
+    stats.update(changed=len(journal), deleted=len(deleted_rows), inserted=inserted.rowcount)
+    for entry in journal:
+        stats[SLOT_OPERATION_STATS[entry["operation"]]] += 1
+    return stats
+
+@connection
+async def apply_schedule_batch(session, rows: Iterable[SlotUpdate], source: Optional[str] = None) -> dict:
+    """Применяет обновления одного разобранного файла одной транзакцией
+    через временную таблицу schedules_staging."""
+    staged = staging_rows(resolve_slots(rows), source)
+    if not staged:
+        return empty_stats()
+
+    connection_ = await session.connection()
+    await connection_.run_sync(schedules_staging.create)
+    try:
+        await insert_staging_rows(session, schedules_staging, staged)
+        stats = await merge_staged(session, schedules_staging, expected_rows=len(staged))
+        await connection_.run_sync(schedules_staging.drop)
+        version = await bump_schedule_version(session) if stats["changed"] else None
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    if version is not None:
+        response_cache.invalidate(version)
+
+    logger.info(
+        f"Пакетное обновление расписания{f' из {source}' if source else ''}: слотов={stats['slots']}, "
+        f"изменено={stats['changed']}, удалено={stats['deleted']}, добавлено={stats['inserted']}"
+    )
+    return stats
+
+@connection
+async def stage_run_batch(session, run_id: str, batch: int, rows: Iterable[SlotUpdate], source: Optional[str] = None) -> int:
+    """Складывает разобранный файл в буфер запуска, schedules не меняется."""
+    staged = staging_rows(resolve_slots(rows), source, run_id=run_id, batch=batch, staged_at=datetime.datetime.now())
+    await insert_staging_rows(session, ScheduleRunStaging, staged)
+    await session.commit()
+    return len(staged)
+
+@connection
+async def publish_run(session, run_id: str, expected_rows: int) -> dict:
+    """Публикует буфер запуска одной транзакцией: читатели видят либо
+    прежнее расписание, либо новое целиком. При ошибке проверки schedules
+    остаётся нетронутым."""
+    staging = ScheduleRunStaging
+    run = staging.run_id == run_id
+    try:
+        # Проверка числа строк: в буфере должно быть всё, что записали партии запуска
+        staged_rows = (
+            await session.execute(select(func.count()).select_from(staging).where(run))
+        ).scalar()
+        if staged_rows != expected_rows:
+            raise ValueError(f"Буфер запуска {run_id} содержит {staged_rows} строк вместо {expected_rows}")
+        # Один слот из нескольких файлов: остаётся последний записанный файл
+        newer = staging.__table__.alias("newer")
+        await session.execute(
+            delete(staging).where(
+                run,
+                exists().where(
+                    newer.c.run_id == staging.run_id,
+                    newer.c.date == staging.date,
+                    newer.c.time_lesson == staging.time_lesson,
+                    newer.c.cabinet_number == staging.cabinet_number,
+                    newer.c.batch > staging.batch,
+                ),
+            )
+        )
+        stats = await merge_staged(session, staging.__table__, run)
+        await session.execute(delete(staging).where(run))
+        version = await bump_schedule_version(session) if stats["changed"] else None
+        await session.commit()
+    except Exception:
+        # Буфер удаляет владелец запуска (ScheduleRun.discard), здесь только откат
+        await session.rollback()
+        raise
+    if version is not None:
+        response_cache.invalidate(version)
+    return stats
+
+@connection
+async def discard_run(session, run_id: str) -> None:
+    await session.execute(delete(ScheduleRunStaging).where(ScheduleRunStaging.run_id == run_id))
+    await session.commit()
+
+class ScheduleRun:
+    """Запуск парсера с публикацией в конце: файлы копятся в буфере
+    schedule_run_staging и попадают в schedules одной транзакцией."""
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex
+        self.batches = 0
+        self.rows = 0
+        # Ссылки, чьи записи кэша загрузок фиксируются только после публикации
+        self.urls = []
+
+    async def stage(self, rows: Iterable[SlotUpdate], source: Optional[str] = None) -> int:
+        # Номер партии берётся до await: порядок записи совпадает с порядком завершения разбора
+        self.batches += 1
+        staged = await stage_run_batch(self.run_id, self.batches, rows, source)
+        # Не "self.rows += await ...": значение читалось бы до await и терялось
+        # при параллельной записи нескольких файлов
+        self.rows += staged
+        return staged
+
+    async def publish(self) -> dict:
+        stats = await publish_run(self.run_id, self.rows)
+        logger.info(
+            f"Опубликован запуск {self.run_id}: файлов={self.batches}, строк={self.rows}, слотов={stats['slots']}, "
+            f"изменено={stats['changed']}, удалено={stats['deleted']}, добавлено={stats['inserted']}"
+        )
+        return stats
+
+    async def discard(self) -> None:
+        await discard_run(self.run_id)
+
+@connection
+async def get_schedule_version(session) -> int:
+    return await read_schedule_version(session)
+
+@connection
+async def load_fetch_cache(session) -> dict:
+    result = await session.execute(select(FetchCache))
+    return {entry.url: entry for entry in result.scalars().all()}
+
+@connection
+async def save_fetch_cache(session, entries: Iterable[dict]) -> None:
+    entries = list(entries)
+    if not entries:
+        return
+    query = pg_insert(FetchCache).values(entries)
+    query = query.on_conflict_do_update(
+        index_elements=[FetchCache.url],
+        set_={
+            "etag": query.excluded.etag,
+            "last_modified": query.excluded.last_modified,
+            "content_hash": query.excluded.content_hash,
+            "fetched_at": query.excluded.fetched_at,
+        },
+    )
+    await session.execute(query)
+    await session.commit()
+    logger.info("Сохранено %d записей кэша загрузок", len(entries))
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import aiohttp
+
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Параметры загрузки задаются через переменные окружения
+HTTP_CONCURRENCY = int(os.getenv("PARSER_HTTP_CONCURRENCY", "8"))
+HTTP_TIMEOUT = float(os.getenv("PARSER_HTTP_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("PARSER_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_KEEPALIVE = float(os.getenv("PARSER_HTTP_KEEPALIVE", "30"))
+
+user_agent = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 YaBrowser/24.1.0.0 Safari/537.36"
+}
+
+
+class Downloader:
+    """Общая aiohttp-сессия с ограничением числа одновременных запросов.
+
+    Используется как асинхронный контекстный менеджер на время одного
+    запуска парсера: соединения переиспользуются (keep-alive), а каждый
+    запрос ограничен таймаутом. С кэшем (fetch_cache.FetchCache) запросы
+    отправляются условными, а неизменившиеся файлы не отдаются дальше.
+    """
+
+    def __init__(self, concurrency: int = HTTP_CONCURRENCY, timeout: float = HTTP_TIMEOUT, cache=None):
+        self.concurrency = concurrency
+        self.cache = cache
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=HTTP_CONNECT_TIMEOUT)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "Downloader":
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=HTTP_KEEPALIVE)
+        self.session = aiohttp.ClientSession(headers=user_agent, connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+        self.session = None
+
+    async def fetch(self, url: str) -> Optional[bytes]:
+        """Скачивает файл; возвращает None, если по данным кэша он не изменился."""
+        headers = self.cache.request_headers(url) if self.cache else None
+        async with self.semaphore:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304 and self.cache:
+                    self.cache.not_modified(url)
+                    return None
+                response.raise_for_status()
+                content = await response.read()
+        logger.info("Скачано %d байт с %s", len(content), url)
+        if self.cache and not self.cache.check(
+            url, content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+        ):
+            return None
+        return content
+
+    async def fetch_text(self, url: str) -> str:
+        logger.info("Запрос контента с %s", url)
+        async with self.semaphore:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                return await response.text()
@@ -0,0 +1,47 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Число процессов для конвертации и разбора файлов.
+# 0 - разбор выполняется прямо в цикле событий (прежний режим)
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if PARSER_WORKERS <= 0:
+        return None
+    if _executor is None:
+        # spawn: дочерние процессы не наследуют цикл событий и соединения с БД
+        _executor = ProcessPoolExecutor(
+            max_workers=PARSER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info("Запущен пул из %s процессов для разбора файлов", PARSER_WORKERS)
+    return _executor
+
+async def run_cpu(func, *args, **kwargs):
+    """Выполняет CPU-задачу в пуле процессов и возвращает её результат в цикл событий."""
+    executor = get_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        logger.info("Пул процессов разбора остановлен")
@@ -0,0 +1,524 @@
+from xls2xlsx import XLS2XLSX
+from openpyxl import load_workbook
+from typing import Iterable, NamedTuple, Optional, Tuple
+from cell_grammar import parse_room_cell, parse_teacher_info, parse_college_cell, time_from_pair
+from logging_config import LogSampler, setup_logging
+from telemetry import StageMemory
+import numpy as np
+import pandas as pd
+import xlrd
+import os
+import datetime
+import io
+import logging
+import re
+import tempfile
+import time
+
+# Функции модуля выполняются в процессах пула (см. executor.py), поэтому
+# здесь нет обращений к базе данных и asyncio: на вход подаются байты
+# скачанного файла, на выходе компактные кортежи строк для dbrequests.SlotUpdate
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def save_temp(content: bytes, suffix: str = ".xls") -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_file.write(content)
+        return temp_file.name
+
+def convert_xls_to_xlsx(path: str) -> str:
+    x2x = XLS2XLSX(path)
+    xlsx_path = path + "x"
+    x2x.to_xlsx(xlsx_path)
+    logger.info("Конвертирован %s в %s", path, xlsx_path)
+    return xlsx_path
+
+class GridCell(NamedTuple):
+    value: object
+
+class GridSheet:
+    """Лист .xls, прочитанный целиком в память, с интерфейсом листа openpyxl.
+
+    Значения приводятся так же, как это делает XLS2XLSX при конвертации,
+    поэтому разбор не зависит от того, каким путём был прочитан файл.
+    """
+
+    def __init__(self, values: list, max_row: int, max_column: int):
+        self.values = values
+        self.max_row = max_row
+        self.max_column = max_column
+
+    def cell(self, row: int, column: int) -> GridCell:
+        if 1 <= row <= self.max_row and 1 <= column <= self.max_column:
+            return GridCell(self.values[row - 1][column - 1])
+        return GridCell(None)
+
+def _xls_cell_value(cell_type, value, datemode):
+    if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            date_tuple = xlrd.xldate_as_tuple(value, datemode)
+        except Exception:
+            return value
+        if date_tuple == (0, 0, 0, 0, 0, 0):
+            return datetime.datetime(1900, 1, 1)
+        if date_tuple[0:3] == (0, 0, 0):
+            return datetime.time(*date_tuple[3:6])
+        if date_tuple[3:6] == (0, 0, 0):
+            return datetime.date(*date_tuple[0:3])
+        return datetime.datetime(*date_tuple)
+    if cell_type == xlrd.XL_CELL_NUMBER:
+        return int(value) if value == int(value) else value
+    if cell_type == xlrd.XL_CELL_ERROR:
+        return xlrd.biffh.error_text_from_code.get(value, '#N/A')
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return ('false', 'true')[value]
+    return value
+
+def read_xls_sheet(content: bytes) -> GridSheet:
+    """Читает первый лист .xls (BIFF) прямо из байтов, без временных файлов."""
+    # formatting_info=True: размеры листа совпадают с результатом XLS2XLSX
+    book = xlrd.open_workbook(file_contents=content, formatting_info=True, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        datemode = book.datemode
+        values = [
+            [
+                _xls_cell_value(cell_type, value, datemode)
+                for cell_type, value in zip(sheet.row_types(row), sheet.row_values(row))
+            ]
+            for row in range(sheet.nrows)
+        ]
+        # Строки в xlrd могут быть короче ncols, выравниваем сетку
+        for row_values in values:
+            row_values.extend([None] * (sheet.ncols - len(row_values)))
+        return GridSheet(values, sheet.nrows, sheet.ncols)
+    finally:
+        book.release_resources()
+
+def load_xls_worksheet(content: bytes):
+    try:
+        return read_xls_sheet(content)
+    except Exception as e:
+        # Например, HTML-таблица с расширением .xls: её понимает только XLS2XLSX
+        logger.warning("Файл не прочитан напрямую (%s), используется конвертация в xlsx", e)
+
+    path = save_temp(content)
+    xlsx_path = None
+    try:
+        xlsx_path = convert_xls_to_xlsx(path)
+        # read_only: строки читаются потоком, без объектов ячеек и стилей
+        workbook = load_workbook(xlsx_path, read_only=True)
+        try:
+            values = [list(row) for row in workbook.active.iter_rows(values_only=True)]
+        finally:
+            workbook.close()
+        width = max((len(row) for row in values), default=0)
+        for row_values in values:
+            row_values.extend([None] * (width - len(row_values)))
+        return GridSheet(values, len(values), width)
+    finally:
+        for temp_path in (path, xlsx_path):
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+def sheet_values(worksheet) -> list:
+    """Значения листа одним двумерным списком (строки дополнены до max_column)."""
+    if isinstance(worksheet, GridSheet):
+        return worksheet.values
+    width = worksheet.max_column
+    return [list(row) + [None] * (width - len(row)) for row in worksheet.iter_rows(values_only=True)]
+
+def with_metrics(func, *args):
+    """Вызывает экстрактор в процессе пула и возвращает (результат, метрики):
+    время чтения/конвертации файла, время разбора и память каждой из этих
+    стадий (telemetry.StageMemory: процесс пула разбирает один файл за раз)."""
+    memory = StageMemory()
+    timings = {"convert": 0.0, "memory": memory}
+    start = time.perf_counter()
+    result = func(*args, timings=timings)
+    memory.mark("parse")
+    timings["memory"] = memory.stages
+    timings["parse"] = time.perf_counter() - start - timings["convert"]
+    return result, timings
+
+def _timed_convert(timings: Optional[dict], load):
+    """Чтение файла или листа как стадия convert; до него шёл разбор."""
+    if timings is None:
+        return load()
+    memory = timings.get("memory")
+    if memory is not None:
+        memory.mark("parse")
+    start = time.perf_counter()
+    value = load()
+    timings["convert"] += time.perf_counter() - start
+    if memory is not None:
+        memory.mark("convert")
+    return value
+
+def _timed_load(content: bytes, timings: Optional[dict]):
+    return _timed_convert(timings, lambda: load_xls_worksheet(content))
+
+def extract_room_rows(content: bytes, timings: Optional[dict] = None) -> list:
+    """Разбирает файл занятости аудиторий в кортежи полей SlotUpdate."""
+    return room_rows_from_grid(sheet_values(_timed_load(content, timings)))
+
+def room_rows_from_grid(values: list) -> list:
+    """Строки SlotUpdate из сетки значений листа занятости аудиторий.
+
+    Столбец A (дата, объединённая на весь день) протягивается вниз, даты и
+    номера пар разбираются один раз на строку листа, а одинаковые тексты
+    ячеек - один раз на файл. Порядок строк тот же, что при обходе листа
+    по столбцам аудиторий.
+    """
+    max_row = len(values)
+    max_column = len(values[0]) if values else 0
+    if max_row < 4 or max_column < 4:
+        return []
+    grid = np.array(values, dtype=object)
+
+    # Аудитории во второй строке, последний столбец листа не разбирается
+    col_idx = [i for i in range(2, max_column - 1) if grid[1, i]]
+    if not col_idx:
+        return []
+
+    row_idx = []
+    row_slots = []
+    parsed_dates = {}
+    current_date = None
+    log = LogSampler(logger)
+    for j in range(max_row - 1):
+        if grid[j, 0] is not None:
+            current_date = grid[j, 0]
+        if j < 2:
+            continue
+
+        time_lesson = grid[j, 1]
+        if not time_lesson:
+            continue
+        time_lesson = time_lesson.strip()
+        if time_lesson not in time_from_pair:
+            log.warning("unknown_time", "Неизвестное время пары: %s", time_lesson)
+            continue
+
+        if current_date is None:
+            raise ValueError(f"Не найдена дата для строки {j + 1}")
+        if current_date not in parsed_dates:
+            date_obj = datetime.datetime.strptime(current_date.strip()[-8:], "%d.%m.%y")
+            parsed_dates[current_date] = date_obj.strftime("%Y-%m-%d")
+
+        row_idx.append(j)
+        row_slots.append((parsed_dates[current_date], time_from_pair[time_lesson]))
+    log.summary()
+
+    cells = grid[np.ix_(row_idx, col_idx)] if row_idx else np.empty((0, len(col_idx)), dtype=object)
+    parsed_cells = {}
+    rows = []
+
+    for c, i in enumerate(col_idx):
+        cabinet_number = grid[1, i]
+        for (date, time_lesson), value in zip(row_slots, cells[:, c]):
+            if value and "Резервирование" in value:
+                value = None
+
+            if value:
+                if value not in parsed_cells:
+                    entries = parse_room_cell(value)
+                    parsed_cells[value] = (
+                        [entry.group for entry in entries],
+                        [entry.teacher for entry in entries],
+                        [entry.discipline for entry in entries],
+                    )
+                name_of_group, name_teacher, name_of_discipline = parsed_cells[value]
+                rows.append((
+                    date,
+                    time_lesson,
+                    cabinet_number,
+                    name_of_group,
+                    name_teacher,
+                    name_of_discipline,
+                    False,
+                    len(name_of_group) > 1,
+                ))
+            else:
+                rows.append((date, time_lesson, cabinet_number, None, None, None, True))
+
+    return rows
+
+def merge_slot_rows(rows: list) -> list:
+    """Сводит строки с общим слотом в одну строку с many=True.
+
+    В файлах преподавателей занятие у нескольких групп (или у двух
+    преподавателей кафедры в одной аудитории) - несколько строк с одним
+    слотом; без сведения при записи в слоте осталась бы только последняя.
+    Повторы одной и той же записи отбрасываются.
+    """
+    slots = {}
+    for date, time_lesson, cabinet_number, groups, teachers, disciplines, _, _, department in rows:
+        key = (date, time_lesson, cabinet_number)
+        if key not in slots:
+            slots[key] = ([], set(), department)
+        records, seen, _ = slots[key]
+        for record in zip(groups, teachers, disciplines):
+            if record not in seen:
+                seen.add(record)
+                records.append(record)
+    merged = []
+    for (date, time_lesson, cabinet_number), (records, _, department) in slots.items():
+        groups, teachers, disciplines = (list(values) for values in zip(*records))
+        merged.append((
+            date, time_lesson, cabinet_number, groups, teachers, disciplines, False, len(records) > 1, department,
+        ))
+    return merged
+
+# Дата в файле преподавателя: "01.10.2025", "01.10.25" или "Пн 01.10.25"
+TEACHER_DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4}|\d{2})(?!\d)")
+
+def teacher_date(value) -> Optional[str]:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    match = TEACHER_DATE_RE.search(str(value))
+    if not match:
+        return None
+    day, month, year = match.groups()
+    try:
+        return datetime.datetime.strptime(
+            f"{day}.{month}.{year}", "%d.%m.%Y" if len(year) == 4 else "%d.%m.%y"
+        ).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+def extract_teacher_rows(content: bytes, department: str, timings: Optional[dict] = None) -> list:
+    """Разбирает файл расписания преподавателя в кортежи полей SlotUpdate."""
+    return teacher_rows_from_sheet(_timed_load(content, timings), department)
+
+def teacher_rows_from_sheet(worksheet, department: str) -> list:
+    rows = []
+    # Сообщения по строкам файла сэмплируются, итог - в log.summary()
+    log = LogSampler(logger)
+
+    if len(department) > 255:
+        logger.warning("Обрезано название кафедры: %s...", department[:255])
+        department = department[:255]
+
+    day = None
+    for row in range(2, worksheet.max_row + 1):
+        # Дата может стоять только в первой строке дня, как в файлах аудиторий
+        date = worksheet.cell(row=row, column=1).value or day
+        day = date
+        time_lesson = worksheet.cell(row=row, column=2).value  # Время теперь в колонке 2
+        teacher_name = worksheet.cell(row=row, column=3).value  # Преподаватель в колонке 3
+        combined_info = worksheet.cell(row=row, column=4).value  # Дисциплина и группа в колонке 4
+        cabinet_number = worksheet.cell(row=row, column=5).value  # Аудитория в колонке 5
+
+        if not all([date, time_lesson, teacher_name, combined_info, cabinet_number]):
+            continue
+
+        # Приводим к строкам
+        teacher_name = str(teacher_name).strip()
+        if len(teacher_name) > 255:
+            log.warning("teacher_truncated", "Обрезано имя преподавателя: %s...", teacher_name[:255])
+            teacher_name = teacher_name[:255]
+
+        parsed_date = teacher_date(date)
+        if parsed_date is None:
+            log.warning("bad_date", "Некорректный формат даты в строке %d: %s, пропуск", row, date)
+            continue
+        date = parsed_date
+
+        time_lesson = str(time_lesson).strip()
+        if time_lesson not in time_from_pair:
+            log.warning("unknown_time", "Неизвестное время пары в строке %d: %s, пропуск", row, time_lesson)
+            continue
+        time_lesson = time_from_pair[time_lesson]
+
+        # Разбираем combined_info на группу и дисциплину
+        info = parse_teacher_info(str(combined_info).strip())
+        name_group = info.group
+        name_discipline = info.discipline
+
+        if len(name_group) > 255:
+            log.warning("group_truncated", "Обрезано название группы: %s...", name_group[:255])
+            name_group = name_group[:255]
+        if len(name_discipline) > 255:
+            log.warning("discipline_truncated", "Обрезано название дисциплины: %s...", name_discipline[:255])
+            name_discipline = name_discipline[:255]
+        cabinet_number = str(cabinet_number).strip()
+        if len(cabinet_number) > 50:
+            log.warning("cabinet_truncated", "Обрезано название аудитории: %s...", cabinet_number[:50])
+            cabinet_number = cabinet_number[:50]
+
+        log.debug(
+            "row",
+            "Запись в базу: date=%s, time_lesson=%s, cabinet_number=%s, group=%s, teacher=%s, discipline=%s, department=%s",
+            date, time_lesson, cabinet_number, name_group, teacher_name, name_discipline, department,
+        )
+        rows.append((
+            date,
+            time_lesson,
+            cabinet_number,
+            [name_group],
+            [teacher_name],
+            [name_discipline],
+            False,
+            False,
+            department,
+        ))
+
+    log.summary()
+    return rows
+
+VK_YEAR = 2025
+VK_RECORD_COLUMNS = ["name_group", "date", "time_lesson", "name_discipline", "name_teacher", "cabinet_number"]
+
+def _as_text(df: pd.DataFrame) -> pd.DataFrame:
+    # То же, что str(value).strip() для каждой ячейки: NaN превращается в 'nan'
+    return df.astype(str).apply(lambda col: col.str.strip())
+
+def _vk_block_frame(df: pd.DataFrame, text: pd.DataFrame, header_row: int, day_col: int, start_date, end_date) -> Optional[pd.DataFrame]:
+    """Длинная таблица (строка листа, группа, дата, время, текст ячейки) одного блока дней."""
+    time_col = day_col + 1
+    group_cols = [col for col in (day_col + 2 + i * 4 for i in range(3)) if col < df.shape[1]]
+    if not group_cols or time_col >= df.shape[1]:
+        return None
+
+    group_names = []
+    for col in group_cols:
+        group_val = df.iloc[header_row - 1, col]
+        if isinstance(group_val, str) and 'Группа' in group_val:
+            group_names.append(group_val.replace("Группа", "").strip())
+        else:
+            group_names.append("Unknown")
+
+    body = text.iloc[header_row + 1:]
+
+    # Дата указана в первой строке дня: протягиваем её вниз. Нераспознанная
+    # дата (-1) сбрасывает текущую до следующей корректной
+    day_text = body[day_col]
+    has_day = (day_text != "") & ~day_text.str.lower().str.contains("nan", regex=False)
+    day_match = day_text.where(has_day).str.extract(r'(\d{1,2}\.\d{2})', expand=False)
+    parsed = pd.to_datetime(day_match + f".{VK_YEAR}", format="%d.%m.%Y", errors="coerce")
+    ordinals = pd.Series(np.nan, index=body.index)
+    ordinals[parsed.notna()] = parsed[parsed.notna()].map(pd.Timestamp.toordinal)
+    ordinals[day_match.notna() & parsed.isna()] = -1
+    ordinals = ordinals.ffill()
+    in_range = ordinals.between(start_date.toordinal(), end_date.toordinal())
+
+    time_text = body[time_col]
+    has_time = (time_text != "") & ~time_text.str.lower().str.contains("nan", regex=False)
+    is_range = time_text.str.match(r'^\d{1,2}\.\d{2}-\d{1,2}\.\d{2}$')
+    time_lesson = time_text.where(is_range, time_text.map(time_from_pair))
+    bad_time = in_range & has_time & time_lesson.isna()
+    log = LogSampler(logger)
+    for value in time_text[bad_time]:
+        log.warning("bad_time", "Некорректный формат времени: %s, пропуск", value)
+    log.summary()
+
+    keep = in_range & has_time & time_lesson.notna()
+    if not keep.any():
+        return None
+
+    missing = pd.Series("nan", index=body.index)
+    blocks = []
+    for group_idx, group_col in enumerate(group_cols):
+        parts = [
+            body[col] if col < df.shape[1] else missing
+            for col in (group_col, group_col + 2, group_col + 3)
+        ]
+        blocks.append(pd.DataFrame({
+            "row": np.arange(len(body))[keep.to_numpy()],
+            "group": group_idx,
+            "name_group": group_names[group_idx],
+            "ordinal": ordinals[keep].to_numpy(),
+            "time_lesson": time_lesson[keep].to_numpy(),
+            "cell": (parts[0] + "\n" + parts[1] + "\n" + parts[2])[keep].to_numpy(),
+        }))
+    # Порядок исходного обхода: строки листа, внутри строки - группы
+    return pd.concat(blocks, ignore_index=True).sort_values(["row", "group"], kind="stable")
+
+def vk_records_from_sheets(sheets: Iterable[Tuple[str, pd.DataFrame]], start_date, end_date) -> list:
+    """Записи расписания колледжа из всех листов файла VK за период дат.
+
+    sheets - пары (имя листа, DataFrame) или словарь: листы обрабатываются
+    по одному, и от каждого остаются только ячейки с занятиями.
+    """
+    if isinstance(sheets, dict):
+        sheets = sheets.items()
+    frames = []
+    for sheet_name, df in sheets:
+        df = df.reset_index(drop=True)
+        df.columns = range(df.shape[1])
+        text = _as_text(df)
+        # Текст 'День недели' может дать только строковая ячейка
+        is_header = text.apply(lambda col: col.str.contains('День недели', regex=False))
+        header_rows = np.flatnonzero(is_header.any(axis=1).to_numpy())
+        if not len(header_rows):
+            logger.info("Пропуск листа %s: не найдена строка 'День недели'", sheet_name)
+            continue
+        header_row = int(header_rows[0])
+
+        day_cols = [int(col) for col in np.flatnonzero(is_header.iloc[header_row].to_numpy())]
+        for day_col in day_cols:
+            block = _vk_block_frame(df, text, header_row, day_col, start_date, end_date)
+            if block is not None:
+                frames.append(block)
+
+    if not frames:
+        return []
+    cells = pd.concat(frames, ignore_index=True)
+
+    # Одинаковые тексты ячеек разбираются один раз
+    unique_cells = pd.unique(cells["cell"])
+    parsed = pd.DataFrame(
+        [parse_college_cell(text)[1:4] for text in unique_cells],
+        index=unique_cells,
+        columns=["teacher", "discipline", "cabinet"],
+    )
+    cells = cells.join(parsed, on="cell")
+
+    complete = (cells["discipline"] != "") & (cells["teacher"] != "") & (cells["cabinet"] != "")
+    valid_cabinet = cells["cabinet"].str.match(r'^\d+-\d+$')
+    for cabinet in pd.unique(cells.loc[complete & ~valid_cabinet, "cabinet"]):
+        logger.warning("Некорректный номер аудитории: %s, пропуск", cabinet)
+    cells = cells[complete & valid_cabinet]
+
+    dates = {
+        ordinal: datetime.date.fromordinal(int(ordinal)).strftime("%Y-%m-%d")
+        for ordinal in pd.unique(cells["ordinal"])
+    }
+    records = pd.DataFrame({
+        "name_group": cells["name_group"],
+        "date": cells["ordinal"].map(dates),
+        "time_lesson": cells["time_lesson"],
+        "name_discipline": cells["discipline"],
+        "name_teacher": cells["teacher"],
+        "cabinet_number": cells["cabinet"],
+    }, columns=VK_RECORD_COLUMNS)
+    return records.to_dict("records")
+
+def _timed_sheets(workbook: pd.ExcelFile, timings: Optional[dict]):
+    for name in workbook.sheet_names:
+        yield name, _timed_convert(timings, lambda: workbook.parse(name, header=None))
+
+def extract_vk_records(source, file_name: str, today: Optional[datetime.date] = None, timings: Optional[dict] = None) -> list:
+    """Разбирает файл расписания колледжа (путь или байты) в записи расписания."""
+    date_match = re.search(r'(\d{2}\.\d{2})-(\d{2}\.\d{2})', file_name)
+    if not date_match:
+        raise ValueError(f"Не удалось извлечь диапазон дат из {file_name}")
+    start_date_str, end_date_str = date_match.groups()
+    start_date = datetime.datetime.strptime(f"{start_date_str}.{VK_YEAR}", "%d.%m.%Y").date()
+    end_date = datetime.datetime.strptime(f"{end_date_str}.{VK_YEAR}", "%d.%m.%Y").date()
+
+    today = today or datetime.datetime.now().date()
+    if start_date < today:
+        start_date = today
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    # Файл открывается один раз (openpyxl в режиме read_only), листы
+    # читаются и сворачиваются в записи по одному
+    with pd.ExcelFile(source) as workbook:
+        return vk_records_from_sheets(_timed_sheets(workbook, timings), start_date, end_date)
@@ -0,0 +1,101 @@
+import datetime
+import hashlib
+import logging
+import os
+from typing import Dict, Optional
+
+from dbrequests import load_fetch_cache, save_fetch_cache
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# PARSER_FETCH_CACHE=0 отключает пропуск неизменившихся файлов
+FETCH_CACHE_ENABLED = os.getenv("PARSER_FETCH_CACHE", "1") != "0"
+
+# Статистика последнего запуска парсера, отдаётся через API
+last_stats: Dict[str, int] = {}
+
+
+class FetchCache:
+    """Кэш загрузок по URL: ETag/Last-Modified и SHA-256 содержимого.
+
+    Файл считается неизменившимся, если сервер ответил 304 или хэш тела
+    совпал с сохранённым. Новый хэш запоминается только после commit(),
+    то есть после успешной записи файла в базу, иначе при ошибке разбора
+    файл был бы пропущен и на следующем запуске.
+    """
+
+    def __init__(self, entries: Optional[Dict[str, dict]] = None):
+        self.entries = entries or {}
+        self.pending: Dict[str, dict] = {}
+        self.dirty: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    async def load(cls) -> "FetchCache":
+        if not FETCH_CACHE_ENABLED:
+            return cls()
+        rows = await load_fetch_cache()
+        entries = {
+            url: {"etag": row.etag, "last_modified": row.last_modified, "content_hash": row.content_hash}
+            for url, row in rows.items()
+        }
+        logger.info("Загружено %d записей кэша загрузок", len(entries))
+        return cls(entries)
+
+    def request_headers(self, url: str) -> dict:
+        entry = self.entries.get(url)
+        if not FETCH_CACHE_ENABLED or entry is None:
+            return {}
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def not_modified(self, url: str) -> None:
+        self.hits += 1
+        logger.info("Файл не изменился (304): %s", url)
+
+    def check(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """Возвращает True, если содержимое изменилось и файл нужно разобрать."""
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": hashlib.sha256(content).hexdigest(),
+        }
+        cached = self.entries.get(url)
+        if FETCH_CACHE_ENABLED and cached and cached["content_hash"] == entry["content_hash"]:
+            self.hits += 1
+            # Хэш совпал, но валидаторы могли обновиться
+            if (cached["etag"], cached["last_modified"]) != (etag, last_modified):
+                self.entries[url] = entry
+                self.dirty[url] = entry
+            logger.info("Содержимое не изменилось: %s", url)
+            return False
+        self.misses += 1
+        self.pending[url] = entry
+        return True
+
+    def commit(self, url: str) -> None:
+        entry = self.pending.pop(url, None)
+        if entry is not None:
+            self.entries[url] = entry
+            self.dirty[url] = entry
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    async def save(self) -> None:
+        global last_stats
+        last_stats = self.stats()
+        logger.info("Кэш загрузок: попаданий=%s, промахов=%s", self.hits, self.misses)
+        if not FETCH_CACHE_ENABLED or not self.dirty:
+            return
+        now = datetime.datetime.now()
+        await save_fetch_cache({"url": url, **entry, "fetched_at": now} for url, entry in self.dirty.items())
+        self.dirty.clear()
@@ -0,0 +1,219 @@
+"""Поиск свободных кабинетов по битовой матрице занятости.
+
+Матрица хранит для каждой даты и пары битовое множество занятых
+кабинетов: массив uint64 формы (даты, пары, слова), бит i - кабинет с
+номером i в отсортированном списке. Свободные кабинеты на одну пару - это
+"существующие И НЕ занятые", на окно из нескольких пар и дат - то же
+после OR занятости по всем ячейкам окна, поэтому поиск за семестр - это
+несколько тысяч машинных слов, без запросов к базе.
+
+Семантика та же, что у crud.get_free_cabinets: кабинет существует, если у
+него есть хотя бы одна запись в schedules, и занят, если в ячейке есть
+запись с группой, отличной от "Unknown". Матрица перестраивается целиком
+после каждой смены данных (подписка на response_cache.invalidate): она
+собирается из трёх столбцов schedules быстрее, чем вычислялась бы разница.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+
+import response_cache
+from cell_grammar import time_from_pair
+from dbrequests import read_schedule_version
+from logging_config import setup_logging
+from models import Schedule, ScheduleCabinet, ScheduleGroup, ScheduleLesson, async_session
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# FREE_ROOMS_MATRIX=0 возвращает поиск свободных кабинетов к запросам в базу
+ENABLED = os.getenv("FREE_ROOMS_MATRIX", "1") != "0"
+
+# Время пары по её номеру: 1 -> "8:20-9:50"
+PAIR_TIMES = {number: value for number, value in enumerate(time_from_pair.values(), start=1)}
+
+
+class OccupancyMatrix:
+    """Занятость кабинетов по датам и парам на момент загрузки."""
+
+    def __init__(self, cells: list, cabinets: list, lessons: list, version: int):
+        self.version = version
+        self.loaded_at = datetime.datetime.now()
+        # Номер бита - место кабинета в алфавитном порядке: ответ сразу отсортирован
+        self.cabinets = np.array(sorted(name for _, name in cabinets), dtype=object)
+        cabinet_bits = {cabinet_id: bit for bit, cabinet_id in enumerate(
+            cabinet_id for cabinet_id, _ in sorted(cabinets, key=lambda cabinet: cabinet[1])
+        )}
+        # Пары в порядке начала
+        lessons = sorted(lessons, key=lambda lesson: (lesson[2] is None, lesson[2] or 0, lesson[0]))
+        self.time_lessons = [time_lesson for _, time_lesson, _ in lessons]
+        self.slots = {time_lesson: slot for slot, time_lesson in enumerate(self.time_lessons)}
+        lesson_slots = {lesson_id: slot for slot, (lesson_id, _, _) in enumerate(lessons)}
+
+        self.words = max((len(self.cabinets) + 63) // 64, 1)
+        dates = [day for day, _, _, _ in cells]
+        self.first_day = min(dates).toordinal() if dates else 0
+        days = (max(dates).toordinal() - self.first_day + 1) if dates else 0
+        self.busy = np.zeros((days, len(self.time_lessons), self.words), dtype=np.uint64)
+        self.existing = np.zeros(self.words, dtype=np.uint64)
+        self.empty = np.zeros(self.words, dtype=np.uint64)
+
+        if cells:
+            day_index = np.array([day.toordinal() - self.first_day for day in dates], dtype=np.int64)
+            slot_index = np.array([lesson_slots[lesson_id] for _, lesson_id, _, _ in cells], dtype=np.int64)
+            bits = np.array([cabinet_bits[cabinet_id] for _, _, cabinet_id, _ in cells], dtype=np.uint64)
+            occupied = np.array([occupied for _, _, _, occupied in cells], dtype=bool)
+            words = (bits // np.uint64(64)).astype(np.int64)
+            masks = np.left_shift(np.uint64(1), bits % np.uint64(64))
+            np.bitwise_or.at(self.existing, words, masks)
+            np.bitwise_or.at(
+                self.busy, (day_index[occupied], slot_index[occupied], words[occupied]), masks[occupied]
+            )
+
+    def decode(self, words: np.ndarray) -> List[str]:
+        """Названия кабинетов по битовому множеству."""
+        bits = np.unpackbits(words.astype("<u8").view(np.uint8), bitorder="little")
+        return self.cabinets[np.flatnonzero(bits[:len(self.cabinets)])].tolist()
+
+    def day_indexes(self, dates: Iterable[datetime.date]) -> np.ndarray:
+        days = np.fromiter((day.toordinal() - self.first_day for day in dates), dtype=np.int64)
+        # Даты вне матрицы не содержат записей: все кабинеты на них свободны
+        return days[(days >= 0) & (days < self.busy.shape[0])]
+
+    def slot_indexes(self, time_lessons: Iterable[str]) -> List[int]:
+        # Пары, которой нет в справочнике, нет и в расписании: она ничего не занимает
+        return [self.slots[time_lesson] for time_lesson in time_lessons if time_lesson in self.slots]
+
+    def free(self, dates: Iterable[datetime.date], time_lessons: Iterable[str]) -> List[str]:
+        """Кабинеты, свободные во всех парах time_lessons во все даты dates."""
+        cells = self.busy[np.ix_(self.day_indexes(dates), self.slot_indexes(time_lessons))]
+        busy = np.bitwise_or.reduce(cells.reshape(-1, self.words), axis=0) if cells.size else self.empty
+        return self.decode(self.existing & ~busy)
+
+    def free_by_day(self, start: datetime.date, end: datetime.date, time_lesson: str) -> List[dict]:
+        """Свободные кабинеты на пару time_lesson в каждую дату периода."""
+        slot = self.slots.get(time_lesson)
+        results = []
+        day = start
+        while day <= end:
+            index = day.toordinal() - self.first_day
+            busy = self.busy[index, slot] if slot is not None and 0 <= index < self.busy.shape[0] else self.empty
+            results.append({"date": day, "time_lesson": time_lesson, "free_cabinets": self.decode(self.existing & ~busy)})
+            day += datetime.timedelta(days=1)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds"),
+            "cabinets": len(self.cabinets),
+            "lessons": len(self.time_lessons),
+            "days": self.busy.shape[0],
+            "first_date": str(datetime.date.fromordinal(self.first_day)) if self.busy.shape[0] else None,
+            "bytes": self.busy.nbytes + self.existing.nbytes,
+        }
+
+
+def window_dates(start: datetime.date, end: datetime.date, weekdays: Optional[Iterable[int]] = None) -> List[datetime.date]:
+    """Даты периода, при weekdays - только эти дни недели (1 - понедельник)."""
+    weekdays = set(weekdays) if weekdays else None
+    dates = []
+    day = start
+    while day <= end:
+        if weekdays is None or day.isoweekday() in weekdays:
+            dates.append(day)
+        day += datetime.timedelta(days=1)
+    return dates
+
+
+_matrix: Optional[OccupancyMatrix] = None
+_reload = asyncio.Event()
+last_load: dict = {}
+
+
+def current() -> Optional[OccupancyMatrix]:
+    """Матрица для ответа на запрос или None, если считать нужно в базе."""
+    return _matrix if ENABLED else None
+
+
+async def load_matrix() -> OccupancyMatrix:
+    async with async_session() as session:
+        # Кабинеты, пары, ячейки и поколение данных читаются из одного снимка базы
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = await read_schedule_version(session)
+        cells = (
+            await session.execute(
+                select(
+                    Schedule.date,
+                    Schedule.lesson_id,
+                    Schedule.cabinet_id,
+                    func.bool_or(ScheduleGroup.name != "Unknown"),
+                )
+                .join(ScheduleGroup, ScheduleGroup.id == Schedule.group_id)
+                .group_by(Schedule.date, Schedule.lesson_id, Schedule.cabinet_id)
+            )
+        ).all()
+        cabinets = (await session.execute(select(ScheduleCabinet.id, ScheduleCabinet.name))).all()
+        lessons = (
+            await session.execute(select(ScheduleLesson.id, ScheduleLesson.time_lesson, ScheduleLesson.starts_at))
+        ).all()
+    return await asyncio.to_thread(OccupancyMatrix, cells, cabinets, lessons, version)
+
+
+async def reload() -> OccupancyMatrix:
+    global _matrix
+    start = time.perf_counter()
+    matrix = await load_matrix()
+    _matrix = matrix
+    # Ответы, посчитанные по прежней матрице во время загрузки, в кэше не нужны
+    response_cache.cache.invalidate(matrix.version)
+    last_load.update(seconds=round(time.perf_counter() - start, 3), error=None)
+    logger.info(
+        "Матрица занятости загружена: кабинетов=%d, дней=%d, пар=%d, %s с",
+        len(matrix.cabinets), matrix.busy.shape[0], len(matrix.time_lessons), last_load["seconds"],
+    )
+    return matrix
+
+
+def request_reload() -> None:
+    if ENABLED:
+        _reload.set()
+
+
+async def run_reloader() -> None:
+    """Строит матрицу при старте и после каждой смены данных, пока задачу
+    не отменят. При ошибке загрузки остаётся прежняя матрица."""
+    if not ENABLED:
+        return
+    _reload.set()
+    while True:
+        await _reload.wait()
+        _reload.clear()
+        try:
+            await reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            last_load.update(error=str(e))
+            logger.error("Не удалось загрузить матрицу занятости, используется прежняя: %s", e)
+            await asyncio.sleep(response_cache.SCHEDULE_CACHE_POLL)
+            _reload.set()
+
+
+def get_stats() -> dict:
+    return {
+        "enabled": ENABLED,
+        "active": current() is not None,
+        "last_load": last_load,
+        "matrix": _matrix.stats() if _matrix is not None else None,
+    }
+
+
+response_cache.listeners.append(request_reload)
@@ -0,0 +1,224 @@
+import asyncio
+import contextlib
+import datetime
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import delete, select, update, func
+
+from dbrequests import connection
+from logging_config import setup_logging
+from models import ParserJob, ParserRunTrace, engine
+from schemas import ParserJobOut
+from telemetry import TRACE_RUNS
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки PostgreSQL: одновременно идёт только один запуск парсера
+PARSER_LOCK_ID = 85060840
+# Сериализует постановку в очередь, чтобы не появилось двух активных заданий
+ENQUEUE_LOCK_ID = PARSER_LOCK_ID + 1
+# Прогресс пишется в базу не чаще раза в PROGRESS_FLUSH_INTERVAL секунд
+PROGRESS_FLUSH_INTERVAL = 2.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+@contextlib.asynccontextmanager
+async def parser_lock():
+    """Single-flight блокировка запуска парсера.
+
+    Блокировка сессионная и держится на отдельном соединении, поэтому при
+    падении процесса PostgreSQL снимает её сам. Отдаёт False, если парсер
+    уже выполняется в другом процессе.
+    """
+    async with engine.connect() as conn:
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(PARSER_LOCK_ID)))
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.scalar(select(func.pg_advisory_unlock(PARSER_LOCK_ID)))
+                await conn.commit()
+
+
+class JobProgress:
+    """Прогресс запуска по источникам: rooms, vk, teachers, publish.
+
+    Без job_id ничего не сохраняет, поэтому парсер можно запускать и
+    вне очереди заданий.
+    """
+
+    def __init__(self, job_id: Optional[int] = None):
+        self.job_id = job_id
+        self.sources = {}
+        self.error = None
+        self._flushed_at = 0.0
+        self._flush_task = None
+
+    def start(self, source: str, total: int) -> None:
+        self.sources[source] = {"status": "running", "total": total, "parsed": 0, "failed": 0, "skipped": 0}
+        self._touch()
+
+    def advance(self, source: str, ok: bool = True) -> None:
+        self.sources[source]["parsed" if ok else "failed"] += 1
+        self._touch()
+
+    def skip(self, source: str) -> None:
+        """Файл не изменился с прошлого запуска: parsed + failed + skipped = total."""
+        self.sources[source]["skipped"] += 1
+        self._touch()
+
+    def finish(self, source: str, **extra) -> None:
+        entry = self.sources.setdefault(source, {})
+        entry.update(status="done", **extra)
+        self._touch()
+
+    def fail(self, message: str) -> None:
+        self.error = message
+        self._touch()
+
+    def snapshot(self) -> dict:
+        return {source: dict(entry) for source, entry in self.sources.items()}
+
+    def _touch(self) -> None:
+        if self.job_id is None:
+            return
+        if time.monotonic() - self._flushed_at < PROGRESS_FLUSH_INTERVAL:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> None:
+        if self.job_id is None:
+            return
+        self._flushed_at = time.monotonic()
+        try:
+            await save_job_progress(self.job_id, self.snapshot())
+        except Exception as e:
+            logger.warning("Не удалось сохранить прогресс задания %s: %s", self.job_id, e)
+
+
+@connection
+async def enqueue_job(session, trigger: str) -> ParserJobOut:
+    """Ставит запуск в очередь. Если запуск уже ждёт или выполняется,
+    возвращается он: повторные нажатия и cron не создают лишней работы."""
+    await session.execute(select(func.pg_advisory_xact_lock(ENQUEUE_LOCK_ID)))
+    active = (
+        await session.execute(
+            select(ParserJob).where(ParserJob.status.in_(ACTIVE_STATUSES)).order_by(ParserJob.id).limit(1)
+        )
+    ).scalar_one_or_none()
+    if active is not None:
+        active = ParserJobOut.model_validate(active)
+        await session.commit()
+        logger.info("Запуск парсера (%s) не создан: задание %s уже %s", trigger, active.id, active.status)
+        return active
+    job = ParserJob(trigger=trigger, status="queued", progress={}, created_at=datetime.datetime.now())
+    session.add(job)
+    await session.flush()
+    job = ParserJobOut.model_validate(job)
+    await session.commit()
+    logger.info("Задание парсера %s поставлено в очередь (%s)", job.id, trigger)
+    return job
+
+
+@connection
+async def claim_next_job(session) -> Optional[ParserJobOut]:
+    next_id = (
+        select(ParserJob.id)
+        .where(ParserJob.status == "queued")
+        .order_by(ParserJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    job = (
+        await session.execute(
+            update(ParserJob)
+            .where(ParserJob.id == next_id)
+            .values(status="running", started_at=datetime.datetime.now())
+            .returning(ParserJob)
+        )
+    ).scalar_one_or_none()
+    if job is not None:
+        job = ParserJobOut.model_validate(job)
+    await session.commit()
+    return job
+
+
+@connection
+async def fail_orphaned_jobs(session) -> None:
+    """Задания в статусе running без блокировки остались от упавшего процесса."""
+    result = await session.execute(
+        update(ParserJob)
+        .where(ParserJob.status == "running")
+        .values(status="failed", error="Процесс парсера был остановлен", finished_at=datetime.datetime.now())
+    )
+    await session.commit()
+    if result.rowcount:
+        logger.warning("Отмечено %d прерванных заданий парсера", result.rowcount)
+
+
+@connection
+async def save_job_progress(session, job_id: int, progress: dict) -> None:
+    await session.execute(update(ParserJob).where(ParserJob.id == job_id).values(progress=progress))
+    await session.commit()
+
+
+@connection
+async def finish_job(
+    session, job_id: int, progress: dict, error: Optional[str] = None, trace: Optional[dict] = None
+) -> None:
+    now = datetime.datetime.now()
+    await session.execute(
+        update(ParserJob)
+        .where(ParserJob.id == job_id)
+        .values(
+            status="failed" if error else "done",
+            progress=progress,
+            error=error,
+            finished_at=now,
+        )
+    )
+    if trace is not None:
+        session.add(ParserRunTrace(job_id=job_id, trace=trace, created_at=now))
+        await session.flush()
+        # Подробные спаны нужны только для последних запусков
+        kept = select(ParserRunTrace.job_id).order_by(ParserRunTrace.job_id.desc()).limit(TRACE_RUNS)
+        await session.execute(delete(ParserRunTrace).where(ParserRunTrace.job_id.not_in(kept)))
+    await session.commit()
+
+
+@connection
+async def get_job(session, job_id: int) -> Optional[ParserJobOut]:
+    job = await session.get(ParserJob, job_id)
+    return ParserJobOut.model_validate(job) if job is not None else None
+
+
+@connection
+async def get_recent_jobs(session, limit: int = 20) -> list:
+    result = await session.execute(select(ParserJob).order_by(ParserJob.id.desc()).limit(limit))
+    return [ParserJobOut.model_validate(job) for job in result.scalars().all()]
+
+
+@connection
+async def get_recent_traces(session, limit: int = TRACE_RUNS, spans: bool = True) -> list:
+    """Трассы последних запусков, новые первыми; без spans - только итоги по стадиям."""
+    result = await session.execute(
+        select(ParserRunTrace, ParserJob.trigger, ParserJob.status)
+        .join(ParserJob, ParserJob.id == ParserRunTrace.job_id)
+        .order_by(ParserRunTrace.job_id.desc())
+        .limit(limit)
+    )
+    traces = []
+    for run, trigger, status in result.all():
+        trace = dict(run.trace)
+        if not spans:
+            trace.pop("spans", None)
+        traces.append({"job_id": run.job_id, "trigger": trigger, "status": status, **trace})
+    return traces
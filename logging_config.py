@@ -0,0 +1,135 @@
+import atexit
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Общий уровень логирования и уровни отдельных модулей:
+# LOG_LEVELS="parsing=DEBUG,crud=WARNING,sqlalchemy.engine=INFO"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Сколько записей может ждать фонового потока; при переполнении новые
+# записи отбрасываются, а не блокируют цикл событий на записи в stdout
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Сэмплирование в горячих циклах: первые LOG_SAMPLE_FIRST сообщений
+# каждого вида, дальше каждое LOG_SAMPLE_EVERY-е (0 - только первые)
+LOG_SAMPLE_FIRST = int(os.getenv("LOG_SAMPLE_FIRST", "5"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "1000"))
+
+_listener: logging.handlers.QueueListener = None
+_handler: "_QueueHandler" = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Кладёт запись в очередь без форматирования: сообщение собирается
+    из msg и args уже в фоновом потоке, а вызывающий код только создаёт
+    LogRecord."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Очередь живёт в том же процессе, запись не нужно готовить к pickle
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> dict:
+    """'parsing=DEBUG,crud=WARNING' -> {'parsing': 'DEBUG', 'crud': 'WARNING'}."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    """Настраивает логирование процесса один раз: корневой логгер пишет в
+    очередь, а вывод в stdout идёт в фоновом потоке QueueListener.
+
+    Вызывается при импорте каждого модуля вместо logging.basicConfig,
+    поэтому работает и в процессах пула разбора.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = _QueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает фоновый поток."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _handler.dropped:
+        sys.stdout.write(f"Отброшено {_handler.dropped} записей лога: очередь переполнена\n")
+
+
+class LogSampler:
+    """Логирование в циклах по строкам и ячейкам.
+
+    По каждому ключу пишутся первые `first` сообщений и затем каждое
+    `every`-е, остальные только считаются; summary() выводит, сколько
+    сообщений каждого вида пропущено. Сообщения форматируются лениво:
+    msg и args передаются логгеру как есть.
+    """
+
+    def __init__(self, logger: logging.Logger, first: int = LOG_SAMPLE_FIRST, every: int = LOG_SAMPLE_EVERY):
+        self.logger = logger
+        self.first = first
+        self.every = every
+        self.counts = collections.Counter()
+        self.logged = collections.Counter()
+        self.levels = {}
+
+    def log(self, level: int, key: str, msg: str, *args) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        self.counts[key] += 1
+        self.levels[key] = level
+        count = self.counts[key]
+        if count <= self.first or (self.every and count % self.every == 0):
+            self.logged[key] += 1
+            self.logger.log(level, msg, *args, stacklevel=3)
+
+    def debug(self, key: str, msg: str, *args) -> None:
+        self.log(logging.DEBUG, key, msg, *args)
+
+    def info(self, key: str, msg: str, *args) -> None:
+        self.log(logging.INFO, key, msg, *args)
+
+    def warning(self, key: str, msg: str, *args) -> None:
+        self.log(logging.WARNING, key, msg, *args)
+
+    def summary(self) -> None:
+        for key, count in self.counts.items():
+            if count > self.logged[key]:
+                self.logger.log(self.levels[key], "%s: %d сообщений, в лог записано %d", key, count, self.logged[key])
@@ -1,24 +1,32 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import AsyncSessionLocal
+from database import AsyncSessionLocal, get_pool_metrics
 from fastapi.security import OAuth2PasswordBearer
 import crud, schemas
-from models import User
+from models import User, async_main
 from datetime import date, timedelta
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, Optional
 import logging
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from pars import main as parser_main
+from logging_config import setup_logging
+from executor import shutdown_executor
+from vk_docs import close_browser
+import fetch_cache
+import jobs
+import response_cache
+import schedule_index
+import free_rooms
+from dbrequests import get_schedule_version
+import worker
 import asyncio
+import os
 from security import verify_password, create_access_token, decode_access_token
 from fastapi import Request
 from fastapi.responses import PlainTextResponse
 
 
 
-# Настройка логирования в stdout
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -27,7 +35,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
-scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+# Парсер по умолчанию выполняет отдельный процесс (worker в Procfile), веб-процесс
+# только ставит задания в очередь. PARSER_EMBEDDED_WORKER=1 запускает воркер внутри
+# веб-процесса - для развёртывания одним процессом
+EMBEDDED_WORKER = os.getenv("PARSER_EMBEDDED_WORKER", "0") == "1"
+worker_task = None
+cache_task = None
+index_task = None
+rooms_task = None
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -79,7 +94,7 @@ async def create_task(
     current_user: schemas.UserOut = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Создание задачи для пользователя: user_id={current_user.id}")
+    logger.info("Создание задачи для пользователя: user_id=%d", current_user.id)
     db_task = await crud.create_task(session, task, current_user.id)
     return db_task
 
@@ -93,7 +108,7 @@ async def get_tasks(
     current_user: schemas.UserOut = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос задач для пользователя: user_id={current_user.id}")
+    logger.info("Запрос задач для пользователя: user_id=%d", current_user.id)
     tasks = await crud.get_tasks_by_user(session, current_user.id)
     return tasks
 
@@ -108,7 +123,7 @@ async def delete_task(
     current_user: schemas.UserOut = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Удаление задачи: task_id={task_id}, user_id={current_user.id}")
+    logger.info("Удаление задачи: task_id=%d, user_id=%d", task_id, current_user.id)
     task = await crud.delete_task(session, task_id, current_user.id)
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found or not authorized")
@@ -121,12 +136,12 @@ async def delete_task(
     description="Создает нового пользователя с указанным email, паролем и именем."
 )
 async def register_user(user: schemas.UserCreate, session: AsyncSession = Depends(get_session)):
-    logger.info(f"Регистрация пользователя: email={user.email}")
+    logger.info("Регистрация пользователя: email=%s", user.email)
     existing_user = await crud.get_user_by_email(session, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     db_user = await crud.create_user(session, user)
-    logger.info(f"Пользователь зарегистрирован: id={db_user.id}")
+    logger.info("Пользователь зарегистрирован: id=%d", db_user.id)
     return db_user
 
 @app.post(
@@ -136,7 +151,7 @@ async def register_user(user: schemas.UserCreate, session: AsyncSession = Depend
     description="Аутентифицирует пользователя и возвращает JWT-токен."
 )
 async def login_user(email: str, password: str, session: AsyncSession = Depends(get_session)):
-    logger.info(f"Попытка входа: email={email}")
+    logger.info("Попытка входа: email=%s", email)
     user = await crud.get_user_by_email(session, email)
     if not user or not verify_password(password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -144,9 +159,70 @@ async def login_user(email: str, password: str, session: AsyncSession = Depends(
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
-    logger.info(f"Успешный вход: email={email}")
+    logger.info("Успешный вход: email=%s", email)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.get(
+    "/schedule/",
+    response_model=schemas.SchedulePageOut,
+    summary="Получить расписание по любому набору фильтров",
+    description=(
+        "Возвращает записи расписания в порядке даты и пары, отобранные по любому сочетанию "
+        "группы, преподавателя, кабинета, кафедры и периода дат. fields оставляет в записях только "
+        "указанные поля (fields=date,time_lesson или несколько параметров fields). Ответ разбит на "
+        "страницы по limit записей: next_cursor передаётся в cursor для следующей страницы."
+    )
+)
+async def get_schedule(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    name_group: Optional[str] = None,
+    name_teacher: Optional[str] = None,
+    cabinet_number: Optional[str] = None,
+    department: Optional[str] = None,
+    fields: Optional[List[str]] = Query(None),
+    limit: int = Query(100, ge=1, le=crud.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_session)
+):
+    fields = [field.strip() for value in fields for field in value.split(",") if field.strip()] if fields else None
+    logger.info(
+        "Запрос расписания: group=%r, teacher=%r, cabinet=%r, department=%r, с %s по %s, fields=%s, limit=%d",
+        name_group, name_teacher, cabinet_number, department, start_date, end_date, fields, limit,
+    )
+    try:
+        page = await crud.query_schedule(
+            session, start_date, end_date, name_group, name_teacher, cabinet_number, department,
+            # Явный список полей: записи отдаются словарями без лишних справочников
+            fields=fields or crud.SCHEDULE_FIELDS,
+            limit=limit,
+            after=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info("Найдено %d записей", len(page.items))
+    return {"items": page.items, "next_cursor": page.next_cursor}
+
+@app.post(
+    "/schedule/batch/",
+    response_model=schemas.ScheduleBatchOut,
+    summary="Получить расписание по нескольким запросам сразу",
+    description=(
+        "Принимает список запросов: kind (group, teacher, cabinet, department), key - название, "
+        "date или start_date и end_date, необязательный id. Все запросы выполняются одним запросом к "
+        "базе; results содержит расписание по каждому запросу под его id или номером в списке."
+    )
+)
+async def get_schedule_batch(
+    batch: schemas.ScheduleBatchIn,
+    session: AsyncSession = Depends(get_session)
+):
+    logger.info("Пакетный запрос расписания: %d запросов", len(batch.lookups))
+    result = await crud.get_schedule_batch(session, batch.lookups)
+    results = dict(zip(batch.result_keys(), result))
+    logger.info("Найдено %d записей", sum(len(items) for items in result))
+    return {"results": results}
+
 @app.get(
     "/schedule/by-date-group/",
     response_model=List[schemas.ScheduleOut],
@@ -158,9 +234,9 @@ async def get_schedule_by_date_group(
     name_group: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: date={date}, name_group={name_group!r}")
+    logger.info("Запрос расписания: date=%s, name_group=%r", date, name_group)
     result = await crud.get_schedule_by_date_and_group(session, date, name_group)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -174,9 +250,9 @@ async def get_schedule_by_date_teacher(
     name_teacher: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: date={date}, name_teacher={name_teacher!r}")
+    logger.info("Запрос расписания: date=%s, name_teacher=%r", date, name_teacher)
     result = await crud.get_schedule_by_date_and_teacher(session, date, name_teacher)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -191,9 +267,9 @@ async def get_schedule_by_group_range(
     end_date: date,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: name_group={name_group!r}, start_date={start_date}, end_date={end_date}")
+    logger.info("Запрос расписания: name_group=%r, start_date=%s, end_date=%s", name_group, start_date, end_date)
     result = await crud.get_schedule_by_group_and_date_range(session, name_group, start_date, end_date)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -208,9 +284,9 @@ async def get_schedule_by_teacher_range(
     end_date: date,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: name_teacher={name_teacher!r}, start_date={start_date}, end_date={end_date}")
+    logger.info("Запрос расписания: name_teacher=%r, start_date=%s, end_date=%s", name_teacher, start_date, end_date)
     result = await crud.get_schedule_by_teacher_and_date_range(session, name_teacher, start_date, end_date)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -224,9 +300,9 @@ async def get_schedule_by_date_department(
     department: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: date={date}, department={department!r}")
+    logger.info("Запрос расписания: date=%s, department=%r", date, department)
     result = await crud.get_schedule_by_date_and_department(session, date, department)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -241,9 +317,9 @@ async def get_schedule_by_department(
     end_date: date,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: department={department!r}, start_date={start_date}, end_date={end_date}")
+    logger.info("Запрос расписания: department=%r, start_date=%s, end_date=%s", department, start_date, end_date)
     result = await crud.get_schedule_by_department(session, department, start_date, end_date)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -258,9 +334,9 @@ async def get_schedule_by_date_department_teacher(
     name_teacher: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: date={date}, department={department!r}, name_teacher={name_teacher!r}")
+    logger.info("Запрос расписания: date=%s, department=%r, name_teacher=%r", date, department, name_teacher)
     result = await crud.get_schedule_by_date_department_teacher(session, date, department, name_teacher)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -276,9 +352,9 @@ async def get_schedule_by_department_teacher_range(
     end_date: date,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: department={department!r}, name_teacher={name_teacher!r}, start_date={start_date}, end_date={end_date}")
+    logger.info("Запрос расписания: department=%r, name_teacher=%r, start_date=%s, end_date=%s", department, name_teacher, start_date, end_date)
     result = await crud.get_schedule_by_department_teacher_range(session, department, name_teacher, start_date, end_date)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -292,9 +368,9 @@ async def get_free_cabinets(
     time_lesson: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос свободных кабинетов: date={date}, time_lesson={time_lesson}")
+    logger.info("Запрос свободных кабинетов: date=%s, time_lesson=%s", date, time_lesson)
     result = await crud.get_free_cabinets(session, date, time_lesson)
-    logger.info(f"Найдено {len(result)} свободных кабинетов")
+    logger.info("Найдено %d свободных кабинетов", len(result))
     return result
 
 @app.get(
@@ -309,11 +385,53 @@ async def get_free_cabinets_range(
     time_lesson: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос свободных кабинетов: start_date={start_date}, end_date={end_date}, time_lesson={time_lesson}")
+    logger.info("Запрос свободных кабинетов: start_date=%s, end_date=%s, time_lesson=%s", start_date, end_date, time_lesson)
     result = await crud.get_free_cabinets_range(session, start_date, end_date, time_lesson)
-    logger.info(f"Найдено свободных кабинетов для {len(result)} дат")
+    logger.info("Найдено свободных кабинетов для %d дат", len(result))
     return result
 
+@app.get(
+    "/schedule/free-cabinets-window/",
+    response_model=dict,
+    summary="Получить кабинеты, свободные в окне из нескольких пар и дат",
+    description=(
+        "Возвращает кабинеты, свободные во всех парах с first_pair по last_pair (или во всех парах "
+        "time_lesson) в каждую дату периода. weekdays (1 - понедельник) оставляет только эти дни недели: "
+        "например, weekdays=2 - свободные каждый вторник периода."
+    )
+)
+async def get_free_cabinets_window(
+    start_date: date,
+    end_date: date,
+    first_pair: int = 1,
+    last_pair: Optional[int] = None,
+    weekdays: Optional[List[int]] = Query(None),
+    time_lesson: Optional[List[str]] = Query(None),
+    session: AsyncSession = Depends(get_session)
+):
+    if time_lesson:
+        time_lessons = time_lesson
+    else:
+        pairs = range(first_pair, (last_pair or first_pair) + 1)
+        if not pairs or any(pair not in free_rooms.PAIR_TIMES for pair in pairs):
+            raise HTTPException(status_code=400, detail=f"Номера пар должны быть от 1 до {len(free_rooms.PAIR_TIMES)}")
+        time_lessons = [free_rooms.PAIR_TIMES[pair] for pair in pairs]
+    if weekdays and any(day < 1 or day > 7 for day in weekdays):
+        raise HTTPException(status_code=400, detail="Дни недели должны быть от 1 до 7")
+    logger.info(
+        "Запрос свободных кабинетов: start_date=%s, end_date=%s, time_lessons=%s, weekdays=%s",
+        start_date, end_date, time_lessons, weekdays,
+    )
+    result = await crud.get_free_cabinets_window(session, start_date, end_date, time_lessons, weekdays)
+    logger.info("Найдено %d свободных кабинетов", len(result))
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "time_lessons": time_lessons,
+        "weekdays": weekdays,
+        "free_cabinets": result,
+    }
+
 @app.get(
     "/schedule/by-date-cabinet/",
     response_model=List[schemas.ScheduleOut],
@@ -325,9 +443,9 @@ async def get_schedule_by_date_cabinet(
     cabinet_number: str,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: date={date}, cabinet_number={cabinet_number!r}")
+    logger.info("Запрос расписания: date=%s, cabinet_number=%r", date, cabinet_number)
     result = await crud.get_schedule_by_date_and_cabinet(session, date, cabinet_number)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.get(
@@ -342,9 +460,9 @@ async def get_schedule_by_cabinet_range(
     end_date: date,
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос расписания: cabinet_number={cabinet_number!r}, start_date={start_date}, end_date={end_date}")
+    logger.info("Запрос расписания: cabinet_number=%r, start_date=%s, end_date=%s", cabinet_number, start_date, end_date)
     result = await crud.get_schedule_by_cabinet_range(session, cabinet_number, start_date, end_date)
-    logger.info(f"Найдено {len(result)} записей")
+    logger.info("Найдено %d записей", len(result))
     return result
 
 @app.delete(
@@ -353,25 +471,32 @@ async def get_schedule_by_cabinet_range(
     description="Удаляет записи расписания до указанной даты."
 )
 async def delete_old_schedule(before: date, session: AsyncSession = Depends(get_session)):
-    logger.info(f"Удаление расписания до {before}")
+    logger.info("Удаление расписания до %s", before)
     await crud.delete_old_schedules(session, before)
     logger.info("Записи удалены")
     return {"status": "deleted"}
 
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Запуск приложения и планировщика")
-    #Запуск парсера в фоновом режиме
-    logger.info("Запуск парсера в фоновом режиме при старте сервера")
-    asyncio.create_task(parser_main())
-    #Настройка ежедневного парсинга
-    scheduler.add_job(
-        parser_main,
-        trigger=CronTrigger(hour=6, minute=0, timezone="Europe/Moscow"),
-        id="daily_parser",
-        replace_existing=True
-    )
-    scheduler.start()
+    global worker_task, cache_task, index_task, rooms_task
+    logger.info("Запуск приложения")
+    # Схему создаёт и обновляет сам веб-процесс, не дожидаясь воркера: без неё
+    # /run-parser/, watch_versions и загрузчики снимков обращаются к таблицам,
+    # которых ещё нет. migrate() идемпотентна и идёт под advisory-блокировкой,
+    # поэтому одновременный старт web и worker безопасен
+    await async_main()
+    # Кэш ответов сбрасывается и по поколению данных: его может сдвинуть воркер в другом процессе
+    cache_task = asyncio.create_task(response_cache.watch_versions(get_schedule_version))
+    # При SCHEDULE_READ_ENGINE=memory расписание читается из снимка в памяти
+    index_task = asyncio.create_task(schedule_index.run_reloader())
+    # Поиск свободных кабинетов по матрице занятости (FREE_ROOMS_MATRIX=0 - по базе)
+    rooms_task = asyncio.create_task(free_rooms.run_reloader())
+    if EMBEDDED_WORKER:
+        # Воркер сам ставит запуск при старте и ежедневный запуск в 06:00
+        logger.info("Запуск воркера парсера в фоновом режиме")
+        worker_task = asyncio.create_task(worker.run_worker())
+    else:
+        logger.info("Воркер парсера в веб-процессе отключён: задания выполняет python worker.py")
 
 
 @app.get(
@@ -385,7 +510,7 @@ async def get_departments(
 ):
     logger.info("Запрос списка кафедр")
     departments = await crud.get_unique_departments(session)
-    logger.info(f"Найдено {len(departments)} кафедр")
+    logger.info("Найдено %d кафедр", len(departments))
     return departments
 
 @app.get(
@@ -405,16 +530,122 @@ async def get_current_user_data(
     current_user: schemas.UserOut = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
-    logger.info(f"Запрос данных пользователя: user_id={current_user.id}")
+    logger.info("Запрос данных пользователя: user_id=%d", current_user.id)
     return current_user
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    logger.info("Остановка приложения и планировщика")
-    scheduler.shutdown()
+    logger.info("Остановка приложения и воркера парсера")
+    for task in (worker_task, cache_task, index_task, rooms_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    shutdown_executor()
+    await close_browser()
 
-@app.post("/run-parser/", summary="Ручной запуск парсера", description="Запускает парсер для обновления расписания.")
+@app.post(
+    "/run-parser/",
+    summary="Ручной запуск парсера",
+    description="Ставит запуск парсера в очередь и сразу возвращает номер задания. Если запуск уже ждёт или выполняется, возвращается он."
+)
 async def run_parser():
     logger.info("Ручной запуск парсера")
-    await parser_main()
-    return {"message": "Парсер запущен"}
\ No newline at end of file
+    job = await jobs.enqueue_job("manual")
+    message = "Запуск поставлен в очередь" if job.status == "queued" else "Запуск уже выполняется"
+    return {"message": message, "job_id": job.id, "status": job.status}
+
+@app.get(
+    "/parser/jobs/",
+    response_model=List[schemas.ParserJobOut],
+    summary="Последние запуски парсера",
+    description="Возвращает последние задания парсера со статусом и прогрессом по источникам."
+)
+async def get_parser_jobs(limit: int = 20):
+    return await jobs.get_recent_jobs(limit)
+
+@app.get(
+    "/parser/jobs/{job_id}",
+    response_model=schemas.ParserJobOut,
+    summary="Статус запуска парсера",
+    description="Возвращает статус задания парсера и прогресс по источникам: найдено, разобрано и с ошибкой файлов."
+)
+async def get_parser_job(job_id: int):
+    job = await jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get(
+    "/parser/runs/",
+    response_model=List[dict],
+    summary="Трассы последних запусков парсера",
+    description=(
+        "Возвращает спаны последних запусков парсера по файлам и стадиям (discover, download, convert, "
+        "parse, write, publish): длительность, байты, строки, вставленные/обновлённые/удалённые слоты "
+        "и память: для convert и parse - пик (peak_rss_mb) и прирост (rss_delta_mb) каждой стадии отдельно, "
+        "для остальных стадий - прирост памяти процесса (rss_delta_mb). spans=false оставляет только итоги по стадиям."
+    )
+)
+async def get_parser_runs(limit: int = jobs.TRACE_RUNS, spans: bool = True):
+    return await jobs.get_recent_traces(limit, spans)
+
+@app.get(
+    "/db/pool/",
+    response_model=dict,
+    summary="Метрики пула соединений",
+    description=(
+        "Состояние общего пула соединений с базой: занятые и свободные соединения, насыщение пула, "
+        "время ожидания соединения, таймауты и возраст открытых соединений."
+    )
+)
+async def get_db_pool():
+    return get_pool_metrics()
+
+@app.get(
+    "/parser/fetch-cache/",
+    response_model=dict,
+    summary="Статистика кэша загрузок парсера",
+    description="Возвращает число попаданий и промахов кэша загрузок за последний запуск парсера."
+)
+async def get_fetch_cache_stats():
+    return fetch_cache.last_stats
+
+@app.get(
+    "/schedule/cache/",
+    response_model=dict,
+    summary="Статистика кэша ответов",
+    description=(
+        "Состояние кэша ответов на чтение расписания: число и объём записей, попадания, промахи, "
+        "совмещённые промахи, доля попаданий, вытеснения по размеру и TTL, сбросы и поколение данных."
+    )
+)
+async def get_schedule_cache_stats():
+    return response_cache.get_stats()
+
+@app.get(
+    "/schedule/index/",
+    response_model=dict,
+    summary="Снимок расписания в памяти",
+    description=(
+        "Состояние снимка расписания в памяти (SCHEDULE_READ_ENGINE=memory): число строк, поколение данных "
+        "изменений, время и длительность последней загрузки, объём столбцов и индексов, размеры справочников."
+    )
+)
+async def get_schedule_index_stats():
+    return schedule_index.get_stats()
+
+@app.get(
+    "/schedule/free-cabinets-matrix/",
+    response_model=dict,
+    summary="Матрица занятости кабинетов",
+    description=(
+        "Состояние битовой матрицы занятости, по которой ищутся свободные кабинеты: число кабинетов, пар "
+        "и дней, объём, поколение данных, время и длительность последней загрузки."
+    )
+)
+async def get_free_rooms_stats():
+    return free_rooms.get_stats()
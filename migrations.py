@@ -0,0 +1,237 @@
+"""Версионированные миграции схемы.
+
+Применённые версии хранятся в schema_migrations. migrate() вызывается при
+старте API и воркера (models.async_main) и применяет недостающие миграции
+одной транзакцией под advisory-блокировкой, поэтому одновременный старт
+нескольких процессов безопасен, а повторный вызов ничего не делает.
+
+На пустой базе (нет ни таблицы schedules, ни применённых версий) таблицы
+создаются сразу по текущим моделям, а все миграции только отмечаются
+применёнными. На существующей базе миграция 1 создаёт недостающие
+таблицы по текущим моделям, поэтому следующие миграции могут найти часть
+своих таблиц уже созданными. Отсюда правило: каждая миграция пишется
+идемпотентно (IF NOT EXISTS, ON CONFLICT, UPDATE только расходящихся
+строк) и не зависит от моделей: её SQL фиксирует схему на момент версии.
+
+    python migrations.py            # применить миграции
+    python migrations.py --status   # показать применённые версии
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+from typing import Awaitable, Callable, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from logging_config import setup_logging
+from models import Base, engine
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: миграции применяет только один процесс
+MIGRATION_LOCK_ID = 85060842
+
+CREATE_MIGRATIONS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    "version integer PRIMARY KEY, name varchar(255) NOT NULL, applied_at timestamp NOT NULL)"
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+
+
+async def execute_all(conn: AsyncConnection, statements) -> None:
+    for statement in statements:
+        await conn.execute(text(statement))
+
+
+async def create_tables(conn: AsyncConnection) -> None:
+    await conn.run_sync(Base.metadata.create_all)
+
+
+async def schedule_indexes(conn: AsyncConnection) -> None:
+    await execute_all(conn, [
+        # Номер записи внутри слота: слот из ячейки с несколькими группами
+        # хранит несколько строк, и вместе с номером ключ становится уникальным
+        "ALTER TABLE schedules ADD COLUMN IF NOT EXISTS slot_position integer NOT NULL DEFAULT 0",
+        """
+        UPDATE schedules AS s SET slot_position = numbered.position
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY date, time_lesson, cabinet_number ORDER BY id) - 1 AS position
+            FROM schedules
+        ) AS numbered
+        WHERE s.id = numbered.id AND s.slot_position <> numbered.position
+        """,
+        "ALTER TABLE schedule_run_staging ADD COLUMN IF NOT EXISTS position integer NOT NULL DEFAULT 0",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_schedules_slot ON schedules (date, time_lesson, cabinet_number, slot_position)",
+        "CREATE INDEX IF NOT EXISTS ix_schedules_group_date ON schedules (name_group, date)",
+        "CREATE INDEX IF NOT EXISTS ix_schedules_teacher_date ON schedules (name_teacher, date)",
+        "CREATE INDEX IF NOT EXISTS ix_schedules_department_date ON schedules (department, date)",
+        "CREATE INDEX IF NOT EXISTS ix_schedules_cabinet_date ON schedules (cabinet_number, date)",
+        "ANALYZE schedules",
+    ])
+
+
+# Справочники и столбцы schedules, из которых они заполняются
+DIMENSION_TABLES = [
+    ("schedule_groups", "name_group", "group_id", 255),
+    ("schedule_teachers", "name_teacher", "teacher_id", 255),
+    ("schedule_disciplines", "name_discipline", "discipline_id", 255),
+    ("schedule_departments", "department", "department_id", 255),
+    ("schedule_cabinets", "cabinet_number", "cabinet_id", 50),
+]
+
+# Начало пары в минутах от полуночи: '8:30-10:00' -> 510
+LESSON_STARTS_AT = (
+    "substring(time_lesson from '^(\\d{1,2})[:.]\\d{2}')::smallint * 60"
+    " + substring(time_lesson from '^\\d{1,2}[:.](\\d{2})')::smallint"
+)
+
+
+async def normalize_schedules(conn: AsyncConnection) -> None:
+    # Справочники (на базе до миграции 1 их уже создала create_tables)
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {table} (id serial PRIMARY KEY, name varchar({length}) NOT NULL UNIQUE)"
+        for table, _, _, length in DIMENSION_TABLES
+    ]
+    statements.append(
+        "CREATE TABLE IF NOT EXISTS schedule_lessons ("
+        "id smallserial PRIMARY KEY, time_lesson varchar(50) NOT NULL UNIQUE, starts_at smallint)"
+    )
+    statements += [
+        f"INSERT INTO {table} (name) SELECT DISTINCT {column} FROM schedules "
+        f"WHERE {column} IS NOT NULL ON CONFLICT (name) DO NOTHING"
+        for table, column, _, _ in DIMENSION_TABLES
+    ]
+    statements.append(
+        f"INSERT INTO schedule_lessons (time_lesson, starts_at) "
+        f"SELECT time_lesson, {LESSON_STARTS_AT} FROM (SELECT DISTINCT time_lesson FROM schedules) AS lessons "
+        f"ON CONFLICT (time_lesson) DO NOTHING"
+    )
+
+    # Таблица пересобирается целиком: новая строка вдвое-втрое короче, и
+    # копия без мёртвых версий строк занимает меньше, чем ALTER на месте
+    foreign_keys = ",\n".join(
+        f"{key} integer {'' if column == 'department' else 'NOT NULL '}"
+        f"CONSTRAINT schedules_{key}_fkey REFERENCES {table} (id)"
+        for table, column, key, _ in DIMENSION_TABLES
+    )
+    joins = "\n".join(
+        f"{'LEFT ' if column == 'department' else ''}JOIN {table} ON {table}.name = s.{column}"
+        for table, column, _, _ in DIMENSION_TABLES
+    )
+    keys = ", ".join(key for _, _, key, _ in DIMENSION_TABLES)
+    ids = ", ".join(f"{table}.id" for table, _, _, _ in DIMENSION_TABLES)
+    statements += [
+        f"""
+        CREATE TABLE schedules_new (
+            id serial,
+            date date NOT NULL,
+            lesson_id smallint NOT NULL CONSTRAINT schedules_lesson_id_fkey REFERENCES schedule_lessons (id),
+            {foreign_keys},
+            slot_position smallint NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        INSERT INTO schedules_new (id, date, lesson_id, {keys}, slot_position)
+        SELECT s.id, s.date, schedule_lessons.id, {ids}, s.slot_position
+        FROM schedules AS s
+        JOIN schedule_lessons ON schedule_lessons.time_lesson = s.time_lesson
+        {joins}
+        """,
+        "DROP TABLE schedules",
+        "ALTER TABLE schedules_new RENAME TO schedules",
+        "ALTER SEQUENCE schedules_new_id_seq RENAME TO schedules_id_seq",
+        "ALTER TABLE schedules ADD CONSTRAINT schedules_pkey PRIMARY KEY (id)",
+        "SELECT setval('schedules_id_seq', coalesce(max(id), 0) + 1, false) FROM schedules",
+        "CREATE UNIQUE INDEX uq_schedules_slot ON schedules (date, lesson_id, cabinet_id, slot_position)",
+        "CREATE INDEX ix_schedules_group_date ON schedules (group_id, date)",
+        "CREATE INDEX ix_schedules_teacher_date ON schedules (teacher_id, date)",
+        "CREATE INDEX ix_schedules_department_date ON schedules (department_id, date)",
+        "CREATE INDEX ix_schedules_cabinet_date ON schedules (cabinet_id, date)",
+        "ANALYZE schedules",
+    ]
+    for table, _, _, _ in DIMENSION_TABLES:
+        statements.append(f"ANALYZE {table}")
+    statements.append("ANALYZE schedule_lessons")
+    await execute_all(conn, statements)
+
+
+async def schedule_generation(conn: AsyncConnection) -> None:
+    # Счётчик продолжает номера журнала: наблюдатели со старым номером увидят сдвиг
+    await execute_all(conn, [
+        "CREATE TABLE IF NOT EXISTS schedule_generation (id smallint PRIMARY KEY, version bigint NOT NULL)",
+        "INSERT INTO schedule_generation (id, version) "
+        "SELECT 1, coalesce(max(version), 0) FROM schedule_changes ON CONFLICT (id) DO NOTHING",
+    ])
+
+
+MIGRATIONS = [
+    Migration(1, "create_tables", create_tables),
+    Migration(2, "schedule_indexes", schedule_indexes),
+    Migration(3, "normalize_schedules", normalize_schedules),
+    Migration(4, "schedule_generation", schedule_generation),
+]
+
+
+async def applied_versions(conn: AsyncConnection) -> dict:
+    result = await conn.execute(text("SELECT version, name, applied_at FROM schema_migrations ORDER BY version"))
+    return {version: (name, applied_at) for version, name, applied_at in result.all()}
+
+
+async def migrate() -> list:
+    """Применяет недостающие миграции и возвращает их номера."""
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+        await conn.execute(text(CREATE_MIGRATIONS_TABLE))
+        applied = await applied_versions(conn)
+        pending = [migration for migration in MIGRATIONS if migration.version not in applied]
+        fresh = not applied and (await conn.execute(text("SELECT to_regclass('schedules')"))).scalar() is None
+        if fresh:
+            # Пустая база: схема создаётся сразу в текущем виде
+            logger.info("Пустая база: создание таблиц по моделям")
+            await create_tables(conn)
+        for migration in pending:
+            if not fresh:
+                logger.info("Применение миграции %s: %s", migration.version, migration.name)
+                await migration.upgrade(conn)
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": migration.version, "name": migration.name, "applied_at": datetime.datetime.now()},
+            )
+    if pending:
+        logger.info("Схема обновлена до версии %s", pending[-1].version)
+    return [migration.version for migration in pending]
+
+
+async def status() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(CREATE_MIGRATIONS_TABLE))
+        applied = await applied_versions(conn)
+    for migration in MIGRATIONS:
+        name, applied_at = applied.get(migration.version, (migration.name, None))
+        print(f"{migration.version:4d} {name:30s} {applied_at or 'не применена'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных")
+    parser.add_argument("--status", action="store_true", help="показать применённые миграции")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            if args.status:
+                await status()
+            else:
+                print(f"Применены миграции: {await migrate() or 'нет новых'}")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
@@ -1,18 +1,35 @@
 import asyncio
 from models import async_main
 from parsing import start_parsing
+from executor import shutdown_executor
+from vk_docs import close_browser
+from jobs import parser_lock
 import logging
+from logging_config import setup_logging
 
 
-# Настройка логирования в stdout
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
 logger = logging.getLogger(__name__)
 
-async def main():
+async def main(progress=None):
     logger.info("Запуск парсера")
     await async_main()  # Инициализация базы данных
-    await start_parsing()  # Запуск парсинга
+    await start_parsing(progress)  # Запуск парсинга
     logger.info("Парсинг завершен")
 
+async def run_once():
+    try:
+        async with parser_lock() as acquired:
+            if not acquired:
+                logger.info("Парсер уже выполняется в другом процессе")
+                return
+            await main()
+    finally:
+        await close_browser()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(run_once())
+    finally:
+        shutdown_executor()
@@ -1,59 +1,45 @@
-from xls2xlsx import XLS2XLSX
-from openpyxl import load_workbook
-import os
-import requests
 import datetime
 import asyncio
 import logging
+import os
 import traceback
-import tempfile
-import pandas as pd
 import re
-import aiohttp
+from typing import Optional
 from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
-from dbrequests import delete_outdated_schedules, update_schedule
-from playwright.async_api import async_playwright
-import aiofiles
-import subprocess
-
-def ensure_playwright_browsers_installed():
-    pw_cache_path = "/opt/render/.cache/ms-playwright"
-    if not os.path.exists(pw_cache_path) or not os.listdir(pw_cache_path):
-        subprocess.run(["playwright", "install", "--with-deps"], check=True)
-
-
-# Настройка логирования в stdout
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from dbrequests import delete_outdated_schedules, apply_schedule_batch, SlotUpdate, ScheduleRun
+from downloader import Downloader
+from fetch_cache import FetchCache
+from logging_config import setup_logging
+from jobs import JobProgress
+from executor import run_cpu
+from pipeline import run_pipeline
+from extractors import extract_room_rows, extract_teacher_rows, extract_vk_records, merge_slot_rows, with_metrics
+from telemetry import get_trace, span, record_worker_metrics
+from vk_docs import discover_vk_documents
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
 logger = logging.getLogger(__name__)
 
-time_from_pair = {
-    "1 пара": "8:20-9:50",
-    "2 пара": "10:00-11:30",
-    "3 пара": "11:45-13:15",
-    "4 пара": "14:00-15:30",
-    "5 пара": "15:45-17:15",
-    "6 пара": "17:20-18:50",
-    "7 пара": "18:55-20:15",
-}
-
-user_agent = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 YaBrowser/24.1.0.0 Safari/537.36"
-}
 url_site = "https://www.vyatsu.ru/studentu-1/spravochnaya-informatsiya/zanyatost-auditoriy.html"
 url_teacher_site = "https://www.vyatsu.ru/studentu-1/spravochnaya-informatsiya/teacher.html"
 
 VK_GROUP_URL = "https://vk.com/kollegevyatsu"
 
-async def get_content(url):
-    logger.info(f"Запрос контента с {url}")
-    response = requests.get(url, headers=user_agent)
-    response.raise_for_status()
-    return response
+# run - все файлы запуска публикуются одной транзакцией в конце,
+# source - каждый файл публикуется сразу после разбора
+PUBLISH_MODE = os.getenv("PARSER_PUBLISH_MODE", "run")
+# PARSER_TEACHERS=0 отключает разбор расписаний преподавателей
+TEACHERS_ENABLED = os.getenv("PARSER_TEACHERS", "1") != "0"
+# Сколько кафедр разбирается одновременно; загрузки дополнительно
+# ограничены семафором Downloader, разбор - числом процессов пула
+TEACHER_DEPARTMENT_CONCURRENCY = int(os.getenv("PARSER_TEACHER_DEPARTMENTS", "4"))
+
+async def get_content(downloader: Downloader, url: str) -> str:
+    return await downloader.fetch_text(url)
 
-async def get_urls(response):
+async def get_urls(text: str):
     list_urls = []
-    text: str = response.text
 
     while True:
         index = text.find('href="/reports/')
@@ -74,71 +60,16 @@ async def get_urls(response):
                 current_date = datetime.date.today()
                 if current_date < last_date and (last_date - current_date).days < 180:
                     list_urls.append(url)
-                    logger.info(f"Найдена актуальная ссылка: {url}")
+                    logger.info("Найдена актуальная ссылка: %s", url)
             except Exception as e:
-                logger.error(f"Ошибка обработки ссылки {url}: {e}")
+                logger.error("Ошибка обработки ссылки %s: %s", url, e)
                 logger.error(traceback.format_exc())
         text = text[end_index:]
     return list_urls
 
-from bs4 import BeautifulSoup
-import re
-import datetime
-import logging
-
-logger = logging.getLogger(__name__)
-
-def improved_parse_cell(cell_text: str) -> List[Dict[str, Optional[str]]]:
-    if not cell_text or not isinstance(cell_text, str):
-        return []
-
-    entries = cell_text.strip().split("\n")
-    results = []
-
-    current = {
-        "discipline": "",
-        "lesson_type": "",
-        "teacher": "",
-        "cabinet": "",
-        "subgroup": ""
-    }
-
-    for line in entries:
-        line = line.strip()
-        if not line:
-            continue
-
-        # Аудитория
-        if re.match(r"^\d{1,2}-\d{1,3}$", line):
-            current["cabinet"] = line
-            continue
-
-        # Преподаватель
-        if re.match(r".+\s[А-ЯЁ]\.[А-ЯЁ]\.", line):
-            current["teacher"] = line
-            continue
-
-        # Вид занятия
-        if "занятие" in line or "Лекция" in line or "урок" in line:
-            current["lesson_type"] = line
-            continue
-
-        # Подгруппа
-        if "подгруппа" in line:
-            current["subgroup"] = line
-            continue
-
-        # Всё остальное — дисциплина
-        current["discipline"] += (line + " ")
-
-    current = {k: v.strip() for k, v in current.items()}
-    results.append(current)
-
-    return results
-
-async def get_teacher_urls(response):
+async def get_teacher_urls(text: str):
     list_urls = []
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(text, 'html.parser')
     
     # Находим все кафедры на странице
     kafedry = soup.find_all('div', class_='kafPeriod')
@@ -170,443 +101,265 @@ async def get_teacher_urls(response):
                     # Отбираем только актуальные файлы
                     if current_date < start_date and (start_date - current_date).days < 180:
                         list_urls.append((url, teacher_name, kafedra_name))
-                        logger.info(f"Найдена ссылка кафедры: {url}, преподаватель: {teacher_name}, кафедра: {kafedra_name}")
+                        logger.info("Найдена ссылка кафедры: %s, преподаватель: %s, кафедра: %s", url, teacher_name, kafedra_name)
             except Exception as e:
-                logger.error(f"Ошибка обработки ссылки {url}: {e}")
+                logger.error("Ошибка обработки ссылки %s: %s", url, e)
     
     return list_urls
 
 
 
-async def download(url: str) -> str:
-    response = requests.get(url, headers=user_agent)
-    response.raise_for_status()
-    filename = url[-25:]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xls") as temp_file:
-        temp_file.write(response.content)
-        temp_path = temp_file.name
-    logger.info(f"Скачан файл {filename} в {temp_path}")
-    return temp_path
-
-async def convert_xls_to_xlsx(path: str) -> str:
-    x2x = XLS2XLSX(path)
-    xlsx_path = path + "x"
-    x2x.to_xlsx(xlsx_path)
-    logger.info(f"Конвертирован {path} в {xlsx_path}")
-    return xlsx_path
-
-async def parsing_url(url: str) -> None:
-    try:
-        path = await download(url)
+async def write_rows(rows, source: str, run: Optional[ScheduleRun] = None) -> dict:
+    """Записывает строки файла и возвращает счётчики записи для спана write."""
+    if run is not None:
+        return {"rows": await run.stage(rows, source)}
+    stats = await apply_schedule_batch(rows, source)
+    return {**stats, "rows": stats["inserted"]}
+
+def commit_fetch(cache: Optional[FetchCache], url: str, run: Optional[ScheduleRun] = None) -> None:
+    """Файл помечается разобранным сразу или, в режиме run, после публикации."""
+    if cache is None:
+        return
+    if run is not None:
+        run.urls.append(url)
+    else:
+        cache.commit(url)
+
+async def ingest_files(
+    downloader: Downloader,
+    urls,
+    source: str,
+    extract,
+    write,
+    progress: JobProgress,
+    trace_writes: bool = True,
+) -> None:
+    """Прогоняет файлы источника через run_pipeline.
+
+    extract(url, content) разбирает файл и возвращает (результат, метрики)
+    из extractors.with_metrics, write(url, result) сохраняет результат и
+    возвращает счётчики записи. Каждый файл даёт спаны download, convert,
+    parse и write; trace_writes=False отключает спан write, если write
+    только накапливает строки для общей записи. Ошибки отдельных файлов
+    логируются и учитываются в прогрессе источника, остальные файлы
+    продолжают обработку.
+    """
+    async def fetch(url):
+        try:
+            with span("download", url) as record:
+                content = await downloader.fetch(url)
+                record["bytes"] = len(content) if content is not None else 0
+                record["unchanged"] = content is None
+        except Exception as e:
+            # Любая ошибка загрузки (сеть, неверная ссылка, кэш) - ошибка только этого файла
+            logger.error("Ошибка загрузки %s: %s", url, e)
+            progress.advance(source, False)
+            return None
+        if content is None:
+            progress.skip(source)
+        return content
+
+    async def parse(url, content):
         try:
-            xlsx_path = await convert_xls_to_xlsx(path)
-            os.remove(path)
-            logger.info(f"Удален временный файл {path}")
-
-            workbook = load_workbook(xlsx_path)
-            worksheet = workbook.active
-
-            for i in range(3, worksheet.max_column):
-                cabinet_number: str = worksheet.cell(row=2, column=i).value
-                if not cabinet_number:
-                    continue
-
-                for j in range(3, worksheet.max_row):
-                    time_lesson: str = worksheet.cell(row=j, column=2).value
-                    if not time_lesson:
-                        continue
-                    time_lesson = time_lesson.strip()
-                    if time_lesson not in time_from_pair:
-                        logger.warning(f"Неизвестное время пары: {time_lesson}")
-                        continue
-                    time_lesson = time_from_pair[time_lesson]
-
-                    date = worksheet.cell(row=j, column=1).value
-                    index_for_day = j - 1
-                    while date is None:
-                        date = worksheet.cell(row=index_for_day, column=1).value
-                        index_for_day -= 1
-                    date = date.strip()[-8:]
-                    date_obj = datetime.datetime.strptime(date, "%d.%m.%y")
-                    date = date_obj.strftime("%Y-%m-%d")
-
-                    value: str = worksheet.cell(row=j, column=i).value
-                    if value and "Резервирование" in value:
-                        value = None
-
-                    if value:
-                        list_value = value.split("\n") if "\n" in value else [value]
-                        list_value = [v.strip() for v in list_value]
-
-                        for ii in range(len(list_value)):
-                            if len(list_value[ii].split()[0]) <= 3:
-                                list_value[ii] = " ".join(list_value[ii].split()[1:])
-
-                        name_of_group = []
-                        name_teacher = []
-                        name_of_discipline = []
-
-                        for value in list_value:
-                            text_split = value.split()
-                            if text_split[-1].count(".") == 2:
-                                name_teacher.append(" ".join(text_split[-2:]))
-                                text_split = text_split[:-2]
-                            else:
-                                name_teacher.append(None)
-
-                            if text_split[0][-1] == ",":
-                                name_of_group.append(" ".join(text_split[:3]))
-                                text_split = text_split[3:]
-                            else:
-                                name_of_group.append(text_split[0])
-                                text_split = text_split[1:]
-
-                            name_of_discipline.append(" ".join(text_split))
-
-                        if len(list_value) == 1:
-                            await update_schedule(
-                                date,
-                                time_lesson,
-                                cabinet_number,
-                                name_of_group,
-                                name_teacher,
-                                name_of_discipline,
-                            )
-                        else:
-                            await update_schedule(
-                                date,
-                                time_lesson,
-                                cabinet_number,
-                                name_of_group,
-                                name_teacher,
-                                name_of_discipline,
-                                many=True,
-                            )
-                    else:
-                        await update_schedule(
-                            date, time_lesson, cabinet_number, None, None, None, empty=True
-                        )
-
-            os.remove(xlsx_path)
-            logger.info(f"Удален файл {xlsx_path}")
+            result, metrics = await extract(url, content)
+            record_worker_metrics(url, metrics, len(content), len(result))
+            return result
         except Exception as e:
-            logger.error(f"Ошибка парсинга файла {url}: {e}")
+            logger.error("Ошибка парсинга файла %s: %s", url, e)
             logger.error(traceback.format_exc())
-        finally:
-            if os.path.exists(path):
-                os.remove(path)
-                logger.info(f"Удален временный файл {path}")
-    except Exception as e:
-        logger.error(f"Ошибка обработки URL {url}: {e}")
-        logger.error(traceback.format_exc())
+            progress.advance(source, False)
+            return None
 
-async def parsing_teacher_url(url: str, department: str) -> None:
-    try:
-        path = await download(url)
+    async def store(url, result):
         try:
-            xlsx_path = await convert_xls_to_xlsx(path)
-            os.remove(path)
-            logger.info(f"Удален временный файл {path}")
-
-            workbook = load_workbook(xlsx_path)
-            worksheet = workbook.active
-
-            for row in range(2, worksheet.max_row + 1):
-                date = worksheet.cell(row=row, column=1).value
-                time_lesson = worksheet.cell(row=row, column=2).value  # Время теперь в колонке 2
-                teacher_name = worksheet.cell(row=row, column=3).value  # Преподаватель в колонке 3
-                combined_info = worksheet.cell(row=row, column=4).value  # Дисциплина и группа в колонке 4
-                cabinet_number = worksheet.cell(row=row, column=5).value  # Аудитория в колонке 5
-
-                if not all([date, time_lesson, teacher_name, combined_info, cabinet_number]):
-                    continue
-
-                # Приводим к строкам
-                teacher_name = str(teacher_name).strip()
-                if len(teacher_name) > 255:
-                    logger.warning(f"Обрезано имя преподавателя: {teacher_name[:255]}...")
-                    teacher_name = teacher_name[:255]
-
-                date = str(date).strip()[-8:]
-                try:
-                    date_obj = datetime.datetime.strptime(date, "%d.%m.%Y")
-                    date = date_obj.strftime("%Y-%m-%d")
-                except ValueError as e:
-                    logger.warning(f"Некорректный формат даты в строке {row}: {date}, пропуск")
-                    continue
-
-                time_lesson = str(time_lesson).strip()
-                if time_lesson not in time_from_pair:
-                    logger.warning(f"Неизвестное время пары в строке {row}: {time_lesson}, пропуск")
-                    continue
-                time_lesson = time_from_pair[time_lesson]
-
-                # Разбираем combined_info на группу и дисциплину
-                combined_info = str(combined_info).strip()
-                name_group = "Unknown"
-                name_discipline = combined_info
-                if "кафедра" in combined_info.lower():
-                    parts = combined_info.split("кафедра")
-                    name_discipline = parts[0].strip()
-                    if len(parts) > 1:
-                        # Извлекаем группу, если она есть (например, "ИГЭ-171-23-01 доцент")
-                        discipline_part = parts[0].strip()
-                        group_match = re.search(r'([А-Яа-я0-9-]+-\d+-\d+-\d+)', discipline_part)
-                        if group_match:
-                            name_group = group_match.group(0)
-                            name_discipline = discipline_part.replace(name_group, "").strip()
-                elif re.search(r'([А-Яа-я0-9-]+-\d+-\d+-\d+)', combined_info):
-                    group_match = re.search(r'([А-Яа-я0-9-]+-\d+-\d+-\d+)', combined_info)
-                    name_group = group_match.group(0)
-                    name_discipline = combined_info.replace(name_group, "").strip()
-
-                if len(name_group) > 255:
-                    logger.warning(f"Обрезано название группы: {name_group[:255]}...")
-                    name_group = name_group[:255]
-                if len(name_discipline) > 255:
-                    logger.warning(f"Обрезано название дисциплины: {name_discipline[:255]}...")
-                    name_discipline = name_discipline[:255]
-                cabinet_number = str(cabinet_number).strip()
-                if len(cabinet_number) > 50:
-                    logger.warning(f"Обрезано название аудитории: {cabinet_number[:50]}...")
-                    cabinet_number = cabinet_number[:50]
-                if len(department) > 255:
-                    logger.warning(f"Обрезано название кафедры: {department[:255]}...")
-                    department = department[:255]
-
-                logger.info(f"Запись в базу: date={date}, time_lesson={time_lesson}, cabinet_number={cabinet_number}, group={name_group}, teacher={teacher_name}, discipline={name_discipline}, department={department}")
-                await update_schedule(
-                    date,
-                    time_lesson,
-                    cabinet_number,
-                    [name_group],
-                    [teacher_name],
-                    [name_discipline],
-                    department=department
-                )
-
-            os.remove(xlsx_path)
-            logger.info(f"Удален файл {xlsx_path}")
+            if trace_writes:
+                with span("write", url) as record:
+                    record.update(await write(url, result))
+            else:
+                await write(url, result)
         except Exception as e:
-            logger.error(f"Ошибка парсинга файла преподавателя {url}: {e}")
+            logger.error("Ошибка записи расписания из %s: %s", url, e)
             logger.error(traceback.format_exc())
-        finally:
-            if os.path.exists(path):
-                os.remove(path)
-                logger.info(f"Удален временный файл {path}")
-    except Exception as e:
-        logger.error(f"Ошибка обработки URL преподавателя {url}: {e}")
-        logger.error(traceback.format_exc())
-
-async def download_vk_file(url, filename):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                raise Exception(f"Ошибка при скачивании {url}: статус {resp.status}")
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_file:
-                content = await resp.read()
-                temp_file.write(content)
-                temp_path = temp_file.name
-
-    logger.info(f"Скачан файл {filename} в {temp_path}")
-    return temp_path
-
-async def parse_vk_schedule_async():
-    logger.info("Начало парсинга расписания колледжа из VK (через Playwright)")
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        await page.goto("https://vk.com/docs-85060840", wait_until="domcontentloaded")
-
-        # Ищем ссылки на Excel-документы
-        links = await page.query_selector_all("a[href$='.xlsx'], a[href$='.xls']")
-
-        if not links:
-            logger.info("Не найдено подходящих файлов для парсинга.")
-            await browser.close()
+            progress.advance(source, False)
             return
+        progress.advance(source)
+
+    await run_pipeline(downloader, urls, parse, store, fetch=fetch)
+
+def vk_slot_updates(schedules):
+    for entry in schedules:
+        yield SlotUpdate(
+            entry["date"],
+            entry["time_lesson"],
+            entry["cabinet_number"],
+            [entry["name_group"]],
+            [entry["name_teacher"]],
+            [entry["name_discipline"]],
+        )
+
+async def parse_department(
+    downloader: Downloader,
+    department: str,
+    urls: list,
+    run: Optional[ScheduleRun] = None,
+    progress: Optional[JobProgress] = None,
+) -> None:
+    """Файлы преподавателей одной кафедры: загрузка и разбор параллельно,
+    запись всех строк кафедры одной партией."""
+    progress = progress or JobProgress()
+    department_rows = []
+    parsed_urls = []
+
+    async def extract(url, content):
+        return await run_cpu(with_metrics, extract_teacher_rows, content, department)
+
+    async def collect(url, rows):
+        department_rows.extend(rows)
+        parsed_urls.append(url)
+
+    await ingest_files(downloader, urls, "teachers", extract, collect, progress, trace_writes=False)
+    if not parsed_urls:
+        return
+    # Строки разных групп и преподавателей кафедры в одном слоте - одна запись many
+    department_rows = merge_slot_rows(department_rows)
 
-        for link in links:
-            href = await link.get_attribute("href")
-            if not href:
-                continue
-
-            file_name = href.split("/")[-1]
-            file_url = f"https://vk.com{href}" if href.startswith("/") else href
-
-            logger.info(f"Найден файл: {file_name} ({file_url})")
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_url) as response:
-                    if response.status != 200:
-                        logger.warning(f"Ошибка загрузки {file_url}")
-                        continue
-
-                    content = await response.read()
-                    temp_path = f"/tmp/{file_name}"
-                    async with aiofiles.open(temp_path, "wb") as f:
-                        await f.write(content)
-
-            try:
-                schedules = await parse_schedule_structured(temp_path, file_name)
-                for entry in schedules:
-                    await update_schedule(
-                        entry["date"],
-                        entry["time_lesson"],
-                        entry["cabinet_number"],
-                        [entry["name_group"]],
-                        [entry["name_teacher"]],
-                        [entry["name_discipline"]],
-                    )
-                logger.info(f"РАСПИСАНИЕ из {file_name} сохранено в базу данных!")
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-
-        await browser.close()
-        logger.info("Парсинг расписания колледжа из VK завершен")
-
-
-
-async def parse_schedule_structured(file_path, file_name):
     try:
-        date_match = re.search(r'(\d{2}\.\d{2})-(\d{2}\.\d{2})', file_name)
-        if date_match:
-            start_date_str, end_date_str = date_match.groups()
-            start_date = datetime.datetime.strptime(f"{start_date_str}.2025", "%d.%m.%Y").date()
-            end_date = datetime.datetime.strptime(f"{end_date_str}.2025", "%d.%m.%Y").date()
-        else:
-            raise ValueError(f"Не удалось извлечь диапазон дат из {file_name}")
-
-        current_date = datetime.datetime.now().date()
-        if start_date < current_date:
-            start_date = current_date
-
-        with pd.ExcelFile(file_path) as xl:
-            schedules = []
-
-            for sheet_name in xl.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
-
-                header_row = None
-                for idx, row in df.iterrows():
-                    if any(isinstance(val, str) and 'День недели' in val for val in row):
-                        header_row = idx
-                        break
-
-                if header_row is None:
-                    logger.info(f"Пропуск листа {sheet_name}: не найдена строка 'День недели'")
-                    continue
-
-                day_cols = []
-                time_cols = []
-                for col in df.columns:
-                    val = df.iloc[header_row, col]
-                    if isinstance(val, str) and 'День недели' in val:
-                        day_cols.append(col)
-                        time_cols.append(col + 1)
-
-                if not day_cols:
-                    logger.info(f"Пропуск листа {sheet_name}: не найдены столбцы дней")
-                    continue
-
-                for block_idx, day_col in enumerate(day_cols):
-                    time_col = time_cols[block_idx]
-                    group_start_col = day_col + 2
-                    group_cols = [(group_start_col + i * 4) for i in range(3)]
-                    group_cols = [col for col in group_cols if col < df.shape[1]]
-                    if not group_cols:
-                        continue
-
-                    group_names = []
-                    for col in group_cols:
-                        group_val = df.iloc[header_row - 1, col]
-                        if isinstance(group_val, str) and 'Группа' in group_val:
-                            group_name = group_val.replace("Группа", "").strip()
-                        else:
-                            group_name = "Unknown"
-                        group_names.append(group_name)
-
-                    current_date = None
-                    for idx in range(header_row + 1, df.shape[0]):
-                        day_val = str(df.iloc[idx, day_col]).strip()
-                        if day_val and 'nan' not in day_val.lower():
-                            try:
-                                date_match = re.search(r'(\d{1,2}\.\d{2})', day_val)
-                                if date_match:
-                                    date_str = date_match.group(1)
-                                    current_date = datetime.datetime.strptime(f"{date_str}.2025", "%d.%m.%Y").date()
-                            except ValueError:
-                                current_date = None
-
-                        if current_date and (current_date < start_date or current_date > end_date or current_date < current_date):
-                            continue
-
-                        time_val = str(df.iloc[idx, time_col]).strip()
-                        if 'nan' in time_val.lower() or not time_val:
-                            continue
-
-                        if re.match(r'^\d{1,2}\.\d{2}-\d{1,2}\.\d{2}$', time_val):
-                            pass
-                        elif time_val in time_from_pair:
-                            time_val = time_from_pair[time_val]
-                        else:
-                            logger.warning(f"Некорректный формат времени: {time_val}, пропуск")
-                            continue
-
-                        for group_idx, group_col in enumerate(group_cols):
-                            cell_value = "\n".join([
-                                str(df.iloc[idx, group_col]).strip(),
-                                str(df.iloc[idx, group_col + 2]).strip(),
-                                str(df.iloc[idx, group_col + 3]).strip()
-                            ])
-                            parsed_items = improved_parse_cell(cell_value)
-
-                            for item in parsed_items:
-                                if not all([item["discipline"], item["teacher"], item["cabinet"]]):
-                                    continue
-                                if not re.match(r'^\d+-\d+$', item["cabinet"]):
-                                    logger.warning(f"Некорректный номер аудитории: {item['cabinet']}, пропуск")
-                                    continue
-                                schedules.append({
-                                    "name_group": group_names[group_idx],
-                                    "date": current_date.strftime("%Y-%m-%d"),
-                                    "time_lesson": time_val,
-                                    "name_discipline": item["discipline"],
-                                    "name_teacher": item["teacher"],
-                                    "cabinet_number": item["cabinet"]
-                                })
-                                
-
-        return schedules
-
+        with span("write", department) as record:
+            record.update(await write_rows(department_rows, department, run))
     except Exception as e:
-        logger.error(f"Ошибка обработки файла {file_path}: {e}")
-        return []
-
-async def start_parsing():
+        logger.error("Ошибка записи расписания кафедры %s: %s", department, e)
+        logger.error(traceback.format_exc())
+        return
+    for url in parsed_urls:
+        commit_fetch(downloader.cache, url, run)
+    logger.info("Кафедра %s: файлов %d, строк %d", department, len(parsed_urls), len(department_rows))
+
+async def parse_teacher_schedule_async(
+    downloader: Downloader,
+    run: Optional[ScheduleRun] = None,
+    progress: Optional[JobProgress] = None,
+):
+    logger.info("Начало парсинга расписания преподавателей")
+    progress = progress or JobProgress()
+
+    departments = {}
+    try:
+        with span("discover", "teachers") as record:
+            text = await get_content(downloader, url_teacher_site)
+            for url, teacher_name, department in await get_teacher_urls(text):
+                departments.setdefault(department, [])
+                if url not in departments[department]:
+                    departments[department].append(url)
+            record["files"] = sum(len(urls) for urls in departments.values())
+    except Exception as e:
+        # Без списка преподавателей остальные источники запуска всё равно публикуются
+        logger.error("Не удалось получить список преподавателей: %s", e)
+        progress.finish("teachers", error=str(e))
+        return
+    progress.start("teachers", sum(len(urls) for urls in departments.values()))
+
+    semaphore = asyncio.Semaphore(TEACHER_DEPARTMENT_CONCURRENCY)
+
+    async def parse_with_limit(department, urls):
+        async with semaphore:
+            await parse_department(downloader, department, urls, run, progress)
+
+    await asyncio.gather(*(parse_with_limit(department, urls) for department, urls in departments.items()))
+    progress.finish("teachers", departments=len(departments))
+    logger.info("Парсинг расписания преподавателей завершен")
+
+async def parse_vk_schedule_async(
+    downloader: Downloader,
+    run: Optional[ScheduleRun] = None,
+    progress: Optional[JobProgress] = None,
+):
+    logger.info("Начало парсинга расписания колледжа из VK")
+    progress = progress or JobProgress()
+
+    with span("discover", "vk") as record:
+        documents = await discover_vk_documents(downloader)
+        record["files"] = len(documents)
+    progress.start("vk", len(documents))
+    if not documents:
+        logger.info("Не найдено подходящих файлов для парсинга.")
+        progress.finish("vk")
+        return
+
+    file_names = {}
+    for file_name, file_url in documents:
+        logger.info("Найден файл: %s (%s)", file_name, file_url)
+        file_names[file_url] = file_name
+
+    async def extract(file_url, content):
+        return await run_cpu(with_metrics, extract_vk_records, content, file_names[file_url])
+
+    async def store(file_url, schedules):
+        stats = await write_rows(vk_slot_updates(schedules), file_names[file_url], run)
+        commit_fetch(downloader.cache, file_url, run)
+        logger.info("РАСПИСАНИЕ из %s сохранено в базу данных!", file_names[file_url])
+        return stats
+
+    await ingest_files(downloader, list(file_names), "vk", extract, store, progress)
+    progress.finish("vk")
+    logger.info("Парсинг расписания колледжа из VK завершен")
+
+async def start_parsing(progress: Optional[JobProgress] = None):
+    progress = progress or JobProgress()
+    trace = get_trace()
     await delete_outdated_schedules()
+    cache = await FetchCache.load()
+    run = ScheduleRun() if PUBLISH_MODE == "run" else None
+
+    async def extract_room(url, content):
+        return await run_cpu(with_metrics, extract_room_rows, content)
+
+    async def store_room(url, rows):
+        stats = await write_rows(rows, url, run)
+        commit_fetch(cache, url, run)
+        return stats
+
     try:
-        ##logger.info("Начало парсинга расписания преподавателей")
-        ##response = await get_content(url_teacher_site)
-        ##teacher_urls = await get_teacher_urls(response)
-        ##for url, teacher_name, department in teacher_urls:  # Обновлено
-        ##    await parsing_teacher_url(url, teacher_name, department)
-        ##logger.info("Парсинг расписания преподавателей завершен")
-
-        logger.info("Начало парсинга расписания университета (аудитории)")
-        response = await get_content(url_site)
-        urls = await get_urls(response)
-        for url in urls:
-            await parsing_url(url)
-        logger.info("Парсинг расписания университета (аудитории) завершен")
-
-        logger.info("Начало парсинга расписания колледжа из VK")
-        await parse_vk_schedule_async()
-        await ensure_playwright_browsers_installed()
-        logger.info("Парсинг расписания колледжа из VK завершен")
+        async with Downloader(cache=cache) as downloader:
+            logger.info("Начало парсинга расписания университета (аудитории)")
+            with span("discover", "rooms") as record:
+                text = await get_content(downloader, url_site)
+                urls = await get_urls(text)
+                record["files"] = len(urls)
+            progress.start("rooms", len(urls))
+            # Загрузка, разбор в пуле процессов и запись идут одновременно,
+            # очереди между стадиями ограничивают число файлов в памяти
+            await ingest_files(downloader, urls, "rooms", extract_room, store_room, progress)
+            progress.finish("rooms")
+            logger.info("Парсинг расписания университета (аудитории) завершен")
+
+            await parse_vk_schedule_async(downloader, run, progress)
+
+            # Преподаватели последними: их записи с кафедрой заменяют
+            # записи тех же слотов из файлов аудиторий
+            if TEACHERS_ENABLED:
+                await parse_teacher_schedule_async(downloader, run, progress)
+
+        if run is not None:
+            progress.start("publish", run.batches)
+            with span("publish") as record:
+                stats = await run.publish()
+                record.update(stats, rows=stats["inserted"])
+            progress.finish("publish", **stats)
+            for url in run.urls:
+                cache.commit(url)
     except Exception as e:
-        logger.error(f"Ошибка парсинга: {e}")
-        logger.error(traceback.format_exc())
\ No newline at end of file
+        logger.error("Ошибка парсинга: %s", e)
+        logger.error(traceback.format_exc())
+        progress.fail(str(e))
+        if run is not None:
+            # Неопубликованный буфер удаляется, schedules остаётся прежним
+            await run.discard()
+    finally:
+        await cache.save()
+        await progress.flush()
+        trace.finish()
+        for stage, total in trace.summary().items():
+            logger.info(
+                f"Стадия {stage}: спанов={total['count']}, время={total['seconds']} с, "
+                f"байт={total['bytes']}, строк={total['rows']}, ошибок={total['errors']}"
+            )
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Iterable, Optional
+
+from downloader import Downloader
+from executor import PARSER_WORKERS
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Сколько скачанных файлов и сколько разобранных результатов может ждать
+# следующей стадии. Вместе с числом загрузчиков и разборщиков это верхняя
+# граница числа файлов в памяти, независимо от того, сколько их в запуске
+QUEUE_SIZE = int(os.getenv("PARSER_QUEUE_SIZE", "2"))
+PARSE_CONCURRENCY = int(os.getenv("PARSER_PARSE_CONCURRENCY", str(max(PARSER_WORKERS, 1))))
+
+_DONE = object()
+
+Fetch = Callable[[str], Awaitable[Optional[bytes]]]
+Parse = Callable[[str, bytes], Awaitable[Optional[object]]]
+Write = Callable[[str, object], Awaitable[None]]
+
+
+async def run_pipeline(
+    downloader: Downloader,
+    urls: Iterable[str],
+    parse: Parse,
+    write: Write,
+    queue_size: int = QUEUE_SIZE,
+    parse_concurrency: int = PARSE_CONCURRENCY,
+    fetch: Optional[Fetch] = None,
+) -> None:
+    """Загрузка -> разбор -> запись, соединённые ограниченными очередями.
+
+    Загрузчики берут следующую ссылку только после того, как предыдущий
+    файл принят очередью разбора, а разборщики ждут, пока запись заберёт
+    результат. Медленная стадия тормозит предыдущие, и в памяти одновременно
+    находится не больше (загрузчики + разборщики + 2 * queue_size) файлов.
+    parse возвращает None, если файл нужно пропустить; write выполняется
+    последовательно в одной задаче. fetch заменяет downloader.fetch,
+    например, чтобы замерить загрузку.
+    """
+    fetch = fetch or downloader.fetch
+    downloaded = asyncio.Queue(maxsize=queue_size)
+    parsed = asyncio.Queue(maxsize=queue_size)
+    pending = iter(urls)
+
+    async def fetch_stage():
+        for url in pending:
+            try:
+                content = await fetch(url)
+            except Exception as e:
+                # Ошибка одной ссылки не останавливает остальные
+                logger.error("Ошибка загрузки %s: %s", url, e)
+                continue
+            if content is not None:
+                await downloaded.put((url, content))
+
+    async def parse_stage():
+        while (item := await downloaded.get()) is not _DONE:
+            url, content = item
+            del item
+            result = await parse(url, content)
+            del content
+            if result is not None:
+                await parsed.put((url, result))
+
+    async def write_stage():
+        while (item := await parsed.get()) is not _DONE:
+            await write(*item)
+
+    async def close(stage_tasks, queue, consumers):
+        try:
+            await asyncio.gather(*stage_tasks)
+        finally:
+            for _ in range(consumers):
+                await queue.put(_DONE)
+
+    fetchers = [asyncio.create_task(fetch_stage()) for _ in range(downloader.concurrency)]
+    parsers = [asyncio.create_task(parse_stage()) for _ in range(parse_concurrency)]
+    writer = asyncio.create_task(write_stage())
+    tasks = [*fetchers, *parsers, writer]
+    try:
+        await asyncio.gather(
+            close(fetchers, downloaded, len(parsers)),
+            close(parsers, parsed, 1),
+            writer,
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,261 @@
+"""Кэш ответов API на чтение расписания.
+
+Расписание меняется только при публикации запуска парсера, поэтому
+ответы crud.query_schedule и поиска свободных кабинетов хранятся в LRU
+процесса с ограничением по числу записей, объёму и времени жизни.
+
+Кэш сбрасывается при смене поколения данных:
+
+- invalidate() вызывается после каждого commit, меняющего schedules
+  (dbrequests, crud.delete_old_schedules) - для воркера внутри
+  веб-процесса это мгновенно;
+- watch_versions() раз в SCHEDULE_CACHE_POLL секунд читает поколение
+  данных (schedule_generation) и сбрасывает кэш, если его сдвинул воркер
+  в другом процессе. Поколение увеличивается в транзакции каждого
+  изменения, включая удаление устаревших дат.
+
+Об обоих событиях узнают и подписчики из listeners.
+"""
+import asyncio
+import collections
+import functools
+import inspect
+import logging
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Hashable, List, NamedTuple
+
+from pydantic import BaseModel
+
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Число ответов в кэше; 0 отключает кэш
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "4096"))
+# Оценка памяти под ответы, МБ
+SCHEDULE_CACHE_MAX_MB = float(os.getenv("SCHEDULE_CACHE_MAX_MB", "64"))
+# Время жизни ответа, секунд
+SCHEDULE_CACHE_TTL = float(os.getenv("SCHEDULE_CACHE_TTL", "3600"))
+# Как часто проверять поколение данных, секунд
+SCHEDULE_CACHE_POLL = float(os.getenv("SCHEDULE_CACHE_POLL", "30"))
+
+
+def estimate_size(value) -> int:
+    """Приблизительный объём ответа в байтах: контейнеры, модели и их поля."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return size + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return size + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, BaseModel):
+        return size + estimate_size(value.__dict__)
+    return size
+
+
+def normalize(value):
+    """Параметр запроса в ключе кэша: строки без пробелов по краям, списки - кортежами."""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    return value
+
+
+class Entry(NamedTuple):
+    value: object
+    size: int
+    expires_at: float
+
+
+class ResponseCache:
+    """LRU ответов с TTL и поколением данных.
+
+    Одновременные промахи по одному ключу ждут один запрос к базе. Ответ,
+    загруженный во время смены поколения, в кэш не кладётся.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: "collections.OrderedDict[Hashable, Entry]" = collections.OrderedDict()
+        self.pending = {}
+        self.bytes = 0
+        self.generation = 0
+        # Поколение данных, на котором основано содержимое кэша
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _pop(self, key) -> None:
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+
+    def get(self, key):
+        """Ответ из кэша или None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._pop(key)
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key, value) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._pop(key)
+        self.entries[key] = Entry(value, size, time.monotonic() + self.ttl)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._pop(next(iter(self.entries)))
+            self.evictions += 1
+
+    async def get_or_load(self, key, load: Callable[[], Awaitable]):
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        pending = self.pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # Отменили запрос, который загружал ответ, а не этот
+                return await load()
+
+        self.misses += 1
+        generation = self.generation
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ошибку получат ожидающие; без них исключение не должно попасть в лог цикла событий
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if generation == self.generation:
+                self.put(key, value)
+            return value
+        finally:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    def invalidate(self, version=None) -> None:
+        """Сбрасывает кэш: данные расписания изменились."""
+        self.generation += 1
+        self.invalidations += 1
+        # Без номера (сброс не по записи в базу) следующий прочитанный
+        # watch_versions() номер принимается без повторного сброса
+        self.version = version
+        self.entries.clear()
+        # Ответы, которые загружаются сейчас, в кэш уже не попадут
+        self.pending.clear()
+        self.bytes = 0
+
+    def observe_version(self, version: int) -> bool:
+        """Запоминает поколение данных; True, если оно сдвинулось с прошлого раза."""
+        if self.version is None:
+            self.version = version
+            return False
+        return version != self.version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+            "version": self.version,
+        }
+
+
+cache = ResponseCache(SCHEDULE_CACHE_SIZE, int(SCHEDULE_CACHE_MAX_MB * 2**20), SCHEDULE_CACHE_TTL)
+
+# Кто ещё держит копию расписания и должен узнать о смене данных
+# (schedule_index перезагружает снимок)
+listeners: List[Callable[[], None]] = []
+
+
+def invalidate(version=None) -> None:
+    cache.invalidate(version)
+    for listener in listeners:
+        listener()
+
+
+def get_stats() -> dict:
+    return cache.stats()
+
+
+def cached(func):
+    """Кэширует ответ crud-функции вида func(session, *params).
+
+    Ключ - имя функции и нормализованные параметры; функция вызывается уже
+    с нормализованными параметрами, поэтому ответ из кэша и из базы один.
+    Списки отдаются копией, чтобы вызывающий код не менял закэшированный.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(session, *args, **kwargs):
+        bound = signature.bind(session, *args, **kwargs)
+        bound.apply_defaults()
+        params = {name: normalize(value) for name, value in bound.arguments.items() if name != "session"}
+        if not cache.enabled:
+            return await func(session, **params)
+        key = (func.__name__, *params.values())
+        value = await cache.get_or_load(key, lambda: func(session, **params))
+        return list(value) if isinstance(value, list) else value
+
+    return wrapper
+
+
+async def watch_versions(get_version: Callable[[], Awaitable[int]], interval: float = SCHEDULE_CACHE_POLL) -> None:
+    """Следит за поколением данных, пока задачу не отменят."""
+    while True:
+        try:
+            version = await get_version()
+            if cache.observe_version(version):
+                logger.info("Поколение данных сдвинулось (%s -> %s), кэш ответов сброшен", cache.version, version)
+                invalidate(version)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Не удалось прочитать поколение данных: %s", e)
+        await asyncio.sleep(interval)
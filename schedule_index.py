@@ -0,0 +1,335 @@
+"""Снимок расписания в памяти для чтения без базы.
+
+При SCHEDULE_READ_ENGINE=memory API отвечает на запросы crud.query_schedule,
+поиск свободных кабинетов и список кафедр из снимка таблицы schedules:
+столбцы NumPy с кодами справочников (дата как ordinal, пара, кабинет,
+группа, преподаватель, дисциплина, кафедра) и индексы по смещениям для
+каждого ключа. Запрос - это срез индекса ключа и двоичный поиск по дате,
+соединение с базой не нужно, поэтому при недоступной базе API продолжает
+отвечать по последнему снимку.
+
+Снимок перезагружается целиком после каждой смены данных (подписка на
+response_cache.invalidate) и подменяется одной операцией: запрос видит
+либо прежний снимок, либо новый.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+import response_cache
+from dbrequests import read_schedule_version
+from logging_config import setup_logging
+from models import (
+    LESSON_SLOT_LAST, Schedule, ScheduleCabinet, ScheduleDepartment, ScheduleDiscipline, ScheduleGroup,
+    ScheduleLesson, ScheduleTeacher, async_session,
+)
+from schemas import ScheduleOut
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# db - запросы в базу (по умолчанию), memory - из снимка в памяти
+SCHEDULE_READ_ENGINE = os.getenv("SCHEDULE_READ_ENGINE", "db")
+ENABLED = SCHEDULE_READ_ENGINE == "memory"
+
+# Столбец снимка и справочник его кодов. Код - id строки справочника,
+# 0 - нет значения (кафедра не указана)
+DIMENSIONS = {
+    "cabinet": (ScheduleCabinet, Schedule.cabinet_id),
+    "group": (ScheduleGroup, Schedule.group_id),
+    "teacher": (ScheduleTeacher, Schedule.teacher_id),
+    "discipline": (ScheduleDiscipline, Schedule.discipline_id),
+    "department": (ScheduleDepartment, Schedule.department_id),
+}
+# Столбцы, по которым строятся индексы смещений
+KEYS = ("group", "teacher", "department", "cabinet")
+# Поля ответа и столбцы снимка, из которых они собираются
+FIELD_COLUMNS = {
+    "time_lesson": "lesson",
+    "cabinet_number": "cabinet",
+    "name_group": "group",
+    "name_teacher": "teacher",
+    "name_discipline": "discipline",
+    "department": "department",
+}
+
+
+class KeyIndex:
+    """Строки снимка, сгруппированные по коду ключа.
+
+    rows[offsets[code]:offsets[code + 1]] - номера строк с этим кодом в
+    порядке снимка (дата, пара, id), dates - их даты для двоичного поиска.
+    """
+
+    def __init__(self, codes: np.ndarray, dates: np.ndarray, size: int):
+        self.rows = np.argsort(codes, kind="stable").astype(np.int32)
+        self.dates = dates[self.rows]
+        self.offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=size), out=self.offsets[1:])
+
+    def count(self, code: int) -> int:
+        return int(self.offsets[code + 1] - self.offsets[code])
+
+    def find(self, code: int, start: int, end: int) -> np.ndarray:
+        lo, hi = self.offsets[code], self.offsets[code + 1]
+        dates = self.dates[lo:hi]
+        return self.rows[lo + np.searchsorted(dates, start, "left"):lo + np.searchsorted(dates, end, "right")]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.dates.nbytes + self.offsets.nbytes
+
+
+class ScheduleSnapshot:
+    """Неизменяемый снимок schedules в порядке (дата, пара, id), как models.lesson_slot."""
+
+    def __init__(self, rows: list, names: Dict[str, Dict[int, str]], lessons: list, version: int):
+        self.version = version
+        self.loaded_at = datetime.datetime.now()
+
+        # Названия по кодам и коды по названиям
+        self.names = {}
+        self.codes = {}
+        for key, values in names.items():
+            table = np.empty(max(values, default=0) + 1, dtype=object)
+            for code, name in values.items():
+                table[code] = name
+            self.names[key] = table
+            self.codes[key] = {name: code for code, name in values.items()}
+        lesson_count = max((lesson_id for lesson_id, _, _ in lessons), default=0) + 1
+        self.lesson_names = np.empty(lesson_count, dtype=object)
+        lesson_slots = np.full(lesson_count, LESSON_SLOT_LAST, dtype=np.int16)
+        for lesson_id, time_lesson, starts_at in lessons:
+            self.lesson_names[lesson_id] = time_lesson
+            if starts_at is not None:
+                lesson_slots[lesson_id] = starts_at
+        self.codes["lesson"] = {time_lesson: lesson_id for lesson_id, time_lesson, _ in lessons}
+
+        ids, dates, lesson_ids, cabinets, groups, teachers, disciplines, departments = zip(*rows) if rows else [()] * 8
+        columns = {
+            "id": np.array(ids, dtype=np.int64),
+            "date": np.array([day.toordinal() for day in dates], dtype=np.int32),
+            "lesson": np.array(lesson_ids, dtype=np.int16),
+            "slot": lesson_slots[np.array(lesson_ids, dtype=np.int16)],
+            "cabinet": np.array(cabinets, dtype=np.int32),
+            "group": np.array(groups, dtype=np.int32),
+            "teacher": np.array(teachers, dtype=np.int32),
+            "discipline": np.array(disciplines, dtype=np.int32),
+            "department": np.array([code or 0 for code in departments], dtype=np.int32),
+        }
+        order = np.lexsort((columns["id"], columns["slot"], columns["date"]))
+        self.columns = {name: column[order] for name, column in columns.items()}
+        self.size = len(order)
+        self.indexes = {
+            key: KeyIndex(self.columns[key], self.columns["date"], len(self.names[key])) for key in KEYS
+        }
+
+        # Кабинеты и кафедры, у которых есть хотя бы одна запись
+        self.cabinets = sorted(self.names["cabinet"][np.unique(self.columns["cabinet"])].tolist())
+        departments = np.unique(self.columns["department"])
+        self.departments = sorted(self.names["department"][departments[departments > 0]].tolist())
+
+    def find(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        *,
+        lesson: Optional[str] = None,
+        **keys: Optional[str],
+    ) -> np.ndarray:
+        """Номера строк за период с заданными названиями ключей (group,
+        teacher, department, cabinet) и временем пары, в порядке снимка."""
+        filters = []
+        for key, name in keys.items():
+            if name is None:
+                continue
+            code = self.codes[key].get(name)
+            if code is None:
+                return np.empty(0, dtype=np.int32)
+            filters.append((key, code))
+        if lesson is not None:
+            code = self.codes["lesson"].get(lesson)
+            if code is None:
+                return np.empty(0, dtype=np.int32)
+            filters.append(("lesson", code))
+
+        start, end = start.toordinal(), end.toordinal()
+        indexed = [(key, code) for key, code in filters if key in self.indexes]
+        if indexed:
+            # Начинаем с самого короткого списка строк, остальные условия - маской
+            key, code = min(indexed, key=lambda item: self.indexes[item[0]].count(item[1]))
+            rows = self.indexes[key].find(code, start, end)
+            filters.remove((key, code))
+        else:
+            dates = self.columns["date"]
+            rows = np.arange(np.searchsorted(dates, start, "left"), np.searchsorted(dates, end, "right"))
+        for key, code in filters:
+            rows = rows[self.columns[key][rows] == code]
+        return rows
+
+    def after(self, rows: np.ndarray, cursor: Optional[Tuple[datetime.date, int, int]]) -> np.ndarray:
+        """Строки после ключа курсора (date, пара, id); rows уже в порядке снимка."""
+        if cursor is None:
+            return rows
+        day, slot, id_ = cursor
+        columns = self.columns
+        dates, slots, ids = columns["date"][rows], columns["slot"][rows], columns["id"][rows]
+        day = day.toordinal()
+        later = (dates > day) | ((dates == day) & ((slots > slot) | ((slots == slot) & (ids > id_))))
+        return rows[later]
+
+    def key(self, row: int) -> Tuple[datetime.date, int, int]:
+        columns = self.columns
+        return datetime.date.fromordinal(int(columns["date"][row])), int(columns["slot"][row]), int(columns["id"][row])
+
+    def to_dicts(self, rows: np.ndarray, fields: Sequence[str]) -> List[dict]:
+        """Записи только из полей fields: названия берутся лишь для них."""
+        values = []
+        for field in fields:
+            if field == "id":
+                values.append(self.columns["id"][rows].tolist())
+            elif field == "date":
+                values.append([datetime.date.fromordinal(day) for day in self.columns["date"][rows].tolist()])
+            else:
+                column = FIELD_COLUMNS[field]
+                names = self.lesson_names if column == "lesson" else self.names[column]
+                values.append(names[self.columns[column][rows]].tolist())
+        return [dict(zip(fields, record)) for record in zip(*values)] if fields else [{} for _ in rows]
+
+    def to_out(self, rows: np.ndarray) -> List[ScheduleOut]:
+        columns = self.columns
+        records = zip(
+            columns["id"][rows].tolist(),
+            columns["date"][rows].tolist(),
+            self.lesson_names[columns["lesson"][rows]].tolist(),
+            self.names["cabinet"][columns["cabinet"][rows]].tolist(),
+            self.names["group"][columns["group"][rows]].tolist(),
+            self.names["teacher"][columns["teacher"][rows]].tolist(),
+            self.names["discipline"][columns["discipline"][rows]].tolist(),
+            self.names["department"][columns["department"][rows]].tolist(),
+        )
+        # Значения уже проверены базой: model_construct без повторной валидации
+        return [
+            ScheduleOut.model_construct(
+                id=id_,
+                date=datetime.date.fromordinal(day),
+                time_lesson=time_lesson,
+                cabinet_number=cabinet_number,
+                name_group=name_group,
+                name_teacher=name_teacher,
+                name_discipline=name_discipline,
+                department=department,
+            )
+            for id_, day, time_lesson, cabinet_number, name_group, name_teacher, name_discipline, department in records
+        ]
+
+    def free_cabinets(self, date: datetime.date, time_lesson: str) -> List[str]:
+        rows = self.find(date, date, lesson=time_lesson)
+        unknown = self.codes["group"].get("Unknown")
+        groups = self.columns["group"][rows]
+        occupied = set(self.names["cabinet"][self.columns["cabinet"][rows[groups != unknown]]].tolist())
+        return [cabinet for cabinet in self.cabinets if cabinet not in occupied]
+
+    def stats(self) -> dict:
+        index_bytes = sum(index.nbytes for index in self.indexes.values())
+        return {
+            "rows": self.size,
+            "version": self.version,
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds"),
+            "column_bytes": sum(column.nbytes for column in self.columns.values()),
+            "index_bytes": index_bytes,
+            "dictionary_sizes": {key: len(codes) for key, codes in self.codes.items()},
+            "first_date": str(datetime.date.fromordinal(int(self.columns["date"][0]))) if self.size else None,
+            "last_date": str(datetime.date.fromordinal(int(self.columns["date"][-1]))) if self.size else None,
+        }
+
+
+_snapshot: Optional[ScheduleSnapshot] = None
+_reload = asyncio.Event()
+last_load: dict = {}
+
+
+def current() -> Optional[ScheduleSnapshot]:
+    """Снимок для ответа на запрос или None, если читать нужно из базы."""
+    return _snapshot if ENABLED else None
+
+
+async def load_snapshot() -> ScheduleSnapshot:
+    async with async_session() as session:
+        # Справочники, строки и поколение данных читаются из одного снимка базы
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = await read_schedule_version(session)
+        names = {}
+        for key, (model, _) in DIMENSIONS.items():
+            names[key] = dict((await session.execute(select(model.id, model.name))).all())
+        lessons = (
+            await session.execute(select(ScheduleLesson.id, ScheduleLesson.time_lesson, ScheduleLesson.starts_at))
+        ).all()
+        rows = (
+            await session.execute(
+                select(Schedule.id, Schedule.date, Schedule.lesson_id, *(column for _, column in DIMENSIONS.values()))
+            )
+        ).all()
+    # Сборка массивов занимает процессор, но не ввод-вывод: запускается в потоке,
+    # чтобы не держать цикл событий API
+    return await asyncio.to_thread(ScheduleSnapshot, rows, names, lessons, version)
+
+
+async def reload() -> ScheduleSnapshot:
+    global _snapshot
+    start = time.perf_counter()
+    snapshot = await load_snapshot()
+    _snapshot = snapshot
+    # Ответы, собранные из прежнего снимка во время загрузки, в кэше не нужны
+    response_cache.cache.invalidate(snapshot.version)
+    last_load.update(seconds=round(time.perf_counter() - start, 3), error=None)
+    logger.info(
+        "Снимок расписания загружен: строк=%d, поколение=%s, %s с",
+        snapshot.size, snapshot.version, last_load["seconds"],
+    )
+    return snapshot
+
+
+def request_reload() -> None:
+    if ENABLED:
+        _reload.set()
+
+
+async def run_reloader() -> None:
+    """Загружает снимок при старте и после каждой смены данных, пока задачу
+    не отменят. При ошибке загрузки остаётся прежний снимок."""
+    if not ENABLED:
+        return
+    _reload.set()
+    while True:
+        await _reload.wait()
+        _reload.clear()
+        try:
+            await reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            last_load.update(error=str(e))
+            logger.error("Не удалось загрузить снимок расписания, используется прежний: %s", e)
+            # Повтор, даже если данные больше не изменятся
+            await asyncio.sleep(response_cache.SCHEDULE_CACHE_POLL)
+            _reload.set()
+
+
+def get_stats() -> dict:
+    return {
+        "engine": SCHEDULE_READ_ENGINE,
+        "active": current() is not None,
+        "last_load": last_load,
+        "snapshot": _snapshot.stats() if _snapshot is not None else None,
+    }
+
+
+response_cache.listeners.append(request_reload)
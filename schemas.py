@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict
-from datetime import date
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
 
 class ScheduleOut(BaseModel):
     id: int
@@ -14,6 +14,72 @@ class ScheduleOut(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class SchedulePageOut(BaseModel):
+    # Записи только из запрошенных полей ScheduleOut
+    items: List[dict]
+    # Курсор следующей страницы; None - страница последняя
+    next_cursor: Optional[str]
+
+class ScheduleLookup(BaseModel):
+    # Имя запроса в ответе; по умолчанию - его номер в списке
+    id: Optional[str] = None
+    kind: Literal["group", "teacher", "cabinet", "department"]
+    key: str
+    # Период; одна дата передаётся полем date
+    start_date: date
+    end_date: date
+
+    @model_validator(mode="before")
+    @classmethod
+    def expand_date(cls, data):
+        if isinstance(data, dict) and "date" in data:
+            if data.get("start_date") is not None or data.get("end_date") is not None:
+                raise ValueError("Нужна либо date, либо start_date и end_date")
+            data = {**data, "start_date": data["date"], "end_date": data["date"]}
+            del data["date"]
+        return data
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.start_date > self.end_date:
+            raise ValueError("start_date позже end_date")
+        return self
+
+class ScheduleBatchIn(BaseModel):
+    lookups: List[ScheduleLookup] = Field(min_length=1, max_length=50)
+
+    def result_keys(self) -> List[str]:
+        """Ключи results: id запроса или, если id не задан, его номер в списке."""
+        return [
+            lookup.id if lookup.id is not None else str(number)
+            for number, lookup in enumerate(self.lookups)
+        ]
+
+    @model_validator(mode="after")
+    def check_ids(self):
+        # id не должен совпадать ни с другим id, ни с номером запроса без id:
+        # иначе один результат молча затрёт другой
+        keys = self.result_keys()
+        if len(keys) != len(set(keys)):
+            raise ValueError("id запросов должны быть разными и не совпадать с номерами запросов без id")
+        return self
+
+class ScheduleBatchOut(BaseModel):
+    # Расписание по каждому запросу, ключ - id запроса или его номер
+    results: Dict[str, List[ScheduleOut]]
+
+class ParserJobOut(BaseModel):
+    id: int
+    trigger: str
+    status: str
+    progress: dict
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    model_config = ConfigDict(from_attributes=True)
+
 class UserCreate(BaseModel):
     email: str
     password: str
@@ -0,0 +1,181 @@
+import contextlib
+import contextvars
+import datetime
+import logging
+import os
+import time
+from typing import Optional
+
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Сколько последних запусков хранят подробные спаны
+TRACE_RUNS = int(os.getenv("PARSER_TRACE_RUNS", "10"))
+
+# Трасса текущего запуска: задачи asyncio наследуют её при создании,
+# поэтому спаны можно открывать в любом месте парсера без лишних аргументов
+current_trace: contextvars.ContextVar[Optional["RunTrace"]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def _status_mb(field: str) -> Optional[float]:
+    """Поле VmRSS/VmHWM из /proc/self/status в МБ; None вне Linux."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb() -> Optional[float]:
+    """Текущая резидентная память процесса."""
+    return _status_mb("VmRSS")
+
+
+def reset_peak_rss() -> bool:
+    """Сбрасывает пик резидентной памяти процесса (VmHWM) до текущей.
+
+    ru_maxrss - пик за всё время жизни процесса и между замерами не
+    убывает; после сброса peak_rss_mb() показывает пик только с этого
+    момента. False, если ядро сброс не поддерживает.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пик резидентной памяти с последнего reset_peak_rss()."""
+    return _status_mb("VmHWM")
+
+
+class StageMemory:
+    """Память по стадиям одного вызова: пик (peak_rss_mb) и прирост
+    резидентной памяти (rss_delta_mb) каждой стадии.
+
+    mark(stage) относит к stage всё, что прошло с прошлой отметки, и
+    сбрасывает пик. Если стадии чередуются (листы книги читаются и
+    разбираются по очереди), пик стадии - максимум по её отрезкам, а
+    прирост - сумма. Пик достоверен, только если процесс в это время не
+    делает ничего другого - как процесс пула, разбирающий один файл.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._rss = rss_mb()
+        self._reset = reset_peak_rss()
+
+    def mark(self, stage: str) -> None:
+        entry = self.stages.setdefault(stage, {})
+        if self._reset:
+            peak = peak_rss_mb()
+            if peak is not None:
+                entry["peak_rss_mb"] = max(entry.get("peak_rss_mb", 0.0), peak)
+        rss = rss_mb()
+        if rss is not None and self._rss is not None:
+            entry["rss_delta_mb"] = round(entry.get("rss_delta_mb", 0.0) + rss - self._rss, 1)
+        self._rss = rss
+        self._reset = reset_peak_rss()
+
+
+class RunTrace:
+    """Спаны одного запуска парсера: стадия, источник, длительность,
+    байты, строки и память. Стадии в процессах пула (convert, parse)
+    получают каждая свой пик памяти (StageMemory), стадии в цикле событий идут
+    одновременно, поэтому для них пишется только прирост памяти процесса
+    за время спана (rss_delta_mb)."""
+
+    def __init__(self):
+        self.started_at = datetime.datetime.now()
+        self.finished_at = None
+        self.spans = []
+        self._start = time.perf_counter()
+        # Пик памяти запуска считается с его начала, а не с запуска процесса
+        reset_peak_rss()
+
+    def add(self, stage: str, source: Optional[str] = None, seconds: float = 0.0, ended: float = 0.0, **attrs) -> None:
+        """ended - сколько секунд назад закончилась стадия (для замеров из пула)."""
+        self.spans.append({
+            "stage": stage,
+            "source": source,
+            "offset": round(time.perf_counter() - self._start - ended - seconds, 4),
+            "seconds": round(seconds, 4),
+            **attrs,
+        })
+
+    def finish(self) -> None:
+        self.finished_at = datetime.datetime.now()
+
+    def summary(self) -> dict:
+        """Итоги по стадиям: сколько спанов, суммарное время, байты и строки."""
+        stages = {}
+        for span in self.spans:
+            total = stages.setdefault(span["stage"], {"count": 0, "seconds": 0.0, "bytes": 0, "rows": 0, "errors": 0})
+            total["count"] += 1
+            total["seconds"] += span["seconds"]
+            total["bytes"] += span.get("bytes", 0)
+            total["rows"] += span.get("rows", 0)
+            total["errors"] += "error" in span
+        for total in stages.values():
+            total["seconds"] = round(total["seconds"], 3)
+        return stages
+
+    def to_dict(self) -> dict:
+        finished_at = self.finished_at or datetime.datetime.now()
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": finished_at.isoformat(timespec="seconds"),
+            "seconds": round((finished_at - self.started_at).total_seconds(), 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.summary(),
+            "spans": self.spans,
+        }
+
+
+def get_trace() -> RunTrace:
+    """Трасса текущего запуска; без неё (запуск вне воркера) создаётся новая."""
+    trace = current_trace.get()
+    if trace is None:
+        trace = RunTrace()
+        current_trace.set(trace)
+    return trace
+
+
+@contextlib.contextmanager
+def span(stage: str, source: Optional[str] = None, **attrs):
+    """Замеряет стадию. Вызывающий код дописывает в отданный словарь
+    bytes, rows и счётчики записи; ошибка попадает в поле error."""
+    record = dict(attrs)
+    start = time.perf_counter()
+    start_rss = rss_mb()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        trace = current_trace.get()
+        if trace is not None:
+            end_rss = rss_mb()
+            if start_rss is not None and end_rss is not None:
+                record.setdefault("rss_delta_mb", round(end_rss - start_rss, 1))
+            trace.add(stage, source, time.perf_counter() - start, **record)
+
+
+def record_worker_metrics(source: str, metrics: dict, size: int, rows: int) -> None:
+    """Спаны convert и parse, замеренные в процессе пула (extractors.with_metrics)."""
+    trace = current_trace.get()
+    if trace is None:
+        return
+    # Память замерена по стадиям отдельно (telemetry.StageMemory в with_metrics)
+    memory = metrics.get("memory", {})
+    trace.add("convert", source, metrics["convert"], ended=metrics["parse"], bytes=size, **memory.get("convert", {}))
+    trace.add("parse", source, metrics["parse"], rows=rows, **memory.get("parse", {}))
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import subprocess
+from typing import List, Tuple
+from urllib.parse import urljoin, urlparse, unquote
+
+from bs4 import BeautifulSoup
+
+from downloader import Downloader
+from logging_config import setup_logging
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+VK_GROUP_ID = 85060840
+VK_DOCS_URL = f"https://vk.com/docs-{VK_GROUP_ID}"
+VK_MOBILE_DOCS_URL = f"https://m.vk.com/docs-{VK_GROUP_ID}"
+VK_API_URL = "https://api.vk.com/method/docs.get"
+VK_API_VERSION = "5.199"
+# Сервисный ключ приложения VK: с ним список берётся через API без разбора страницы
+VK_TOKEN = os.getenv("VK_TOKEN")
+# PARSER_VK_BROWSER=0 запрещает запуск Chromium, если список не получен по HTTP
+VK_BROWSER_FALLBACK = os.getenv("PARSER_VK_BROWSER", "1") != "0"
+
+SPREADSHEET_EXTENSIONS = (".xls", ".xlsx")
+
+# Список документов: пары (имя файла, ссылка для скачивания)
+Documents = List[Tuple[str, str]]
+
+_playwright = None
+_browser = None
+_browser_lock = asyncio.Lock()
+
+
+def ensure_playwright_browsers_installed():
+    pw_cache_path = "/opt/render/.cache/ms-playwright"
+    if not os.path.exists(pw_cache_path) or not os.listdir(pw_cache_path):
+        subprocess.run(["playwright", "install", "--with-deps"], check=True)
+
+
+def _is_spreadsheet(name: str) -> bool:
+    return name.lower().endswith(SPREADSHEET_EXTENSIONS)
+
+
+def documents_from_html(text: str, base_url: str = VK_DOCS_URL) -> Documents:
+    """Ссылки на .xls/.xlsx из HTML страницы документов сообщества."""
+    soup = BeautifulSoup(text, "html.parser")
+    documents = []
+    for link in soup.find_all("a", href=True):
+        href = link["href"]
+        file_name = unquote(urlparse(href).path.split("/")[-1])
+        if not _is_spreadsheet(file_name):
+            continue
+        documents.append((file_name, urljoin(base_url, href)))
+    return documents
+
+
+async def discover_via_api(downloader: Downloader) -> Documents:
+    params = {"owner_id": -VK_GROUP_ID, "access_token": VK_TOKEN, "v": VK_API_VERSION, "count": 2000}
+    async with downloader.semaphore:
+        async with downloader.session.get(VK_API_URL, params=params) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+    if "error" in data:
+        raise ValueError(data["error"].get("error_msg", data["error"]))
+    return [
+        (item["title"], item["url"])
+        for item in data["response"]["items"]
+        if item.get("ext", "").lower() in ("xls", "xlsx") or _is_spreadsheet(item["title"])
+    ]
+
+
+async def discover_via_html(downloader: Downloader) -> Documents:
+    for url in (VK_DOCS_URL, VK_MOBILE_DOCS_URL):
+        try:
+            documents = documents_from_html(await downloader.fetch_text(url), url)
+        except Exception as e:
+            logger.warning("Не удалось получить список документов с %s: %s", url, e)
+            continue
+        if documents:
+            return documents
+    return []
+
+
+async def get_browser():
+    """Chromium запускается один раз и переиспользуется между запусками парсера."""
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            from playwright.async_api import async_playwright
+
+            await asyncio.to_thread(ensure_playwright_browsers_installed)
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(headless=True)
+            logger.info("Запущен Chromium для поиска документов VK")
+        return _browser
+
+
+async def close_browser() -> None:
+    global _playwright, _browser
+    if _browser is not None:
+        await _browser.close()
+        _browser = None
+    if _playwright is not None:
+        await _playwright.stop()
+        _playwright = None
+
+
+async def discover_via_browser() -> Documents:
+    browser = await get_browser()
+    page = await browser.new_page()
+    try:
+        await page.goto(VK_DOCS_URL, wait_until="domcontentloaded")
+        return documents_from_html(await page.content())
+    finally:
+        await page.close()
+
+
+async def discover_vk_documents(downloader: Downloader) -> Documents:
+    """Список таблиц расписания колледжа: API VK, HTML страницы, затем браузер."""
+    if VK_TOKEN:
+        try:
+            documents = await discover_via_api(downloader)
+            logger.info("Найдено %d документов VK через API", len(documents))
+            return documents
+        except Exception as e:
+            logger.warning("Не удалось получить документы VK через API: %s", e)
+
+    documents = await discover_via_html(downloader)
+    if documents:
+        logger.info("Найдено %d документов VK на странице", len(documents))
+        return documents
+
+    if not VK_BROWSER_FALLBACK:
+        return []
+    logger.info("Документы VK не найдены по HTTP, используется браузер")
+    documents = await discover_via_browser()
+    logger.info("Найдено %d документов VK через браузер", len(documents))
+    return documents
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import logging
+import os
+import traceback
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from executor import shutdown_executor
+from jobs import JobProgress, parser_lock, enqueue_job, claim_next_job, fail_orphaned_jobs, finish_job
+from logging_config import setup_logging
+from models import async_main
+from pars import main as parser_main
+from telemetry import RunTrace, current_trace
+from vk_docs import close_browser
+
+# Логирование через очередь и фоновый поток, уровни из LOG_LEVEL/LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Как часто воркер проверяет очередь заданий, секунд
+POLL_INTERVAL = float(os.getenv("PARSER_WORKER_POLL", "5"))
+
+
+async def run_next_job() -> bool:
+    """Выполняет одно задание из очереди под single-flight блокировкой.
+
+    Возвращает False, если очередь пуста или парсер уже занят другим
+    процессом.
+    """
+    async with parser_lock() as acquired:
+        if not acquired:
+            return False
+        await fail_orphaned_jobs()
+        job = await claim_next_job()
+        if job is None:
+            return False
+
+        logger.info("Выполнение задания парсера %s (%s)", job.id, job.trigger)
+        progress = JobProgress(job.id)
+        trace = RunTrace()
+        token = current_trace.set(trace)
+        error = None
+        try:
+            await parser_main(progress)
+            error = progress.error
+        except Exception as e:
+            logger.error("Задание парсера %s завершилось ошибкой: %s", job.id, e)
+            logger.error(traceback.format_exc())
+            error = str(e)
+        finally:
+            current_trace.reset(token)
+        trace.finish()
+        await finish_job(job.id, progress.snapshot(), error, trace.to_dict())
+        logger.info("Задание парсера %s завершено%s", job.id, ' с ошибкой' if error else '')
+        return True
+
+
+async def run_worker() -> None:
+    """Цикл воркера: запуск при старте, ежедневный запуск в 06:00 и
+    задания, поставленные через API."""
+    await async_main()
+    await enqueue_job("startup")
+
+    scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+    scheduler.add_job(
+        enqueue_job,
+        trigger=CronTrigger(hour=6, minute=0, timezone="Europe/Moscow"),
+        args=["cron"],
+        id="daily_parser",
+        replace_existing=True,
+    )
+    scheduler.start()
+    logger.info("Воркер парсера запущен")
+    try:
+        while True:
+            try:
+                ran = await run_next_job()
+            except Exception as e:
+                logger.error("Ошибка воркера парсера: %s", e)
+                logger.error(traceback.format_exc())
+                ran = False
+            if not ran:
+                await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        scheduler.shutdown(wait=False)
+        await close_browser()
+
+
+async def run_once(trigger: str = "manual") -> None:
+    await async_main()
+    job = await enqueue_job(trigger)
+    if not await run_next_job():
+        logger.info("Задание %s будет выполнено другим воркером", job.id)
+    await close_browser()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воркер парсера расписания")
+    parser.add_argument("--once", action="store_true", help="выполнить один запуск и выйти")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_once() if args.once else run_worker())
+    finally:
+        shutdown_executor()